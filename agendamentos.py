@@ -1,53 +1,109 @@
 # agendamentos.py — Tabela 'agendamentos' com tratamento de erros
-import os
 import streamlit as st
 from datetime import datetime
-from typing import List, Dict
-from supabase import create_client, Client
+from typing import List, Dict, Optional, Tuple
+import cache
+import fila_escrita
+from database import tabela, paginar_keyset
 
-# Conexão Supabase
-SUPABASE_URL = os.getenv("SUPABASE_URL") or st.secrets.get("SUPABASE_URL")
-SUPABASE_KEY = os.getenv("SUPABASE_KEY") or st.secrets.get("SUPABASE_KEY")
-if not SUPABASE_URL or not SUPABASE_KEY:
-    raise RuntimeError("Defina SUPABASE_URL e SUPABASE_KEY em env ou Secrets.")
-
-supabase: Client = create_client(SUPABASE_URL, SUPABASE_KEY)
 TBL = "agendamentos"
+ORDEM = ("data_consulta", "hora_consulta", "id")
+COLUNAS_AGENDA = "id, paciente_id, data_consulta, hora_consulta, tipo_consulta, observacao"
+COLUNAS_LOTE = ["paciente_id", "data_consulta", "hora_consulta", "observacao", "tipo_consulta"]
+HORA = r"([01]\d|2[0-3]):[0-5]\d(:[0-5]\d)?"
 
 def _tbl():
-    return supabase.table(TBL)
+    return tabela(TBL)
 
-def adicionar_agendamento(
+def _registro(
     paciente_id: int,
     data_consulta: str,      # YYYY-MM-DD
     hora_consulta: str,      # HH:MM
     observacao: str,
     tipo_consulta: str
+) -> Dict:
+    return {
+        "paciente_id": paciente_id,
+        "data_consulta": data_consulta,
+        "hora_consulta": hora_consulta,
+        "observacao": observacao,
+        "tipo_consulta": tipo_consulta,
+        "criado_em": datetime.utcnow().isoformat()
+    }
+
+def adicionar_agendamento(
+    paciente_id: int,
+    data_consulta: str,
+    hora_consulta: str,
+    observacao: str,
+    tipo_consulta: str
 ) -> int:
-    """Insere e retorna o ID ou -1 em caso de falha."""
-    try:
-        dados = {
-            "paciente_id": paciente_id,
-            "data_consulta": data_consulta,
-            "hora_consulta": hora_consulta,
-            "observacao": observacao,
-            "tipo_consulta": tipo_consulta,
-            "criado_em": datetime.utcnow().isoformat()
-        }
-        res = _tbl().insert(dados).execute()
-        return res.data[0]["id"]
-    except Exception as e:
-        st.error(f"Erro ao agendar consulta: {e}")
-        return -1
+    """Insere e retorna o ID; erros do banco sobem para quem chamou."""
+    res = _tbl().insert(_registro(
+        paciente_id, data_consulta, hora_consulta, observacao, tipo_consulta
+    )).execute()
+    cache.invalidar(TBL)
+    return res.data[0]["id"]
+
+def adicionar_agendamentos_em_lote(registros: List[Dict]) -> List[Dict]:
+    """
+    Insere vários agendamentos (dicts com as chaves de COLUNAS_LOTE; data em
+    AAAA-MM-DD ou DD/MM/AAAA) em poucas requisições, validando tudo de uma vez.
+    Retorna, na ordem de entrada, {"id", "erro", "linha"} por registro.
+    """
+    import validacao
+    df = validacao.quadro(registros, COLUNAS_LOTE)
+    pid = validacao.inteiros(df["paciente_id"])
+    datas = validacao.datas_iso(df["data_consulta"])
+    horas = validacao.texto(df["hora_consulta"])
+    erros = validacao.sem_erros(len(df))
+    erros = validacao.marcar(erros, pid.isna(), "paciente_id inválido")
+    erros = validacao.marcar(erros, datas.isna(), "data_consulta inválida")
+    erros = validacao.marcar(erros, ~horas.str.fullmatch(HORA), "hora_consulta inválida (HH:MM)")
+    df = df.assign(
+        paciente_id=pid, data_consulta=datas, hora_consulta=horas.str[:5],
+        observacao=validacao.texto(df["observacao"]),
+        tipo_consulta=validacao.texto(df["tipo_consulta"]),
+        criado_em=datetime.utcnow().isoformat(),
+    )
+    resultados = validacao.inserir_validos(TBL, df, erros)
+    if any(r["id"] is not None for r in resultados):
+        cache.invalidar(TBL)
+    return resultados
+
+def enfileirar_agendamento(
+    paciente_id: int,
+    data_consulta: str,
+    hora_consulta: str,
+    observacao: str,
+    tipo_consulta: str
+) -> int:
+    """Grava pela fila de escrita e retorna o número do envio (fila_escrita.status)."""
+    return fila_escrita.enfileirar(TBL, _registro(
+        paciente_id, data_consulta, hora_consulta, observacao, tipo_consulta
+    ))
+
+@cache.em_cache(TBL)
+def _listar() -> List[Dict]:
+    res = _tbl().select("*") \
+                .order("data_consulta") \
+                .order("hora_consulta") \
+                .execute()
+    return res.data or []
+
+@cache.em_cache(TBL)
+def _listar_por_paciente(paciente_id: int) -> List[Dict]:
+    res = _tbl().select("*") \
+                .eq("paciente_id", paciente_id) \
+                .order("data_consulta") \
+                .order("hora_consulta") \
+                .execute()
+    return res.data or []
 
 def obter_agendamentos() -> List[Dict]:
     """Retorna todos os agendamentos ou lista vazia em caso de erro."""
     try:
-        res = _tbl().select("*") \
-                    .order("data_consulta") \
-                    .order("hora_consulta") \
-                    .execute()
-        return res.data or []
+        return _listar()
     except Exception as e:
         st.error(f"Não foi possível carregar agendamentos: {e}")
         return []
@@ -55,12 +111,51 @@ def obter_agendamentos() -> List[Dict]:
 def obter_agendamentos_por_paciente(paciente_id: int) -> List[Dict]:
     """Retorna agendamentos de um paciente ou lista vazia em caso de erro."""
     try:
-        res = _tbl().select("*") \
-                    .eq("paciente_id", paciente_id) \
-                    .order("data_consulta") \
-                    .order("hora_consulta") \
-                    .execute()
-        return res.data or []
+        return _listar_por_paciente(paciente_id)
     except Exception as e:
         st.error(f"Não foi possível carregar agendamentos do paciente: {e}")
         return []
+
+@cache.em_cache(TBL)
+def _listar_entre(inicio: str, fim: str, colunas: str) -> List[Dict]:
+    res = _tbl().select(colunas) \
+                .gte("data_consulta", inicio) \
+                .lte("data_consulta", fim) \
+                .order("data_consulta") \
+                .order("hora_consulta") \
+                .execute()
+    return res.data or []
+
+def obter_agendamentos_entre(
+    inicio: str,             # YYYY-MM-DD (inclusive)
+    fim: str,                # YYYY-MM-DD (inclusive)
+    colunas: str = COLUNAS_AGENDA
+) -> List[Dict]:
+    """Agendamentos no intervalo, filtrados e ordenados no banco, ou lista vazia em caso de erro."""
+    try:
+        return _listar_entre(inicio, fim, colunas)
+    except Exception as e:
+        st.error(f"Não foi possível carregar agendamentos do período: {e}")
+        return []
+
+@cache.em_cache(TBL)
+def _pagina(apos: Optional[Tuple], limite: int, paciente_id: Optional[int]):
+    q = _tbl().select("*")
+    if paciente_id is not None:
+        q = q.eq("paciente_id", paciente_id)
+    return paginar_keyset(q, ORDEM, apos, limite)
+
+def obter_agendamentos_pagina(
+    apos: Optional[Tuple] = None,
+    limite: int = 100,
+    paciente_id: Optional[int] = None
+) -> Tuple[List[Dict], Optional[Tuple]]:
+    """
+    Página de agendamentos ordenada por data_consulta/hora_consulta/id.
+    Retorna (linhas, cursor da próxima página ou None); ([], None) em caso de erro.
+    """
+    try:
+        return _pagina(apos, limite, paciente_id)
+    except Exception as e:
+        st.error(f"Não foi possível carregar agendamentos: {e}")
+        return [], None
@@ -1,7 +1,7 @@
 # auth.py – Módulo de autenticação com persistência de sessão
 
 import streamlit as st
-from database import supabase
+from database import tabela
 import bcrypt
 
 def verify_password(pwd: str, hashed: str) -> bool:
@@ -38,8 +38,7 @@ def login() -> dict:
 
     # 2) Usuário no Supabase
     resp = (
-        supabase
-        .table("usuarios")
+        tabela("usuarios")
         .select("login, senha_hash, role, paciente_id, nome")
         .eq("login", user_input)
         .execute()
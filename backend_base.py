@@ -0,0 +1,233 @@
+# backend_base.py – Subconjunto do query builder do supabase-py usado pelo app
+import re
+from typing import Dict, List, Optional, Tuple
+
+IDENTIFICADOR = re.compile(r"^[A-Za-z_][A-Za-z0-9_]*$")
+OPERADORES = {"eq", "neq", "gt", "gte", "lt", "lte", "like", "ilike", "is", "in"}
+
+
+class ErroBackend(Exception):
+    """Erro de consulta num backend local (equivale ao APIError do postgrest)."""
+
+    def __init__(self, mensagem: str, code: Optional[str] = None):
+        super().__init__(mensagem)
+        self.message = mensagem
+        self.code = code  # SQLSTATE, como em APIError.code (ex.: 42P01, relação inexistente)
+
+
+class Resposta:
+    def __init__(self, data, count: Optional[int] = None):
+        self.data = data
+        self.count = count
+
+
+def identificador(nome: str) -> str:
+    nome = nome.strip()
+    if not IDENTIFICADOR.match(nome):
+        raise ErroBackend(f"Identificador inválido: {nome!r}")
+    return nome
+
+
+def separar(texto: str) -> List[str]:
+    """Divide por vírgulas de nível zero (fora de parênteses e aspas)."""
+    partes, nivel, aspas, atual = [], 0, False, ""
+    i = 0
+    while i < len(texto):
+        c = texto[i]
+        if c == "\\" and aspas and i + 1 < len(texto):
+            atual += c + texto[i + 1]
+            i += 2
+            continue
+        if c == '"':
+            aspas = not aspas
+        elif not aspas and c == "(":
+            nivel += 1
+        elif not aspas and c == ")":
+            nivel -= 1
+        if c == "," and nivel == 0 and not aspas:
+            partes.append(atual.strip())
+            atual = ""
+        else:
+            atual += c
+        i += 1
+    if atual.strip():
+        partes.append(atual.strip())
+    return partes
+
+
+def _valor(texto: str):
+    texto = texto.strip()
+    if len(texto) >= 2 and texto[0] == texto[-1] == '"':
+        return re.sub(r"\\(.)", r"\1", texto[1:-1])
+    if texto == "null":
+        return None
+    return texto
+
+
+def logica(texto: str, conector: str = "or") -> Tuple:
+    """
+    Converte a árvore lógica do PostgREST (ex.: 'a.gt.1,and(a.eq.1,b.gt.2)')
+    em nós ("and"|"or", [filhos]) e ("cmp", coluna, operador, valor).
+    """
+    filhos = []
+    for termo in separar(texto):
+        m = re.match(r"^(and|or)\((.*)\)$", termo, re.S)
+        if m:
+            filhos.append(logica(m.group(2), m.group(1)))
+            continue
+        coluna, op, valor = termo.split(".", 2)
+        if op not in OPERADORES:
+            raise ErroBackend(f"Operador não suportado: {op}")
+        if op == "in":
+            valor = [_valor(v) for v in separar(valor.strip()[1:-1])]
+        else:
+            valor = _valor(valor)
+        filhos.append(("cmp", identificador(coluna), op, valor))
+    return (conector, filhos)
+
+
+def colunas(texto: str) -> Tuple[List[str], List[Tuple[str, List[str]]]]:
+    """'id, nome, pacientes(*)' -> (['id', 'nome'], [('pacientes', ['*'])])."""
+    simples, embutidos = [], []
+    for termo in separar(texto or "*"):
+        m = re.match(r"^(\w+)\((.*)\)$", termo, re.S)
+        if m:
+            embutidos.append((identificador(m.group(1)), colunas(m.group(2))[0]))
+        elif termo == "*":
+            simples.append("*")
+        else:
+            simples.append(identificador(termo))
+    return simples, embutidos
+
+
+def chave_estrangeira(tabela_embutida: str) -> str:
+    """Convenção do esquema: 'pacientes' é referenciada por 'paciente_id'."""
+    return tabela_embutida[:-1] + "_id" if tabela_embutida.endswith("s") else tabela_embutida + "_id"
+
+
+class ConsultaBase:
+    """
+    Registra a cadeia select/insert/filtros/ordem como no supabase-py;
+    cada backend implementa execute() a partir desses campos.
+    """
+
+    def __init__(self, backend, tabela: str):
+        self.backend = backend
+        self.tabela = identificador(tabela)
+        self.operacao = "select"
+        self.colunas: List[str] = ["*"]
+        self.embutidos: List[Tuple[str, List[str]]] = []
+        self.filtros: List[Tuple] = []
+        self.ordem: List[Tuple[str, bool]] = []
+        self.limite: Optional[int] = None
+        self.deslocamento = 0
+        self.unico: Optional[str] = None      # None | "single" | "maybe_single"
+        self.contagem: Optional[str] = None
+        self.apenas_contagem = False
+        self.registros: List[Dict] = []
+        self.conflito = "id"
+        self.ignorar_duplicados = False
+
+    # ---- operações ----
+    def select(self, *cols: str, count: Optional[str] = None, head: Optional[bool] = None):
+        self.operacao = "select"
+        self.colunas, self.embutidos = colunas(",".join(cols) if cols else "*")
+        self.contagem = count
+        self.apenas_contagem = bool(head)
+        return self
+
+    def insert(self, json, count=None, returning=None, upsert: bool = False, **_):
+        self.operacao = "upsert" if upsert else "insert"
+        self.registros = [json] if isinstance(json, dict) else list(json)
+        return self
+
+    def upsert(self, json, on_conflict: str = "id", ignore_duplicates: bool = False, **_):
+        self.insert(json, upsert=True)
+        self.conflito = identificador(on_conflict)
+        self.ignorar_duplicados = bool(ignore_duplicates)
+        return self
+
+    def update(self, json, **_):
+        self.operacao = "update"
+        self.registros = [json]
+        return self
+
+    def delete(self, **_):
+        self.operacao = "delete"
+        return self
+
+    # ---- filtros ----
+    def _filtro(self, coluna: str, op: str, valor):
+        self.filtros.append(("cmp", identificador(coluna), op, valor))
+        return self
+
+    def eq(self, coluna, valor):
+        return self._filtro(coluna, "eq", valor)
+
+    def neq(self, coluna, valor):
+        return self._filtro(coluna, "neq", valor)
+
+    def gt(self, coluna, valor):
+        return self._filtro(coluna, "gt", valor)
+
+    def gte(self, coluna, valor):
+        return self._filtro(coluna, "gte", valor)
+
+    def lt(self, coluna, valor):
+        return self._filtro(coluna, "lt", valor)
+
+    def lte(self, coluna, valor):
+        return self._filtro(coluna, "lte", valor)
+
+    def like(self, coluna, padrao):
+        return self._filtro(coluna, "like", padrao)
+
+    def ilike(self, coluna, padrao):
+        return self._filtro(coluna, "ilike", padrao)
+
+    def is_(self, coluna, valor):
+        return self._filtro(coluna, "is", None if valor in (None, "null") else valor)
+
+    def in_(self, coluna, valores):
+        return self._filtro(coluna, "in", list(valores))
+
+    def or_(self, filtros: str, reference_table: Optional[str] = None):
+        self.filtros.append(logica(filtros))
+        return self
+
+    # ---- modificadores ----
+    def order(self, coluna: str, desc: bool = False, nullsfirst: bool = False, **_):
+        self.ordem.append((identificador(coluna), bool(desc)))
+        return self
+
+    def limit(self, n: int, **_):
+        self.limite = int(n)
+        return self
+
+    def range(self, inicio: int, fim: int, **_):
+        self.deslocamento = int(inicio)
+        self.limite = int(fim) - int(inicio) + 1
+        return self
+
+    def single(self):
+        self.unico = "single"
+        return self
+
+    def maybe_single(self):
+        self.unico = "maybe_single"
+        return self
+
+    def _resposta(self, linhas: List[Dict], total: Optional[int]) -> Resposta:
+        """Aplica single/maybe_single/head sobre as linhas já obtidas."""
+        if self.apenas_contagem:
+            return Resposta([], total)
+        if self.unico:
+            if len(linhas) > 1 or (self.unico == "single" and not linhas):
+                raise ErroBackend(
+                    f"JSON object requested, multiple (or no) rows returned ({len(linhas)})"
+                )
+            return Resposta(linhas[0] if linhas else None, total)
+        return Resposta(linhas, total)
+
+    def execute(self) -> Resposta:
+        raise NotImplementedError
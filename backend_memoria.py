@@ -0,0 +1,259 @@
+# backend_memoria.py – Backend falso em memória (PostgREST simulado) para testes e benchmarks
+import bisect
+import datetime
+import fnmatch
+import itertools
+import os
+import threading
+import time
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from backend_base import ConsultaBase, ErroBackend, chave_estrangeira
+from backend_sqlite import ESQUEMA
+
+
+def _coagir(valor_linha, valor_filtro):
+    """Filtros do or_() chegam como texto; compara no tipo da coluna, como o Postgres."""
+    if isinstance(valor_filtro, str) and isinstance(valor_linha, (int, float)) \
+            and not isinstance(valor_linha, bool):
+        try:
+            return type(valor_linha)(valor_filtro)
+        except ValueError:
+            return valor_filtro
+    return valor_filtro
+
+
+def _like(valor, padrao: str, sem_caixa: bool) -> bool:
+    padrao = padrao.replace("%", "*")
+    if sem_caixa:
+        return fnmatch.fnmatchcase(str(valor).lower(), padrao.lower())
+    return fnmatch.fnmatchcase(str(valor), padrao)
+
+
+def _avaliar(no: Tuple, linha: Dict) -> bool:
+    if no[0] == "cmp":
+        _, col, op, alvo = no
+        v = linha.get(col)
+        if op == "is" or (op == "eq" and alvo is None):
+            return v is None
+        if op == "in":
+            return v in [_coagir(v, a) for a in alvo]
+        if v is None:
+            return False
+        alvo = _coagir(v, alvo)
+        if op == "eq":
+            return v == alvo
+        if op == "neq":
+            return v != alvo
+        if op in ("like", "ilike"):
+            return _like(v, alvo, op == "ilike")
+        try:
+            return {"gt": v > alvo, "gte": v >= alvo, "lt": v < alvo, "lte": v <= alvo}[op]
+        except TypeError:
+            return False
+    conector, filhos = no
+    if conector == "and":
+        return all(_avaliar(f, linha) for f in filhos)
+    return any(_avaliar(f, linha) for f in filhos)
+
+
+class ConsultaMemoria(ConsultaBase):
+
+    def execute(self):
+        self.backend.esperar()
+        with self.backend.lock:
+            linhas = self.backend.linhas(self.tabela)
+            if self.operacao == "select":
+                return self._select(linhas)
+            if self.operacao in ("insert", "upsert"):
+                return self._inserir(linhas)
+            alvo = [l for l in self._candidatas(linhas)
+                    if all(_avaliar(f, l) for f in self.filtros)]
+            if self.operacao == "update":
+                for l in alvo:
+                    l.update(self.registros[0])
+                    self.backend.carimbar(l)
+                if "id" in self.registros[0]:
+                    self.backend.fora_de_ordem.add(self.tabela)
+            else:
+                ids = {id(l) for l in alvo}
+                linhas[:] = [l for l in linhas if id(l) not in ids]
+                for l in alvo:
+                    self.backend.desindexar(self.tabela, l)
+            return self._resposta([dict(l) for l in alvo], None)
+
+    def _candidatas(self, linhas: List[Dict]) -> List[Dict]:
+        # busca por id usa o índice, como a chave primária no Postgres
+        for f in self.filtros:
+            if f[0] == "cmp" and f[1] == "id" and f[2] == "eq":
+                linha = self.backend.por_id(self.tabela, _coagir(1, f[3]))
+                return [linha] if linha is not None else []
+        return linhas
+
+    def _inicio_por_id(self, linhas: List[Dict]) -> int:
+        """Posição da primeira linha que pode passar num filtro id > x / id >= x."""
+        for f in self.filtros:
+            if f[0] == "or" and len(f[1]) == 1:
+                f = f[1][0]   # cursor de paginar_keyset: or(id.gt.x)
+            if f[0] == "cmp" and f[1] == "id" and f[2] in ("gt", "gte"):
+                alvo = _coagir(1, f[3])
+                if isinstance(alvo, int):
+                    achar = bisect.bisect_right if f[2] == "gt" else bisect.bisect_left
+                    return achar(linhas, alvo, key=lambda l: l["id"])
+        return 0
+
+    def _varrer_por_id(self, linhas: List[Dict]) -> List[Dict]:
+        """
+        ORDER BY id LIMIT n pela chave primária, como o Postgres: começa no
+        cursor e para ao completar a página, sem filtrar nem ordenar a tabela toda.
+        """
+        resto = itertools.islice(linhas, self._inicio_por_id(linhas), None)
+        passam = (l for l in resto if all(_avaliar(f, l) for f in self.filtros))
+        return list(itertools.islice(passam, self.deslocamento + self.limite))
+
+    def _select(self, linhas: List[Dict]):
+        candidatas, ordem = self._candidatas(linhas), self.ordem
+        if candidatas is linhas and ordem == [("id", False)] and self.limite is not None \
+                and not self.contagem and self.backend.em_ordem_de_id(self.tabela):
+            achadas, ordem = self._varrer_por_id(linhas), []   # já em ordem de id
+        else:
+            achadas = [l for l in candidatas if all(_avaliar(f, l) for f in self.filtros)]
+        total = len(achadas) if self.contagem else None
+        if self.apenas_contagem:
+            return self._resposta([], total)
+        # ordenação estável, do último critério para o primeiro (nulos por último)
+        for col, desc in reversed(ordem):
+            com = [l for l in achadas if l.get(col) is not None]
+            sem = [l for l in achadas if l.get(col) is None]
+            com.sort(key=lambda l: l[col], reverse=desc)
+            achadas = com + sem
+        fim = None if self.limite is None else self.deslocamento + self.limite
+        achadas = achadas[self.deslocamento:fim]
+
+        resultado = []
+        for l in achadas:
+            if "*" in self.colunas:
+                r = dict(l)
+            else:
+                r = {c: l.get(c) for c in self.colunas}
+            for tabela, sub in self.embutidos:
+                fk = chave_estrangeira(tabela)
+                rel = self.backend.por_id(tabela, l.get(fk))
+                r[tabela] = None if rel is None else (
+                    dict(rel) if "*" in sub else {c: rel.get(c) for c in sub}
+                )
+            resultado.append(r)
+        return self._resposta(resultado, total)
+
+    def _inserir(self, linhas: List[Dict]):
+        devolvidas = []
+        for registro in self.registros:
+            registro = dict(registro)
+            existente = None
+            if self.operacao == "upsert" and registro.get(self.conflito) is not None:
+                existente = next((l for l in linhas
+                                  if l.get(self.conflito) == registro[self.conflito]), None)
+            if existente is not None:
+                if self.ignorar_duplicados:
+                    continue   # ON CONFLICT DO NOTHING: a linha existente não volta
+                existente.update(registro)
+                self.backend.carimbar(existente)
+                devolvidas.append(existente)
+                continue
+            registro = self.backend.completar(self.tabela, registro)
+            self.backend.carimbar(registro)
+            if registro.get("id") is None:
+                registro["id"] = self.backend.proximo_id(self.tabela)
+            linhas.append(registro)
+            self.backend.indexar(self.tabela, registro)
+            devolvidas.append(registro)
+        return self._resposta([dict(l) for l in devolvidas], None)
+
+
+class BackendMemoria:
+    """
+    Substituto local do Supabase: tabelas são listas de dicts em memória.
+    `latencia` (segundos) é somada a cada execute() para simular a rede.
+    Tabelas fora do esquema (ex.: views de relatório) geram ErroBackend,
+    como uma relação inexistente no PostgREST.
+    """
+    # os dados só existem neste processo: nada a compartilhar com outros (cache)
+    so_neste_processo = True
+
+    def __init__(self, latencia: float = 0.0, tabelas: Optional[Iterable[str]] = None):
+        self.latencia = latencia
+        self.identidade = f"memoria:{os.getpid()}:{id(self)}"
+        self.lock = threading.RLock()
+        self._tabelas: Dict[str, List[Dict]] = {t: [] for t in (tabelas or ESQUEMA)}
+        self._por_id: Dict[str, Dict] = {t: {} for t in self._tabelas}
+        self._ids: Dict[str, int] = {t: 0 for t in self._tabelas}
+        # tabelas cuja lista deixou de estar em ordem crescente de id (insert
+        # com id explícito menor, update do id): sem varredura pela chave
+        self.fora_de_ordem = set()
+        self.execucoes = 0
+
+    def table(self, nome: str) -> ConsultaMemoria:
+        return ConsultaMemoria(self, nome)
+
+    def esperar(self):
+        with self.lock:
+            self.execucoes += 1
+        if self.latencia:
+            time.sleep(self.latencia)
+
+    def linhas(self, tabela: str) -> List[Dict]:
+        if tabela not in self._tabelas:
+            raise ErroBackend(f'relation "public.{tabela}" does not exist', code="42P01")
+        return self._tabelas[tabela]
+
+    def por_id(self, tabela: str, pid) -> Optional[Dict]:
+        return self._por_id.get(tabela, {}).get(pid)
+
+    def completar(self, tabela: str, registro: Dict) -> Dict:
+        """Colunas omitidas ficam NULL, como no insert do Postgres."""
+        linha = dict.fromkeys(c for c, _ in ESQUEMA.get(tabela, ()))
+        linha.update(registro)
+        return linha
+
+    @staticmethod
+    def carimbar(linha: Dict):
+        """alterado_em (nas tabelas que o têm) é sempre do "servidor", como no gatilho do Postgres."""
+        if "alterado_em" in linha:
+            linha["alterado_em"] = datetime.datetime.now(datetime.timezone.utc).isoformat()
+
+    def proximo_id(self, tabela: str) -> int:
+        self._ids[tabela] += 1
+        return self._ids[tabela]
+
+    def em_ordem_de_id(self, tabela: str) -> bool:
+        return tabela not in self.fora_de_ordem
+
+    def indexar(self, tabela: str, registro: Dict):
+        linhas = self._tabelas[tabela]
+        if len(linhas) > 1 and linhas[-2]["id"] >= registro["id"]:
+            self.fora_de_ordem.add(tabela)
+        self._por_id[tabela][registro["id"]] = registro
+        self._ids[tabela] = max(self._ids[tabela], registro["id"])
+
+    def desindexar(self, tabela: str, registro: Dict):
+        self._por_id[tabela].pop(registro.get("id"), None)
+
+    def carregar(self, tabela: str, registros: Iterable[Dict]):
+        """Insere em massa, sem latência (para popular cenários)."""
+        with self.lock:
+            linhas = self.linhas(tabela)
+            for r in registros:
+                r = self.completar(tabela, r)
+                self.carimbar(r)
+                if r.get("id") is None:
+                    r["id"] = self.proximo_id(tabela)
+                linhas.append(r)
+                self.indexar(tabela, r)
+
+    def estatisticas(self) -> Dict:
+        with self.lock:
+            return {
+                "backend": "memoria",
+                "execucoes": self.execucoes,
+                "linhas": {t: len(l) for t, l in self._tabelas.items()},
+            }
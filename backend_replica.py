@@ -0,0 +1,253 @@
+# backend_replica.py – Réplica local (SQLite) das tabelas mais lidas, sincronizada
+# por delta a partir de alterado_em (carimbado pelo banco em cada gravação)
+import datetime
+import threading
+import time
+from typing import Dict, Iterable, List, Optional
+
+from backend_sqlite import ESQUEMA, BackendSQLite
+
+TABELAS = ("pacientes", "agendamentos", "transacoes")
+MARCA = "alterado_em"   # ver sql/sincronizacao.sql; criado_em vem do cliente
+LOTE = 1000
+LEITURAS = {"select"}
+ESCRITAS = {"insert", "upsert", "update", "delete"}
+
+CONTROLE = """
+CREATE TABLE IF NOT EXISTS _sincronizacao (
+    tabela TEXT PRIMARY KEY,
+    marca TEXT,
+    sincronizado_em REAL,
+    completa_em REAL
+)
+"""
+
+
+def normalizar_marca(valor) -> Optional[str]:
+    """Timestamp ISO (com ou sem fuso) -> ISO em UTC sem fuso, comparável como texto."""
+    if not valor:
+        return None
+    try:
+        dt = datetime.datetime.fromisoformat(str(valor).replace("Z", "+00:00"))
+    except ValueError:
+        return None
+    if dt.tzinfo is not None:
+        dt = dt.astimezone(datetime.timezone.utc).replace(tzinfo=None)
+    return dt.isoformat()
+
+
+def _filtro(v: str) -> str:
+    return '"' + v.replace('"', '\\"') + '"'
+
+
+class _ConsultaRoteada:
+    """
+    Grava a cadeia select/insert/filtros/ordem e a repete no execute():
+    leituras na réplica (sincronizando antes, se passou do atraso máximo),
+    escritas no banco primário, com as linhas devolvidas copiadas para a réplica.
+    """
+
+    def __init__(self, backend: "BackendReplica", tabela: str):
+        self._backend = backend
+        self._tabela = tabela
+        self._cadeia: List = []
+        self._operacao = "select"
+
+    def __getattr__(self, nome):
+        def chamada(*args, **kwargs):
+            if nome in LEITURAS or nome in ESCRITAS:
+                self._operacao = nome
+            self._cadeia.append((nome, args, kwargs))
+            return self
+        return chamada
+
+    def _repetir(self, builder):
+        for nome, args, kwargs in self._cadeia:
+            builder = getattr(builder, nome)(*args, **kwargs)
+        return builder
+
+    def execute(self):
+        b = self._backend
+        if self._operacao in LEITURAS:
+            b.garantir_atualizada(self._tabela)
+            return self._repetir(b.local.table(self._tabela)).execute()
+        resp = self._repetir(b.primario.table(self._tabela)).execute()
+        linhas = resp.data if isinstance(resp.data, list) else [resp.data] if resp.data else []
+        if self._operacao == "delete":
+            b.remover(self._tabela, [l.get("id") for l in linhas])
+        else:
+            b.aplicar(self._tabela, linhas)
+        return resp
+
+
+class BackendReplica:
+    """
+    Envolve o backend primário (Supabase): as `tabelas` replicadas são lidas de
+    um arquivo SQLite local, atualizado só com as linhas gravadas desde a
+    última marca (alterado_em, carimbado pelo banco), com `sobreposicao`
+    segundos de folga para transações que terminam depois de carimbar.
+    Leituras de uma tabela mais velha que `atraso_max` segundos sincronizam
+    antes. Exclusões feitas fora deste processo só aparecem numa sincronização
+    completa, feita a cada `completa_a_cada` segundos.
+    """
+
+    def __init__(self, primario, caminho: str, tabelas: Iterable[str] = TABELAS,
+                 atraso_max: float = 60.0, sobreposicao: float = 5.0,
+                 completa_a_cada: float = 3600.0):
+        self.primario = primario
+        self.local = BackendSQLite(caminho)
+        self.tabelas = tuple(tabelas)
+        self.atraso_max = atraso_max
+        self.sobreposicao = sobreposicao
+        self.completa_a_cada = completa_a_cada
+        self._locks = {t: threading.Lock() for t in self.tabelas}
+        self._sincronizado_em: Dict[str, float] = {}
+        self._ultimo_delta: Dict[str, int] = {}
+        self._preparado = False
+        self._por_thread = threading.local()
+
+    def table(self, nome: str):
+        if nome not in self.tabelas:
+            return self.primario.table(nome)
+        return _ConsultaRoteada(self, nome)
+
+    # ---- arquivo local ----
+    def _conexao(self):
+        con = self.local.conexao()
+        if not self._preparado:
+            con.execute(CONTROLE)
+            if "completa_em" not in self.local._colunas(con, "_sincronizacao"):
+                con.execute("ALTER TABLE _sincronizacao ADD COLUMN completa_em REAL")
+            for t, em in con.execute("SELECT tabela, sincronizado_em FROM _sincronizacao"):
+                # relógio de parede no arquivo; monotônico em memória
+                idade = max(time.time() - (em or 0), 0)
+                self._sincronizado_em.setdefault(t, time.monotonic() - idade)
+            self._preparado = True
+        if not getattr(self._por_thread, "sem_fk", False):
+            # a réplica espelha o primário: a integridade referencial é dele
+            con.execute("PRAGMA foreign_keys=OFF")
+            self._por_thread.sem_fk = True
+        return con
+
+    def _marca(self, tabela: str) -> Optional[str]:
+        linha = self._conexao().execute(
+            "SELECT marca FROM _sincronizacao WHERE tabela = ?", (tabela,)
+        ).fetchone()
+        return linha[0] if linha else None
+
+    def _completa_em(self, tabela: str) -> float:
+        """Relógio de parede da última sincronização completa (0 se nunca houve)."""
+        linha = self._conexao().execute(
+            "SELECT completa_em FROM _sincronizacao WHERE tabela = ?", (tabela,)
+        ).fetchone()
+        return (linha[0] or 0.0) if linha else 0.0
+
+    def aplicar(self, tabela: str, linhas: List[Dict]):
+        """Grava (upsert por id) linhas vindas do primário na réplica."""
+        colunas = [c for c, _ in ESQUEMA[tabela]]
+        linhas = [l for l in linhas if l.get("id") is not None]
+        if not linhas:
+            return
+        lista = ", ".join(f'"{c}"' for c in colunas)
+        sets = ", ".join(f'"{c}" = excluded."{c}"' for c in colunas if c != "id")
+        sql = (f'INSERT INTO "{tabela}" ({lista}) VALUES ({", ".join("?" * len(colunas))}) '
+               f'ON CONFLICT ("id") DO UPDATE SET {sets}')
+        con = self._conexao()
+        with con:
+            con.executemany(sql, [[l.get(c) for c in colunas] for l in linhas])
+
+    def remover(self, tabela: str, ids: List):
+        ids = [i for i in ids if i is not None]
+        if ids:
+            con = self._conexao()
+            with con:
+                con.execute(f'DELETE FROM "{tabela}" WHERE id IN ({",".join("?" * len(ids))})', ids)
+
+    # ---- sincronização ----
+    def _baixar(self, tabela: str, desde: Optional[str]):
+        """Linhas do primário alteradas depois de `desde` (todas se None), em lotes por id."""
+        ultimo_id = None
+        while True:
+            q = self.primario.table(tabela).select("*")
+            if desde:
+                q = q.gt(MARCA, desde)
+            if ultimo_id is not None:
+                q = q.gt("id", ultimo_id)
+            lote = q.order("id").limit(LOTE).execute().data or []
+            if lote:
+                yield lote
+            if len(lote) < LOTE:
+                return
+            ultimo_id = lote[-1]["id"]
+
+    def _sincronizar_tabela(self, tabela: str, completa: bool) -> int:
+        marca = None if completa else self._marca(tabela)
+        desde = None
+        if marca:
+            desde = (datetime.datetime.fromisoformat(marca)
+                     - datetime.timedelta(seconds=self.sobreposicao)).isoformat()
+        nova, total, vistos = marca, 0, set()
+        for lote in self._baixar(tabela, desde):
+            self.aplicar(tabela, lote)
+            total += len(lote)
+            for l in lote:
+                vistos.add(l["id"])
+                v = normalizar_marca(l.get(MARCA))
+                if v and (nova is None or v > nova):
+                    nova = v
+        con = self._conexao()
+        with con:
+            if completa:
+                # o que não veio do primário foi excluído lá
+                locais = [r[0] for r in con.execute(f'SELECT id FROM "{tabela}"')]
+                fora = [i for i in locais if i not in vistos]
+                for i in range(0, len(fora), 500):
+                    parte = fora[i:i + 500]
+                    con.execute(f'DELETE FROM "{tabela}" WHERE id IN ({",".join("?" * len(parte))})', parte)
+            con.execute(
+                "INSERT INTO _sincronizacao (tabela, marca, sincronizado_em, completa_em) "
+                "VALUES (?, ?, ?, ?) "
+                "ON CONFLICT(tabela) DO UPDATE SET marca = excluded.marca, "
+                "sincronizado_em = excluded.sincronizado_em, "
+                "completa_em = COALESCE(excluded.completa_em, _sincronizacao.completa_em)",
+                (tabela, nova, time.time(), time.time() if completa else None),
+            )
+        self._sincronizado_em[tabela] = time.monotonic()
+        self._ultimo_delta[tabela] = total
+        return total
+
+    def sincronizar(self, tabelas: Optional[Iterable[str]] = None, completa: bool = False) -> Dict[str, int]:
+        """Sincroniza agora; retorna quantas linhas vieram do primário por tabela."""
+        resultado = {}
+        for t in tabelas or self.tabelas:
+            with self._locks[t]:
+                resultado[t] = self._sincronizar_tabela(t, completa)
+        return resultado
+
+    def garantir_atualizada(self, tabela: str):
+        self._conexao()
+        if time.monotonic() - self._sincronizado_em.get(tabela, float("-inf")) <= self.atraso_max:
+            return
+        with self._locks[tabela]:
+            # outra sessão pode ter sincronizado enquanto esta esperava o lock
+            if time.monotonic() - self._sincronizado_em.get(tabela, float("-inf")) > self.atraso_max:
+                # de tempos em tempos, completa: traz as exclusões feitas no primário
+                completa = time.time() - self._completa_em(tabela) > self.completa_a_cada
+                self._sincronizar_tabela(tabela, completa=completa)
+
+    def estatisticas(self) -> Dict:
+        con = self._conexao()
+        agora = time.monotonic()
+        por_tabela = {}
+        for t in self.tabelas:
+            em, completa = self._sincronizado_em.get(t), self._completa_em(t)
+            por_tabela[t] = {
+                "linhas": con.execute(f'SELECT COUNT(*) FROM "{t}"').fetchone()[0],
+                "marca": self._marca(t),
+                "idade_s": None if em is None else round(agora - em, 1),
+                "completa_ha_s": round(time.time() - completa, 1) if completa else None,
+                "ultimo_delta": self._ultimo_delta.get(t),
+            }
+        return {"backend": "replica", "arquivo": self.local.caminho,
+                "atraso_max_s": self.atraso_max, "completa_a_cada_s": self.completa_a_cada,
+                "tabelas": por_tabela}
@@ -0,0 +1,325 @@
+# backend_sqlite.py – Backend local em SQLite com a mesma API do cliente Supabase
+import os
+import sqlite3
+import threading
+from typing import Dict, List, Optional, Tuple
+
+from backend_base import ConsultaBase, ErroBackend, chave_estrangeira
+
+# Esquema equivalente ao do Supabase (colunas usadas pelos módulos de domínio)
+ESQUEMA = {
+    "pacientes": [
+        ("id", "INTEGER PRIMARY KEY AUTOINCREMENT"), ("nome", "TEXT"),
+        ("data_nasc", "TEXT"), ("idade", "INTEGER"), ("cpf", "TEXT"), ("rg", "TEXT"),
+        ("email", "TEXT"), ("tel", "TEXT"), ("tel2", "TEXT"), ("endereco", "TEXT"),
+        ("numero", "TEXT"), ("complemento", "TEXT"), ("bairro", "TEXT"), ("cep", "TEXT"),
+        ("cidade", "TEXT"), ("estado", "TEXT"), ("plano", "TEXT"),
+        ("historico", "TEXT"), ("observacao", "TEXT"),
+        ("criado_em", "TEXT"), ("atualizado_em", "TEXT"), ("alterado_em", "TEXT"),
+        ("idempotencia", "TEXT"),
+    ],
+    "usuarios": [
+        ("id", "INTEGER PRIMARY KEY AUTOINCREMENT"), ("login", "TEXT UNIQUE"),
+        ("nome", "TEXT"), ("senha_hash", "TEXT"), ("role", "TEXT"),
+        ("paciente_id", "INTEGER REFERENCES pacientes(id)"),
+        ("criado_em", "TEXT"), ("atualizado_em", "TEXT"), ("created_at", "TEXT"),
+    ],
+    "agendamentos": [
+        ("id", "INTEGER PRIMARY KEY AUTOINCREMENT"),
+        ("paciente_id", "INTEGER REFERENCES pacientes(id)"),
+        ("data_consulta", "TEXT"), ("hora_consulta", "TEXT"), ("observacao", "TEXT"),
+        ("tipo_consulta", "TEXT"), ("criado_em", "TEXT"), ("atualizado_em", "TEXT"),
+        ("alterado_em", "TEXT"), ("idempotencia", "TEXT"),
+    ],
+    "transacoes": [
+        ("id", "INTEGER PRIMARY KEY AUTOINCREMENT"),
+        ("paciente_id", "INTEGER REFERENCES pacientes(id)"),
+        ("data_mov", "TEXT"), ("valor", "REAL"), ("descricao", "TEXT"),
+        ("criado_em", "TEXT"), ("atualizado_em", "TEXT"), ("alterado_em", "TEXT"),
+        ("idempotencia", "TEXT"),
+    ],
+    "prontuarios": [
+        ("id", "INTEGER PRIMARY KEY AUTOINCREMENT"),
+        ("paciente_id", "INTEGER REFERENCES pacientes(id)"),
+        ("descricao", "TEXT"), ("data_registro", "TEXT"), ("criado_em", "TEXT"),
+        ("idempotencia", "TEXT"),
+    ],
+    "mensagens": [
+        ("id", "INTEGER PRIMARY KEY AUTOINCREMENT"),
+        ("paciente_id", "INTEGER REFERENCES pacientes(id)"),
+        ("mensagem", "TEXT"), ("enviado_em", "TEXT"), ("idempotencia", "TEXT"),
+    ],
+    "laudos": [
+        ("id", "INTEGER PRIMARY KEY AUTOINCREMENT"),
+        ("paciente_id", "INTEGER REFERENCES pacientes(id)"),
+        ("laudo", "TEXT"), ("data", "TEXT"),
+    ],
+}
+
+INDICES = [
+    "CREATE INDEX IF NOT EXISTS pacientes_nome_idx ON pacientes (nome)",
+    "CREATE INDEX IF NOT EXISTS pacientes_cpf_idx ON pacientes (cpf)",
+    "CREATE INDEX IF NOT EXISTS usuarios_paciente_idx ON usuarios (paciente_id)",
+    "CREATE INDEX IF NOT EXISTS agendamentos_paciente_idx ON agendamentos (paciente_id, data_consulta, hora_consulta)",
+    "CREATE INDEX IF NOT EXISTS agendamentos_data_idx ON agendamentos (data_consulta, hora_consulta, id)",
+    "CREATE INDEX IF NOT EXISTS transacoes_paciente_idx ON transacoes (paciente_id, data_mov)",
+    "CREATE INDEX IF NOT EXISTS transacoes_data_idx ON transacoes (data_mov, id)",
+    "CREATE INDEX IF NOT EXISTS prontuarios_paciente_idx ON prontuarios (paciente_id, data_registro)",
+    "CREATE INDEX IF NOT EXISTS mensagens_paciente_idx ON mensagens (paciente_id, enviado_em)",
+    "CREATE INDEX IF NOT EXISTS laudos_paciente_idx ON laudos (paciente_id, data)",
+] + [
+    # chave dos envios da fila de escrita (ver sql/fila_escrita.sql)
+    f"CREATE UNIQUE INDEX IF NOT EXISTS {t}_idempotencia_idx ON {t} (idempotencia)"
+    for t in ("pacientes", "agendamentos", "transacoes", "prontuarios", "mensagens")
+]
+
+# Mesmas views de sql/relatorios.sql
+VIEWS = [
+    """CREATE VIEW IF NOT EXISTS relatorio_receita_diaria AS
+       SELECT data_mov, SUM(valor) AS total FROM transacoes GROUP BY data_mov""",
+    """CREATE VIEW IF NOT EXISTS relatorio_consultas_por_tipo AS
+       SELECT data_consulta, COALESCE(tipo_consulta, 'Desconhecido') AS tipo_consulta,
+              COUNT(*) AS total
+         FROM agendamentos
+        GROUP BY data_consulta, COALESCE(tipo_consulta, 'Desconhecido')""",
+]
+
+# alterado_em é carimbado pelo banco em toda inclusão ou alteração (como o
+# gatilho de sql/sincronizacao.sql): é a marca de sincronização da réplica.
+# Uma alteração que já traz alterado_em (a cópia feita pela réplica) o mantém.
+TABELAS_ALTERADO_EM = ("pacientes", "agendamentos", "transacoes")
+_AGORA = "strftime('%Y-%m-%dT%H:%M:%f', 'now')"
+GATILHOS = [
+    sql
+    for t in TABELAS_ALTERADO_EM
+    for sql in (
+        f"""CREATE TRIGGER IF NOT EXISTS {t}_alterado_em_ins AFTER INSERT ON "{t}"
+            WHEN new.alterado_em IS NULL
+            BEGIN UPDATE "{t}" SET alterado_em = {_AGORA} WHERE id = new.id; END""",
+        f"""CREATE TRIGGER IF NOT EXISTS {t}_alterado_em_upd AFTER UPDATE ON "{t}"
+            WHEN new.alterado_em IS old.alterado_em
+            BEGIN UPDATE "{t}" SET alterado_em = {_AGORA} WHERE id = new.id; END""",
+        f'CREATE INDEX IF NOT EXISTS {t}_alterado_em_idx ON "{t}" (alterado_em)',
+    )
+]
+
+# consultorio.db antigo: (tabela, coluna nova, coluna antiga)
+COLUNAS_LEGADAS = [
+    ("agendamentos", "data_consulta", "data"),
+    ("agendamentos", "hora_consulta", "hora"),
+    ("agendamentos", "observacao", "observacoes"),
+    ("prontuarios", "data_registro", "data"),
+]
+# consultorio.db antigo: (tabela antiga, tabela nova, colunas antigas, colunas novas)
+TABELAS_LEGADAS = [
+    ("financeiro", "transacoes", "paciente_id, data, valor, descricao",
+     "paciente_id, data_mov, valor, descricao"),
+    ("comunicacoes", "mensagens", "paciente_id, mensagem, data",
+     "paciente_id, mensagem, enviado_em"),
+]
+VERSAO_ESQUEMA = 1
+
+_SQL_OP = {"eq": "=", "neq": "<>", "gt": ">", "gte": ">=", "lt": "<", "lte": "<=",
+           "like": "LIKE", "ilike": "LIKE"}
+
+
+def _where(no: Tuple, params: list) -> str:
+    if no[0] == "cmp":
+        _, col, op, valor = no
+        if op == "is" or (op == "eq" and valor is None):
+            return f'"{col}" IS NULL'
+        if op == "in":
+            params.extend(valor)
+            return f'"{col}" IN ({",".join("?" * len(valor))})' if valor else "0"
+        params.append(valor.replace("*", "%") if op in ("like", "ilike") else valor)
+        return f'"{col}" {_SQL_OP[op]} ?'
+    conector, filhos = no
+    partes = [_where(f, params) for f in filhos]
+    return "(" + f" {conector.upper()} ".join(partes or ["1"]) + ")"
+
+
+def _sqlstate(e: sqlite3.Error) -> Optional[str]:
+    """O SQLSTATE que o Postgres daria para o mesmo erro (None: sem equivalente, ex.: banco travado)."""
+    msg = str(e)
+    if "no such table" in msg:
+        return "42P01"
+    if "no such column" in msg or "has no column named" in msg:
+        return "42703"
+    if isinstance(e, sqlite3.IntegrityError):
+        return "23000"
+    return None
+
+
+class ConsultaSQLite(ConsultaBase):
+
+    def _condicoes(self) -> Tuple[str, list]:
+        params: list = []
+        if not self.filtros:
+            return "", params
+        return " WHERE " + _where(("and", self.filtros), params), params
+
+    def execute(self):
+        con = self.backend.conexao()
+        try:
+            if self.operacao == "select":
+                return self._select(con)
+            if self.operacao in ("insert", "upsert"):
+                return self._inserir(con)
+            if self.operacao == "update":
+                return self._atualizar(con)
+            return self._apagar(con)
+        except sqlite3.Error as e:
+            raise ErroBackend(f"{self.tabela}: {e}", code=_sqlstate(e)) from e
+
+    def _select(self, con):
+        where, params = self._condicoes()
+        total = None
+        if self.contagem:
+            total = con.execute(f'SELECT COUNT(*) FROM "{self.tabela}"{where}', params).fetchone()[0]
+            if self.apenas_contagem:
+                return self._resposta([], total)
+
+        cols = ", ".join("*" if c == "*" else f'"{c}"' for c in self.colunas) or "*"
+        fks = [chave_estrangeira(t) for t, _ in self.embutidos]
+        if cols != "*" and fks:
+            cols += ", " + ", ".join(f'"{fk}"' for fk in fks)
+        sql = f'SELECT {cols} FROM "{self.tabela}"{where}'
+        if self.ordem:
+            # nulos por último, como o backend em memória
+            sql += " ORDER BY " + ", ".join(f'"{c}" {"DESC" if d else "ASC"} NULLS LAST' for c, d in self.ordem)
+        if self.limite is not None or self.deslocamento:
+            sql += " LIMIT ? OFFSET ?"
+            params = params + [self.limite if self.limite is not None else -1, self.deslocamento]
+        linhas = [dict(r) for r in con.execute(sql, params)]
+        for (tabela, sub), fk in zip(self.embutidos, fks):
+            self._embutir(con, linhas, tabela, sub, fk)
+        return self._resposta(linhas, total)
+
+    def _embutir(self, con, linhas: List[Dict], tabela: str, sub: List[str], fk: str):
+        ids = sorted({l[fk] for l in linhas if l.get(fk) is not None})
+        relacionados: Dict = {}
+        if ids:
+            cols = "*" if "*" in sub else ", ".join(f'"{c}"' for c in set(sub) | {"id"})
+            sql = f'SELECT {cols} FROM "{tabela}" WHERE id IN ({",".join("?" * len(ids))})'
+            relacionados = {r["id"]: dict(r) for r in con.execute(sql, ids)}
+        for l in linhas:
+            l[tabela] = relacionados.get(l.get(fk))
+
+    def _inserir(self, con):
+        if not self.registros:
+            return self._resposta([], None)
+        campos = sorted({c for r in self.registros for c in r})
+        cols, valores = list(campos), ["?"] * len(campos)
+        carimbo = self._carimbo(campos)
+        if carimbo:
+            # carimbado no próprio INSERT: o do gatilho (AFTER) não sairia no RETURNING
+            cols.append("alterado_em")
+            valores.append(carimbo)
+        lista = ", ".join(f'"{c}"' for c in cols)
+        sql = f'INSERT INTO "{self.tabela}" ({lista}) VALUES ({", ".join(valores)})'
+        if self.operacao == "upsert":
+            sets = ", ".join(f'"{c}" = excluded."{c}"' for c in cols if c != self.conflito)
+            acao = f"UPDATE SET {sets}" if sets and not self.ignorar_duplicados else "NOTHING"
+            sql += f' ON CONFLICT ("{self.conflito}") DO {acao}'
+        sql += " RETURNING *"
+        linhas = []
+        with con:
+            for r in self.registros:
+                linhas.extend(dict(x) for x in con.execute(sql, [r.get(c) for c in campos]))
+        return self._resposta(linhas, None)
+
+    def _carimbo(self, cols) -> str:
+        """Expressão de alterado_em a gravar junto, se a tabela tem a marca e ela não veio."""
+        return _AGORA if self.tabela in TABELAS_ALTERADO_EM and "alterado_em" not in cols else ""
+
+    def _atualizar(self, con):
+        dados = self.registros[0]
+        sets = ", ".join(f'"{c}" = ?' for c in dados)
+        carimbo = self._carimbo(dados)
+        if carimbo:
+            sets += f', "alterado_em" = {carimbo}'
+        where, params = self._condicoes()
+        with con:
+            cur = con.execute(f'UPDATE "{self.tabela}" SET {sets}{where} RETURNING *',
+                              list(dados.values()) + params)
+            linhas = [dict(r) for r in cur]
+        return self._resposta(linhas, None)
+
+    def _apagar(self, con):
+        where, params = self._condicoes()
+        with con:
+            linhas = [dict(r) for r in con.execute(f'DELETE FROM "{self.tabela}"{where} RETURNING *', params)]
+        return self._resposta(linhas, None)
+
+
+class BackendSQLite:
+    """
+    Backend local: uma conexão por thread (modo WAL), consultas parametrizadas
+    (reaproveitadas pelo cache de statements do sqlite3) e esquema criado/migrado
+    na primeira conexão.
+    """
+
+    def __init__(self, caminho: str, statements_em_cache: int = 512):
+        self.caminho = caminho
+        self.identidade = f"sqlite:{os.path.abspath(caminho)}"
+        self.statements_em_cache = statements_em_cache
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._conexoes = 0
+        self._pronto = False
+
+    def conexao(self) -> sqlite3.Connection:
+        con = getattr(self._local, "con", None)
+        if con is None:
+            con = sqlite3.connect(
+                self.caminho, timeout=30, check_same_thread=False,
+                cached_statements=self.statements_em_cache,
+            )
+            con.row_factory = sqlite3.Row
+            con.execute("PRAGMA journal_mode=WAL")
+            con.execute("PRAGMA synchronous=NORMAL")
+            con.execute("PRAGMA foreign_keys=ON")
+            con.execute("PRAGMA busy_timeout=30000")
+            with self._lock:
+                self._conexoes += 1
+                if not self._pronto:
+                    self._preparar(con)
+                    self._pronto = True
+            self._local.con = con
+        return con
+
+    def table(self, nome: str) -> ConsultaSQLite:
+        return ConsultaSQLite(self, nome)
+
+    def estatisticas(self) -> Dict:
+        return {"backend": "sqlite", "arquivo": self.caminho, "conexoes_abertas": self._conexoes}
+
+    @staticmethod
+    def _colunas(con, tabela: str) -> List[str]:
+        return [r[1] for r in con.execute(f'PRAGMA table_info("{tabela}")')]
+
+    def _preparar(self, con: sqlite3.Connection):
+        """Cria tabelas, colunas, índices e views que faltarem; migra o consultorio.db antigo."""
+        with con:
+            for tabela, cols in ESQUEMA.items():
+                defs = ", ".join(f'"{c}" {t}' for c, t in cols)
+                con.execute(f'CREATE TABLE IF NOT EXISTS "{tabela}" ({defs})')
+                existentes = set(self._colunas(con, tabela))
+                for c, t in cols:
+                    if c not in existentes:
+                        tipo = t.split(" REFERENCES")[0].replace(" UNIQUE", "")
+                        con.execute(f'ALTER TABLE "{tabela}" ADD COLUMN "{c}" {tipo}')
+            versao = con.execute("PRAGMA user_version").fetchone()[0]
+            if versao < VERSAO_ESQUEMA:
+                self._migrar_legado(con)
+                con.execute(f"PRAGMA user_version = {VERSAO_ESQUEMA}")
+            for sql in INDICES + VIEWS + GATILHOS:
+                con.execute(sql)
+
+    def _migrar_legado(self, con: sqlite3.Connection):
+        for tabela, nova, antiga in COLUNAS_LEGADAS:
+            if antiga in self._colunas(con, tabela):
+                con.execute(f'UPDATE "{tabela}" SET "{nova}" = "{antiga}" WHERE "{nova}" IS NULL')
+        for antiga, nova, cols_antigas, cols_novas in TABELAS_LEGADAS:
+            if self._colunas(con, antiga):
+                con.execute(f'INSERT INTO "{nova}" ({cols_novas}) SELECT {cols_antigas} FROM "{antiga}"')
@@ -0,0 +1,148 @@
+# bench_dados.py – Benchmark da carga de dados de cada página sobre o backend em memória
+#
+# Uso:
+#   python benchmarks/bench_dados.py                       # 1k, 10k e 100k pacientes
+#   python benchmarks/bench_dados.py --tamanhos 1000 --latencia-ms 20
+#   python benchmarks/bench_dados.py --salvar-baseline     # grava benchmarks/baseline.json
+#
+# Sai com código 1 se alguma página ficar mais lenta que o baseline além da tolerância.
+import argparse
+import datetime
+import gc
+import json
+import os
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+RAIZ = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(RAIZ))
+TEMP = tempfile.mkdtemp(prefix="neuro-bench-")
+os.environ["NEURO_BACKEND"] = "memoria"
+os.environ["NEURO_CACHE_COMPARTILHADO"] = "0"  # mede o cache do processo, sem o arquivo do host
+os.environ["NEURO_FILA"] = os.path.join(TEMP, "fila_escrita.db")
+os.environ["NEURO_UPLOADS"] = os.path.join(TEMP, "uploads")
+
+import agendamentos
+import busca_pacientes
+import cache
+import database
+import financeiro
+import pacientes
+import prontuario
+import relatorios
+import users
+from backend_memoria import BackendMemoria
+from benchmarks.cenario import popular
+
+BASELINE = Path(__file__).resolve().parent / "baseline.json"
+
+
+def _paginas(pid: int):
+    """Mesmas chamadas de dados que cada página de neuro.py faz numa renderização."""
+    hoje = datetime.date.today().isoformat()
+    inicio_mes = datetime.date.today().replace(day=1).isoformat()
+    return {
+        "dashboard": lambda: (
+            relatorios.gerar_relatorio(),
+            agendamentos.obter_agendamentos_entre(hoje, hoje, "paciente_id, hora_consulta, observacao"),
+            pacientes.obter_pacientes_resumo(),
+        ),
+        # construir o índice de busca é medido à parte (uma vez por processo e a cada
+        # COMPLETA_A_CADA); a página usa uma página da listagem e o índice pronto
+        "indice_pacientes": lambda: busca_pacientes._construir(),
+        "pacientes": lambda: (pacientes.obter_pacientes_pagina(),
+                              busca_pacientes.buscar("maria silva"),
+                              busca_pacientes.buscar("9999")),
+        "agendamentos": lambda: (pacientes.obter_pacientes_resumo(),
+                                 agendamentos.obter_agendamentos_pagina()),
+        "prontuarios": lambda: (pacientes.obter_pacientes_resumo(),
+                                prontuario.obter_prontuarios_por_paciente(pid)),
+        "financeiro": lambda: (pacientes.obter_pacientes_resumo(),
+                               financeiro.obter_transacoes_pagina()),
+        "usuarios": lambda: (pacientes.obter_pacientes_resumo(), users.listar_usuarios_pagina()),
+        "relatorios": lambda: (relatorios.gerar_relatorio(inicio_mes, hoje),
+                               relatorios.relatorio_por_tipo_agendamento(inicio_mes, hoje)),
+        "meu_perfil": lambda: pacientes.obter_paciente_por_login(f"paciente{pid}", pid),
+        "minhas_consultas": lambda: agendamentos.obter_agendamentos_por_paciente(pid),
+    }
+
+
+def _limpar_caches():
+    cache.limpar()
+
+
+def medir(n_pacientes: int, repeticoes: int, latencia_ms: float) -> dict:
+    backend = BackendMemoria(latencia=latencia_ms / 1000)
+    popular(backend, n_pacientes)
+    # os dados do cenário não entram nas coletas do gc durante as medições
+    gc.collect()
+    gc.freeze()
+    database.usar_backend(backend)
+    busca_pacientes._indice.construido_em = 0.0  # índice do tamanho anterior
+    resultados = {}
+    for pagina, carregar in _paginas(pid=n_pacientes // 2).items():
+        tempos = []
+        for _ in range(repeticoes):
+            _limpar_caches()  # mede sempre o caminho frio, até o backend
+            t0 = time.perf_counter()
+            carregar()
+            tempos.append((time.perf_counter() - t0) * 1000)
+        resultados[pagina] = round(statistics.median(tempos), 2)
+    return resultados
+
+
+def comparar(atual: dict, baseline: dict, tolerancia: float, folga_ms: float) -> list:
+    regressoes = []
+    for tamanho, paginas in atual.items():
+        for pagina, ms in paginas.items():
+            ref = baseline.get(tamanho, {}).get(pagina)
+            if ref is not None and ms > ref * (1 + tolerancia) + folga_ms:
+                regressoes.append((tamanho, pagina, ref, ms))
+    return regressoes
+
+
+def main(argv=None) -> int:
+    ap = argparse.ArgumentParser(description="Benchmark da carga de dados por página")
+    ap.add_argument("--tamanhos", type=int, nargs="+", default=[1000, 10000, 100000])
+    ap.add_argument("--repeticoes", type=int, default=5)
+    ap.add_argument("--latencia-ms", type=float, default=0.0,
+                    help="latência simulada por chamada ao backend")
+    ap.add_argument("--tolerancia", type=float, default=0.25,
+                    help="regressão aceita, relativa ao baseline (0.25 = 25%%)")
+    ap.add_argument("--folga-ms", type=float, default=2.0,
+                    help="regressão absoluta ignorada (ruído em páginas muito rápidas)")
+    ap.add_argument("--salvar-baseline", action="store_true")
+    args = ap.parse_args(argv)
+
+    atual = {}
+    for n in args.tamanhos:
+        atual[str(n)] = medir(n, args.repeticoes, args.latencia_ms)
+        print(f"\n{n} pacientes (mediana de {args.repeticoes}, ms)")
+        for pagina, ms in atual[str(n)].items():
+            print(f"  {pagina:<18} {ms:>10.2f}")
+
+    if args.salvar_baseline:
+        BASELINE.write_text(json.dumps(atual, indent=2, sort_keys=True) + "\n", encoding="utf-8")
+        print(f"\nBaseline salvo em {BASELINE}")
+        return 0
+    if not BASELINE.exists():
+        print("\nSem baseline; rode com --salvar-baseline para criar.")
+        return 0
+
+    regressoes = comparar(atual, json.loads(BASELINE.read_text(encoding="utf-8")),
+                          args.tolerancia, args.folga_ms)
+    for tamanho, pagina, ref, ms in regressoes:
+        print(f"REGRESSÃO {tamanho} pacientes / {pagina}: {ref:.2f} ms -> {ms:.2f} ms")
+    return 1 if regressoes else 0
+
+
+if __name__ == "__main__":
+    try:
+        codigo = main()
+    finally:
+        shutil.rmtree(TEMP, ignore_errors=True)
+    sys.exit(codigo)
@@ -0,0 +1,194 @@
+# carga.py – Teste de carga: sessões simultâneas de neuro.py via AppTest, sem rede
+#
+# Uso:
+#   python benchmarks/carga.py --admins 4 --pacientes 16 --rodadas 3
+#   python benchmarks/carga.py --n-pacientes 10000 --latencia-ms 15
+#
+# Cada sessão percorre as rotas do option_menu do seu perfil; o backend é o
+# BackendMemoria populado por benchmarks/cenario.py. Fila de escrita, uploads
+# e índices ficam num diretório temporário e o cache compartilhado fica
+# desligado: nada do teste toca os arquivos de uma instalação no mesmo host.
+import argparse
+import logging
+import math
+import os
+import resource
+import shutil
+import sys
+import tempfile
+import threading
+import time
+import tracemalloc
+from pathlib import Path
+
+RAIZ = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(RAIZ))
+TEMP = tempfile.mkdtemp(prefix="neuro-carga-")
+os.environ.update({
+    "NEURO_BACKEND": "memoria",
+    "NEURO_FILA": os.path.join(TEMP, "fila_escrita.db"),
+    "NEURO_UPLOADS": os.path.join(TEMP, "uploads"),
+    "NEURO_CACHE_COMPARTILHADO": "0",
+    "NEURO_EXAMES_PORTA": "0",
+})
+os.environ.pop("NEURO_REPLICA", None)
+
+import streamlit as st
+import streamlit_option_menu
+from streamlit.runtime import Runtime
+from streamlit.runtime.scriptrunner.script_cache import ScriptCache
+from streamlit.runtime.state.session_state import SCRIPT_RUN_WITHOUT_ERRORS_KEY
+from streamlit.testing.v1 import AppTest
+from streamlit.testing.v1.util import patch_config_options
+
+import cache
+import database
+from backend_memoria import BackendMemoria
+from benchmarks.cenario import popular
+
+# o harness e as threads das sessões tocam no session_state fora de um script
+logging.getLogger("streamlit.runtime.scriptrunner_utils.script_run_context").setLevel(logging.ERROR)
+
+APP = str(RAIZ / "neuro.py")
+ROTAS_ADMIN = ["Dashboard", "Pacientes", "Agendamentos", "Prontuários", "Financeiro",
+               "Mensagens", "Laudos", "Usuários", "Relatórios", "Busca em Exames", "Diagnóstico"]
+ROTAS_PACIENTE = ["Meu Perfil", "Meus Exames", "Minhas Consultas"]
+
+
+def _option_menu(menu_title, options, *args, **kwargs):
+    # componente customizado não roda no AppTest: a rota vem do session_state
+    return st.session_state.get("_rota_carga", options[0])
+
+
+def _runtime_compartilhado():
+    """
+    AppTest.run() instala um Runtime falso global e o zera ao terminar; com
+    sessões em paralelo uma zeraria o da outra. Passa a devolver sempre o último
+    criado, como o único Runtime de um servidor real.
+    """
+    ultimo = {}
+
+    def instance(cls):
+        if cls._instance is not None:
+            ultimo["runtime"] = cls._instance
+        return ultimo["runtime"]
+
+    Runtime.instance = classmethod(instance)
+    Runtime.exists = classmethod(lambda cls: cls._instance is not None or bool(ultimo))
+
+
+def _compilar_uma_vez():
+    """
+    Cada AppTest.run() cria um ScriptCache novo e recompila neuro.py; compilações
+    simultâneas já falharam com SystemError no ast.parse. Compila aqui, antes das
+    threads, e todas as sessões passam a usar esse mesmo bytecode.
+    """
+    compartilhado = ScriptCache()
+    original = ScriptCache.get_bytecode
+    original(compartilhado, APP)
+    ScriptCache.get_bytecode = lambda self, caminho: original(compartilhado, caminho)
+
+
+def _percentil(valores, p):
+    if not valores:
+        return 0.0
+    ordenados = sorted(valores)
+    return ordenados[max(0, math.ceil(p / 100 * len(ordenados)) - 1)]
+
+
+class Sessao(threading.Thread):
+
+    def __init__(self, auth: dict, rotas, rodadas: int, timeout: float, medicoes: list, erros: list):
+        super().__init__(daemon=True)
+        self.auth, self.rotas, self.rodadas, self.timeout = auth, rotas, rodadas, timeout
+        self.medicoes, self.erros = medicoes, erros
+
+    def run(self):
+        at = AppTest.from_file(APP, default_timeout=self.timeout)
+        at.session_state["auth"] = self.auth
+        for _ in range(self.rodadas):
+            for rota in self.rotas:
+                at.session_state["_rota_carga"] = rota
+                t0 = time.perf_counter()
+                try:
+                    at.run()
+                    falha = [e.value for e in at.exception] + [e.value for e in at.error]
+                    # erro de compilação não vira elemento: só desliga esta marca
+                    if not falha and not at.session_state[SCRIPT_RUN_WITHOUT_ERRORS_KEY]:
+                        falha = ["o script não rodou até o fim (erro de compilação?)"]
+                except Exception as e:
+                    falha = [repr(e)]
+                ms = (time.perf_counter() - t0) * 1000
+                if falha:
+                    self.erros.append((rota, falha[0]))
+                else:  # renderização que falhou não entra nos tempos
+                    self.medicoes.append((rota, ms))
+
+
+def main(argv=None) -> int:
+    ap = argparse.ArgumentParser(description="Teste de carga de sessões simultâneas")
+    ap.add_argument("--admins", type=int, default=2)
+    ap.add_argument("--pacientes", type=int, default=8, help="sessões de pacientes")
+    ap.add_argument("--rodadas", type=int, default=2, help="voltas pelo menu por sessão")
+    ap.add_argument("--n-pacientes", type=int, default=1000, help="pacientes no cenário")
+    ap.add_argument("--latencia-ms", type=float, default=0.0)
+    ap.add_argument("--timeout", type=float, default=120.0, help="limite por renderização (s)")
+    args = ap.parse_args(argv)
+
+    backend = BackendMemoria(latencia=args.latencia_ms / 1000)
+    popular(backend, args.n_pacientes)
+    database.usar_backend(backend)
+    cache.limpar()
+    streamlit_option_menu.option_menu = _option_menu
+    _runtime_compartilhado()
+    _compilar_uma_vez()
+
+    medicoes, erros = [], []
+    sessoes = [
+        Sessao({"user": f"admin{i}", "name": "Administrador", "role": "admin", "pid": None},
+               ROTAS_ADMIN, args.rodadas, args.timeout, medicoes, erros)
+        for i in range(args.admins)
+    ] + [
+        Sessao({"user": f"paciente{pid}", "name": f"Paciente {pid}", "role": "paciente", "pid": pid},
+               ROTAS_PACIENTE, args.rodadas, args.timeout, medicoes, erros)
+        for pid in range(1, args.pacientes + 1)
+    ]
+
+    tracemalloc.start()
+    t0 = time.perf_counter()
+    # cada AppTest.run() liga global.appTest e o desliga ao terminar; sem esta
+    # camada externa, uma sessão que termina desliga a flag no meio do script de
+    # outra e os selectbox dela ficam sem format_func (KeyError no run seguinte)
+    with patch_config_options({"global.appTest": True}):
+        for s in sessoes:
+            s.start()
+        for s in sessoes:
+            s.join()
+    duracao = time.perf_counter() - t0
+    _, pico_py = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    pico_rss_mb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+    print(f"{len(sessoes)} sessões ({args.admins} admin, {args.pacientes} pacientes), "
+          f"{len(medicoes)} renderizações em {duracao:.1f} s")
+    print(f"Vazão: {len(medicoes) / duracao:.2f} renderizações/s")
+    print(f"Pico de memória: {pico_rss_mb:.0f} MB RSS, {pico_py / 2**20:.0f} MB alocados em Python")
+    print(f"\n{'página':<18}{'n':>6}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}")
+    for rota in ROTAS_ADMIN + ROTAS_PACIENTE:
+        tempos = [ms for r, ms in medicoes if r == rota]
+        if tempos:
+            print(f"{rota:<18}{len(tempos):>6}{_percentil(tempos, 50):>10.1f}"
+                  f"{_percentil(tempos, 95):>10.1f}{_percentil(tempos, 99):>10.1f}")
+    if erros:
+        print(f"\n{len(erros)} renderizações com erro; primeiras:")
+        for rota, msg in erros[:10]:
+            print(f"  {rota}: {str(msg)[:200]}")
+    return 1 if erros else 0
+
+
+if __name__ == "__main__":
+    try:
+        codigo = main()
+    finally:
+        shutil.rmtree(TEMP, ignore_errors=True)
+    sys.exit(codigo)
@@ -0,0 +1,53 @@
+# cenario.py – Popula um BackendMemoria com pacientes, agendamentos e transações sintéticos
+import datetime
+import random
+
+NOMES = ["João", "Maria", "José", "Ana", "Francisco", "Antônia", "Luíza", "Pedro",
+         "Paulo", "Lucas", "Mariana", "Gabriel", "Helena", "Davi", "Alice", "Théo"]
+SOBRENOMES = ["Silva", "Souza", "Oliveira", "Santos", "Lima", "Pereira", "Ferreira",
+              "Costa", "Rodrigues", "Almeida", "Nascimento", "Araújo", "Holanda"]
+TIPOS = ["Plano de Saúde", "Particular"]
+
+AGENDAMENTOS_POR_PACIENTE = 3
+TRANSACOES_POR_PACIENTE = 2
+
+
+def popular(backend, n_pacientes: int, semente: int = 42, hoje: datetime.date = None):
+    """
+    Gera n_pacientes (com usuário 'paciente<id>'), 3 agendamentos e 2 transações
+    por paciente, espalhados pelos últimos ~3 anos; parte das consultas cai em `hoje`.
+    """
+    rnd = random.Random(semente)
+    hoje = hoje or datetime.date.today()
+    pacientes, usuarios, agendamentos, transacoes = [], [], [], []
+    for pid in range(1, n_pacientes + 1):
+        nasc = hoje - datetime.timedelta(days=rnd.randrange(365, 18 * 365))
+        pacientes.append({
+            "id": pid,
+            "nome": f"{rnd.choice(NOMES)} {rnd.choice(SOBRENOMES)} {rnd.choice(SOBRENOMES)}",
+            "data_nasc": nasc.isoformat(),
+            "cpf": f"{rnd.randrange(10**10, 10**11)}",
+            "tel": f"(85) 9{rnd.randrange(10**7, 10**8)}",
+            "cidade": "Maracanaú", "estado": "CE",
+            "historico": "Histórico clínico. " * 20,
+            "observacao": "Observação. " * 10,
+        })
+        usuarios.append({"id": pid, "login": f"paciente{pid}", "nome": pacientes[-1]["nome"],
+                         "role": "paciente", "paciente_id": pid})
+        for _ in range(AGENDAMENTOS_POR_PACIENTE):
+            dia = hoje if rnd.random() < 0.002 else hoje - datetime.timedelta(days=rnd.randrange(1100))
+            agendamentos.append({
+                "paciente_id": pid, "data_consulta": dia.isoformat(),
+                "hora_consulta": f"{rnd.randrange(7, 19):02d}:{rnd.choice(['00', '30'])}",
+                "tipo_consulta": rnd.choice(TIPOS), "observacao": "",
+            })
+        for _ in range(TRANSACOES_POR_PACIENTE):
+            dia = hoje - datetime.timedelta(days=rnd.randrange(1100))
+            transacoes.append({
+                "paciente_id": pid, "data_mov": dia.isoformat(),
+                "valor": float(rnd.choice([150, 200, 250, 300])), "descricao": "Consulta",
+            })
+    backend.carregar("pacientes", pacientes)
+    backend.carregar("usuarios", usuarios)
+    backend.carregar("agendamentos", agendamentos)
+    backend.carregar("transacoes", transacoes)
@@ -0,0 +1,115 @@
+# inicio.py – Perfil de importação do cold start de neuro.py, com orçamento de tempo
+#
+# Uso:
+#   python benchmarks/inicio.py                          # paciente e admin
+#   python benchmarks/inicio.py --perfis paciente --top 30
+#   python benchmarks/inicio.py --orcamento-ms 800       # mesmo orçamento para todos
+#
+# Cada perfil roda num interpretador novo com `python -X importtime`; contam só
+# os módulos importados durante a primeira renderização da página inicial do
+# perfil (streamlit e o AppTest já estão carregados, como num servidor recém-subido).
+# Sai com código 1 se a importação de algum perfil passar do orçamento.
+import argparse
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from collections import defaultdict
+from pathlib import Path
+
+RAIZ = Path(__file__).resolve().parent.parent
+APP = str(RAIZ / "neuro.py")
+MARCA = "-- inicio da renderizacao --"
+
+AUTH = {
+    "paciente": {"user": "paciente1", "name": "Paciente", "role": "paciente", "pid": 1},
+    "admin": {"user": "admin", "name": "Administrador", "role": "admin", "pid": None},
+}
+# importações feitas na primeira renderização (ms); revisar ao adicionar dependências
+ORCAMENTO_MS = {"paciente": 900, "admin": 1000}
+
+
+def _filho(perfil: str):
+    """Roda dentro do interpretador com -X importtime."""
+    temp = tempfile.mkdtemp(prefix="neuro-inicio-")
+    os.environ["NEURO_BACKEND"] = "memoria"
+    os.environ["NEURO_CACHE_COMPARTILHADO"] = "0"
+    os.environ["NEURO_FILA"] = os.path.join(temp, "fila_escrita.db")
+    os.environ["NEURO_UPLOADS"] = os.path.join(temp, "uploads")
+    sys.path.insert(0, str(RAIZ))
+    from streamlit.testing.v1 import AppTest
+
+    at = AppTest.from_file(APP, default_timeout=300)
+    at.session_state["auth"] = AUTH[perfil]
+    print(MARCA, file=sys.stderr, flush=True)
+    t0 = time.perf_counter()
+    try:
+        at.run()
+        ms = (time.perf_counter() - t0) * 1000
+    finally:
+        shutil.rmtree(temp, ignore_errors=True)
+    print(json.dumps({"ms": ms, "erros": [e.value for e in at.exception]}))
+
+
+def _ler_importtime(stderr: str):
+    """-> {pacote de topo: ms próprios} dos imports após a marca."""
+    por_pacote = defaultdict(float)
+    depois = False
+    for linha in stderr.splitlines():
+        if linha.strip() == MARCA:
+            depois = True
+            continue
+        if not depois or not linha.startswith("import time:") or "self [us]" in linha:
+            continue
+        proprio, _, nome = linha[len("import time:"):].split("|", 2)
+        por_pacote[nome.strip().split(".")[0]] += int(proprio) / 1000
+    return dict(por_pacote)
+
+
+def medir(perfil: str) -> dict:
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", __file__, "--filho", perfil],
+        capture_output=True, text=True, cwd=RAIZ,
+    )
+    if proc.returncode != 0:
+        raise RuntimeError(f"falha ao renderizar como {perfil}:\n{proc.stderr[-2000:]}")
+    resultado = json.loads(proc.stdout.strip().splitlines()[-1])
+    resultado["pacotes"] = _ler_importtime(proc.stderr)
+    resultado["importacao_ms"] = sum(resultado["pacotes"].values())
+    return resultado
+
+
+def main(argv=None) -> int:
+    ap = argparse.ArgumentParser(description="Perfil de importação do cold start")
+    ap.add_argument("--perfis", nargs="+", choices=list(AUTH), default=list(AUTH))
+    ap.add_argument("--top", type=int, default=15, help="pacotes mais lentos a listar")
+    ap.add_argument("--orcamento-ms", type=float, default=None,
+                    help="substitui o orçamento padrão de cada perfil")
+    ap.add_argument("--filho", choices=list(AUTH), help=argparse.SUPPRESS)
+    args = ap.parse_args(argv)
+
+    if args.filho:
+        _filho(args.filho)
+        return 0
+
+    estourou = False
+    for perfil in args.perfis:
+        r = medir(perfil)
+        orcamento = args.orcamento_ms or ORCAMENTO_MS[perfil]
+        print(f"\n{perfil}: primeira renderização {r['ms']:.0f} ms, "
+              f"importações {r['importacao_ms']:.0f} ms (orçamento {orcamento:.0f} ms)")
+        for pacote, ms in sorted(r["pacotes"].items(), key=lambda x: -x[1])[:args.top]:
+            print(f"  {pacote:<28} {ms:>8.1f} ms")
+        if r["erros"]:
+            print(f"  exceções na página: {r['erros']}")
+        if r["importacao_ms"] > orcamento:
+            print(f"  ESTOUROU o orçamento de {orcamento:.0f} ms")
+            estourou = True
+    return 1 if estourou else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
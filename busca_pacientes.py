@@ -0,0 +1,275 @@
+# busca_pacientes.py – Índice em memória para busca de pacientes (nome, CPF, telefone)
+import bisect
+import datetime
+import heapq
+import os
+import re
+import threading
+import time
+import unicodedata
+from collections import Counter
+from typing import Dict, List, Optional
+
+import cache
+from backend_replica import normalizar_marca
+from database import COLUNA_AUSENTE, paginar_keyset, tabela
+
+COLUNAS_INDICE = "id, nome, cpf, tel, tel2"
+SIMILARIDADE_MINIMA = 0.3
+MIN_DIGITOS = 3     # consultas numéricas menores que isso não são buscadas
+LOTE_CARGA = 1000   # linhas por requisição ao montar o índice (max-rows do PostgREST)
+# Vencido o TTL de pacientes, o índice só baixa e reindexa os pacientes com
+# alterado_em (carimbado pelo banco) posterior à última marca, menos SOBREPOSICAO
+# segundos de folga. A reconstrução completa (que traz as exclusões) é Python
+# puro e custa CPU proporcional ao cadastro, ~7 s com 100 mil pacientes,
+# disputando o GIL com as sessões: fica para a primeira busca e a cada
+# COMPLETA_A_CADA segundos.
+MARCA = "alterado_em"
+SOBREPOSICAO = 5.0
+COMPLETA_A_CADA = float(os.getenv("NEURO_BUSCA_COMPLETA_S", 6 * 3600))
+
+
+def dobrar(texto: str) -> str:
+    """Minúsculas, sem acentos e só com letras/dígitos/espaços ("João" -> "joao")."""
+    texto = unicodedata.normalize("NFD", texto or "")
+    texto = "".join(c for c in texto if unicodedata.category(c) != "Mn")
+    return re.sub(r"[^a-z0-9 ]+", " ", texto.lower()).strip()
+
+
+def _digitos(texto: str) -> str:
+    return re.sub(r"\D+", "", texto or "")
+
+
+def _trigramas(palavra: str) -> set:
+    p = f"  {palavra} "
+    return {p[i:i + 3] for i in range(len(p) - 2)}
+
+
+class IndicePacientes:
+    """
+    Índice invertido: termo -> pacientes, com o vocabulário ordenado para
+    prefixos (bisect) e trigramas -> palavras para a busca aproximada.
+    Aceita inclusões e alterações incrementais; as feitas durante uma
+    reconstrução são reaplicadas sobre o índice novo.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._pids: Dict[str, set] = {}         # termo -> {pid}
+        self._vocabulario: List[str] = []       # termos, ordenados
+        self._trigramas: Dict[str, set] = {}    # trigrama -> {palavra do nome}
+        self._pacientes: Dict[int, Dict] = {}   # pid -> {id, nome, cpf, tel}
+        self._termos: Dict[int, List[str]] = {} # pid -> termos (para desindexar)
+        self._durante: Optional[List[Dict]] = None  # adicionar() durante construir()
+        self.construido_em = 0.0
+
+    def construir(self, registros: List[Dict]):
+        with self._lock:
+            self._durante = []
+        try:
+            pids, trigramas, pacientes, termos = {}, {}, {}, {}
+            for p in registros:
+                self._indexar(p, pids, trigramas, pacientes, termos)
+            vocabulario = sorted(pids)
+        except BaseException:
+            with self._lock:
+                self._durante = None
+            raise
+        with self._lock:
+            durante, self._durante = self._durante, None
+            self._pids, self._vocabulario = pids, vocabulario
+            self._trigramas, self._pacientes, self._termos = trigramas, pacientes, termos
+            for p in durante:
+                self._atualizar(p)
+            self.construido_em = time.monotonic()
+
+    def adicionar(self, p: Dict):
+        """Inclui ou reindexa (se o id já existe) um paciente."""
+        with self._lock:
+            self._atualizar(p)
+            if self._durante is not None:
+                self._durante.append(p)
+
+    def _atualizar(self, p: Dict):
+        pid = p.get("id")
+        for termo in self._termos.pop(pid, ()):
+            # o termo fica no vocabulário, vazio, até a próxima reconstrução
+            self._pids[termo].discard(pid)
+        novos = self._indexar(p, self._pids, self._trigramas, self._pacientes, self._termos)
+        for termo in novos:
+            bisect.insort(self._vocabulario, termo)
+
+    @staticmethod
+    def _indexar(p: Dict, pids: dict, trigramas: dict, pacientes: dict,
+                 termos_por_pid: dict) -> List[str]:
+        """Indexa um paciente e devolve os termos que ainda não existiam."""
+        pid = p.get("id")
+        if pid is None:
+            return []
+        pacientes[pid] = {
+            "id": pid, "nome": p.get("nome") or "",
+            "cpf": p.get("cpf") or "", "tel": p.get("tel") or "",
+        }
+        termos = set(dobrar(p.get("nome")).split())
+        novos = []
+        for palavra in termos:
+            if palavra not in pids:
+                for tri in _trigramas(palavra):
+                    trigramas.setdefault(tri, set()).add(palavra)
+        dig = _digitos(p.get("cpf"))
+        if dig:
+            termos.add(dig)
+        for campo in ("tel", "tel2"):
+            # todos os sufixos: o prefixo de um sufixo é qualquer trecho do número,
+            # então "9999" acha "(85) 99999-1234" sem o DDD
+            dig = _digitos(p.get(campo))
+            termos.update(dig[i:] for i in range(max(len(dig) - MIN_DIGITOS + 1, 1)))
+        for termo in termos:
+            if termo not in pids:
+                pids[termo] = set()
+                novos.append(termo)
+            pids[termo].add(pid)
+        termos_por_pid[pid] = list(termos)
+        return novos
+
+    def _por_prefixo(self, prefixo: str) -> set:
+        i = bisect.bisect_left(self._vocabulario, prefixo)
+        achados = set()
+        while i < len(self._vocabulario) and self._vocabulario[i].startswith(prefixo):
+            achados |= self._pids[self._vocabulario[i]]
+            i += 1
+        return achados
+
+    def _aproximados(self, palavra: str) -> Dict[int, float]:
+        """Pacientes com alguma palavra do nome parecida (similaridade de trigramas)."""
+        tris = _trigramas(palavra)
+        contagem = Counter()
+        for tri in tris:
+            contagem.update(self._trigramas.get(tri, ()))
+        pontos: Dict[int, float] = {}
+        for similar, n in contagem.items():
+            sim = n / len(tris | _trigramas(similar))
+            if sim >= SIMILARIDADE_MINIMA:
+                for pid in self._pids[similar]:
+                    pontos[pid] = max(pontos.get(pid, 0.0), sim)
+        return pontos
+
+    def buscar(self, consulta: str, limite: int = 20) -> List[Dict]:
+        """
+        Melhores `limite` pacientes: cada palavra casa por prefixo (peso 1) ou,
+        na falta, por semelhança; todas as palavras precisam casar.
+        Só dígitos: prefixo do CPF ou qualquer trecho do telefone.
+        """
+        dig = _digitos(consulta)
+        palavras = dobrar(consulta).split()
+        if not palavras:
+            return []
+        with self._lock:
+            if len(dig) >= MIN_DIGITOS and dig == "".join(palavras):
+                pontos = {pid: 1.0 for pid in self._por_prefixo(dig)}
+            else:
+                pontos = None
+                for palavra in palavras:
+                    achados = {pid: 1.0 for pid in self._por_prefixo(palavra)}
+                    if not achados:
+                        achados = self._aproximados(palavra)
+                    if pontos is None:
+                        pontos = achados
+                    else:
+                        pontos = {pid: v + achados[pid] for pid, v in pontos.items()
+                                  if pid in achados}
+            melhores = heapq.nsmallest(
+                limite, pontos.items(),
+                key=lambda kv: (-kv[1], self._pacientes[kv[0]]["nome"])
+            )
+            return [dict(self._pacientes[pid]) for pid, _ in melhores]
+
+
+_indice = IndicePacientes()
+_marca: Optional[str] = None     # maior alterado_em já indexado
+_completo_em = 0.0               # monotônico da última reconstrução completa
+_sem_marca = False               # banco sem alterado_em (sql/sincronizacao.sql não rodou)
+
+
+_reconstruindo = threading.Lock()
+
+
+def _carregar(desde: Optional[str] = None) -> List[Dict]:
+    """
+    Pacientes (só as colunas do índice e a marca), em páginas por id: todos,
+    ou só os alterados depois de `desde`.
+    """
+    global _sem_marca
+    registros, apos = [], None
+    while True:
+        q = tabela("pacientes").select(COLUNAS_INDICE if _sem_marca else f"{COLUNAS_INDICE}, {MARCA}")
+        if desde:
+            q = q.gt(MARCA, desde)
+        try:
+            linhas, apos = paginar_keyset(q, ("id",), apos, LOTE_CARGA)
+        except Exception as e:
+            if _sem_marca or getattr(e, "code", None) not in COLUNA_AUSENTE:
+                raise
+            # sem a coluna, toda atualização é uma reconstrução completa
+            _sem_marca = True
+            return _carregar()
+        registros.extend(linhas)
+        if apos is None:
+            return registros
+
+
+def _avancar_marca(registros: List[Dict]):
+    global _marca
+    for p in registros:
+        v = normalizar_marca(p.get(MARCA))
+        if v and (_marca is None or v > _marca):
+            _marca = v
+
+
+def _construir():
+    global _marca, _completo_em
+    _marca = None
+    registros = _carregar()
+    _indice.construir(registros)
+    _avancar_marca(registros)
+    _completo_em = time.monotonic()
+
+
+def _atualizar():
+    """Reindexa só o que mudou desde a marca (ou tudo, se a completa venceu)."""
+    try:
+        if _marca is None or time.monotonic() - _completo_em > COMPLETA_A_CADA:
+            _construir()
+            return
+        desde = (datetime.datetime.fromisoformat(_marca)
+                 - datetime.timedelta(seconds=SOBREPOSICAO)).isoformat()
+        registros = _carregar(desde)
+        for p in registros:
+            _indice.adicionar(p)
+        _avancar_marca(registros)
+        _indice.construido_em = time.monotonic()
+    finally:
+        _reconstruindo.release()
+
+
+def _indice_atual() -> IndicePacientes:
+    if not _indice.construido_em:
+        with _reconstruindo:
+            if not _indice.construido_em:
+                _construir()
+    # vencido o TTL de pacientes, atualiza em segundo plano (cadastros de
+    # outros processos) e continua respondendo com o índice atual
+    elif time.monotonic() - _indice.construido_em > cache.ttl_da_tabela("pacientes"):
+        if _reconstruindo.acquire(blocking=False):
+            threading.Thread(target=_atualizar, daemon=True).start()
+    return _indice
+
+
+def buscar(consulta: str, limite: int = 20) -> List[Dict]:
+    """Busca por nome (prefixo/aproximada, sem acentos), CPF ou telefone."""
+    return _indice_atual().buscar(consulta, limite)
+
+
+def registrar(paciente: Dict):
+    """Inclui um paciente recém-cadastrado no índice (também durante uma reconstrução)."""
+    _indice.adicionar(paciente)
@@ -0,0 +1,190 @@
+# cache.py – Cache de leitura com TTL por tabela, invalidação nas escritas e
+# coalescência de leituras idênticas simultâneas (single-flight)
+#
+# Dois níveis: um dicionário em memória por processo e, se ligado (opcional,
+# NEURO_CACHE_COMPARTILHADO) com vários processos no mesmo host, o arquivo de
+# cache_compartilhado.py. As escritas avançam a versão das tabelas no arquivo,
+# o que invalida as entradas em todos os processos.
+import os
+import threading
+import time
+from collections import OrderedDict
+from functools import wraps
+from typing import Dict, List
+
+import cache_compartilhado
+
+# TTL (segundos) por tabela; sobrescreva com NEURO_CACHE_TTL_<TABELA>
+TTL_POR_TABELA = {
+    "pacientes": 300,
+    "agendamentos": 60,
+    "transacoes": 120,
+}
+TTL_PADRAO = 60
+MAX_ENTRADAS = int(os.getenv("NEURO_CACHE_MAX", 512))
+
+_lock = threading.RLock()
+# chave -> (expira_em, tabelas, valor, versoes das tabelas), em ordem de uso (LRU)
+_entradas: "OrderedDict[tuple, tuple]" = OrderedDict()
+_stats: Dict[str, Dict] = {}
+# chave -> leitura em andamento; quem pede a mesma chave espera por ela
+_em_voo: Dict[tuple, "_Voo"] = {}
+
+
+class _Voo:
+    """Uma leitura em andamento, cujo resultado (ou erro) é repartido entre quem esperou."""
+
+    def __init__(self, tabelas: tuple):
+        self.tabelas = tabelas
+        self.pronto = threading.Event()
+        self.valor = None
+        self.erro = None
+        self.concluido = False  # False: a sessão líder foi interrompida (ex.: rerun)
+
+
+def ttl_da_tabela(tabela: str) -> float:
+    valor = os.getenv(f"NEURO_CACHE_TTL_{tabela.upper()}")
+    if valor is not None:
+        return float(valor)
+    return TTL_POR_TABELA.get(tabela, TTL_PADRAO)
+
+
+def _contar(nome: str, tabelas: tuple, campo: str):
+    st_fn = _stats.setdefault(nome, {"tabelas": tabelas, "hits": 0, "misses": 0, "coalescidas": 0})
+    st_fn[campo] += 1
+
+
+def _duracao(tabelas: tuple, ttl: float = None) -> float:
+    return ttl if ttl is not None else min(ttl_da_tabela(t) for t in tabelas)
+
+
+def _versoes(tabelas: tuple) -> tuple:
+    return cache_compartilhado.versoes(tabelas) if cache_compartilhado.ativo() else ()
+
+
+def _guardar(chave: tuple, tabelas: tuple, valor, versoes: tuple, ttl: float = None):
+    _entradas[chave] = (time.monotonic() + _duracao(tabelas, ttl), tabelas, valor, versoes)
+    _entradas.move_to_end(chave)
+    while len(_entradas) > MAX_ENTRADAS:
+        _entradas.popitem(last=False)
+
+
+def em_cache(*tabelas: str, ttl: float = None):
+    """
+    Decorador de leitura: guarda o retorno da função por chave (função + argumentos)
+    até expirar o TTL ou até uma escrita invalidar alguma das tabelas.
+    O valor devolvido é compartilhado entre sessões; trate-o como somente leitura.
+    Enquanto uma chave está sendo buscada, outras chamadas com a mesma chave
+    (de qualquer sessão do processo) esperam essa busca em vez de repeti-la.
+    """
+    def decorador(func):
+        nome = f"{func.__module__}.{func.__name__}"
+
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            chave = (nome, args, tuple(sorted(kwargs.items())))
+            agora = time.monotonic()
+            versoes = _versoes(tabelas)
+            with _lock:
+                item = _entradas.get(chave)
+                if item and item[0] > agora and item[3] == versoes:
+                    _entradas.move_to_end(chave)
+                    _contar(nome, tabelas, "hits")
+                    return item[2]
+                voo = _em_voo.get(chave)
+                if voo is None:
+                    _contar(nome, tabelas, "misses")
+                    voo = _em_voo[chave] = _Voo(tabelas)
+                    lider = True
+                else:
+                    _contar(nome, tabelas, "coalescidas")
+                    lider = False
+            if not lider:
+                voo.pronto.wait()
+                if not voo.concluido:
+                    return wrapper(*args, **kwargs)
+                if voo.erro is not None:
+                    raise voo.erro
+                return voo.valor
+
+            duracao = _duracao(tabelas, ttl)
+            try:
+                achou = False
+                compartilhado = cache_compartilhado.ativo()
+                if compartilhado:
+                    texto = cache_compartilhado.chave_texto(chave)
+                    # vinda do arquivo, a entrada vence junto com a de lá, não um TTL depois
+                    achou, voo.valor, restante = cache_compartilhado.ler(texto, tabelas)
+                    if achou:
+                        duracao = min(duracao, restante)
+                if not achou:
+                    voo.valor = func(*args, **kwargs)
+                    if compartilhado:
+                        # versões lidas antes da consulta: escrita concorrente a torna velha
+                        cache_compartilhado.gravar(texto, versoes, voo.valor, duracao)
+                voo.concluido = True
+            except Exception as e:
+                voo.erro, voo.concluido = e, True
+                raise
+            finally:
+                with _lock:
+                    # se invalidar() tirou o voo durante a busca, o valor pode ser
+                    # anterior à escrita: entrega a quem esperou, mas não guarda
+                    if _em_voo.get(chave) is voo:
+                        del _em_voo[chave]
+                        if voo.concluido and voo.erro is None:
+                            _guardar(chave, tabelas, voo.valor, versoes, duracao)
+                voo.pronto.set()
+            return voo.valor
+
+        wrapper.sem_cache = func
+        return wrapper
+    return decorador
+
+
+def invalidar(*tabelas: str):
+    """
+    Remove todas as entradas que dependem de alguma das tabelas informadas,
+    neste processo e (pelas versões no arquivo compartilhado) nos demais.
+    """
+    if cache_compartilhado.ativo():
+        cache_compartilhado.invalidar(*tabelas)
+    alvo = set(tabelas)
+    with _lock:
+        for chave in [k for k, v in _entradas.items() if alvo & set(v[1])]:
+            del _entradas[chave]
+        for chave in [k for k, v in _em_voo.items() if alvo & set(v.tabelas)]:
+            del _em_voo[chave]
+
+
+def limpar():
+    if cache_compartilhado.ativo():
+        cache_compartilhado.limpar()
+    with _lock:
+        _entradas.clear()
+        _em_voo.clear()
+
+
+def estatisticas() -> List[Dict]:
+    """
+    Retorna uma linha por função em cache:
+    funcao, tabelas, hits, misses, coalescidas, taxa_acerto, entradas.
+    """
+    with _lock:
+        por_funcao: Dict[str, int] = {}
+        for chave in _entradas:
+            por_funcao[chave[0]] = por_funcao.get(chave[0], 0) + 1
+        linhas = []
+        for nome, s in sorted(_stats.items()):
+            poupadas = s["hits"] + s["coalescidas"]  # servidas sem ir ao backend
+            total = poupadas + s["misses"]
+            linhas.append({
+                "funcao": nome,
+                "tabelas": ", ".join(s["tabelas"]),
+                "hits": s["hits"],
+                "misses": s["misses"],
+                "coalescidas": s["coalescidas"],
+                "taxa_acerto": round(poupadas / total, 3) if total else 0.0,
+                "entradas": por_funcao.get(nome, 0),
+            })
+    return linhas
@@ -0,0 +1,220 @@
+# cache_compartilhado.py – Segundo nível do cache de leitura, num arquivo SQLite
+# compartilhado pelos processos do servidor no mesmo host
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import Dict, Optional, Tuple
+
+# Desligado por padrão: o arquivo guarda resultados de consultas (inclusive
+# historico/observacao dos pacientes) em claro no disco. Para ligar, defina
+# NEURO_CACHE_COMPARTILHADO com o caminho base do arquivo, ou "1" para o padrão
+# ao lado do app. Cada banco (database.identidade) usa o seu:
+# cache_compartilhado-<hash da identidade>.db, criado só para o usuário do servidor.
+_padrao = str(Path(__file__).resolve().parent / "cache_compartilhado.db")
+_valor = os.getenv("NEURO_CACHE_COMPARTILHADO", "")
+ARQUIVO = _padrao if _valor == "1" else _valor
+ATIVO = ARQUIVO not in ("", "0")
+# De quanto em quanto tempo (s) cada processo relê as versões das tabelas:
+# é o atraso máximo para ver uma escrita feita por outro processo
+INTERVALO_VERSOES = float(os.getenv("NEURO_CACHE_VERSOES_INTERVALO", 1.0))
+# Resultados maiores que isso (bytes, já serializados) ficam só no processo
+MAX_BYTES = int(os.getenv("NEURO_CACHE_COMPARTILHADO_MAX_BYTES", 8 * 2**20))
+
+ESQUEMA = """
+CREATE TABLE IF NOT EXISTS versoes (
+    tabela TEXT PRIMARY KEY,
+    versao INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS entradas (
+    chave  TEXT PRIMARY KEY,
+    expira REAL NOT NULL,
+    versoes TEXT NOT NULL,
+    valor  TEXT NOT NULL        -- JSON (ver _codificar)
+);
+"""
+TUPLA = "__tupla__"
+
+_local = threading.local()
+_lock = threading.Lock()
+_arquivos: Dict[str, str] = {}   # identidade do banco -> arquivo
+_versoes: Dict[str, int] = {}
+_versoes_arquivo: Optional[str] = None
+_versoes_lidas_em = 0.0
+_stats = {"leituras": 0, "acertos": 0, "gravacoes": 0, "invalidacoes": 0, "erros": 0}
+
+
+def arquivo() -> Optional[str]:
+    """
+    Arquivo do banco em uso, ou None se não há nível compartilhado: desligado,
+    ou backend que só existe neste processo (o de memória dos benchmarks).
+    """
+    if not ATIVO:
+        return None
+    import database
+    if getattr(database.obter_backend(), "so_neste_processo", False):
+        return None
+    identidade = database.identidade()
+    caminho = _arquivos.get(identidade)
+    if caminho is None:
+        base = Path(ARQUIVO)
+        sufixo = hashlib.sha1(identidade.encode("utf-8")).hexdigest()[:12]
+        caminho = _arquivos[identidade] = str(base.with_name(f"{base.stem}-{sufixo}{base.suffix}"))
+    return caminho
+
+
+def ativo() -> bool:
+    return arquivo() is not None
+
+
+def _conexao() -> sqlite3.Connection:
+    caminho = arquivo()
+    conexoes = getattr(_local, "conexoes", None)
+    if conexoes is None:
+        conexoes = _local.conexoes = {}
+    con = conexoes.get(caminho)
+    if con is None:
+        if not os.path.exists(caminho):
+            os.close(os.open(caminho, os.O_WRONLY | os.O_CREAT, 0o600))
+        con = sqlite3.connect(caminho, timeout=5, isolation_level=None)
+        con.execute("PRAGMA journal_mode=WAL")
+        con.execute("PRAGMA synchronous=NORMAL")
+        con.executescript(ESQUEMA)
+        conexoes[caminho] = con
+    return con
+
+
+def _contar(campo: str):
+    with _lock:
+        _stats[campo] += 1
+
+
+def _sem_tuplas(valor):
+    """Tuplas viram {TUPLA: [...]} para voltarem tuplas; o que não é JSON levanta TypeError."""
+    if isinstance(valor, tuple):
+        return {TUPLA: [_sem_tuplas(v) for v in valor]}
+    if isinstance(valor, list):
+        return [_sem_tuplas(v) for v in valor]
+    if isinstance(valor, dict):
+        if not all(isinstance(k, str) for k in valor):
+            raise TypeError("chaves não textuais não voltariam iguais do JSON")
+        return {k: _sem_tuplas(v) for k, v in valor.items()}
+    return valor
+
+
+def _tupla(objeto: dict):
+    return tuple(objeto[TUPLA]) if len(objeto) == 1 and TUPLA in objeto else objeto
+
+
+def _codificar(valor) -> str:
+    """
+    JSON, não pickle: o arquivo é lido por todos os processos e um pickle
+    adulterado executaria código. Os resultados em cache são dicts, listas,
+    tuplas, textos e números.
+    """
+    return json.dumps(_sem_tuplas(valor), ensure_ascii=False, separators=(",", ":"))
+
+
+def _decodificar(texto: str):
+    return json.loads(texto, object_hook=_tupla)
+
+
+def chave_texto(chave: tuple) -> str:
+    """Chave estável entre processos para (função, args, kwargs)."""
+    return hashlib.sha1(repr(chave).encode("utf-8")).hexdigest()
+
+
+def versoes(tabelas: Tuple[str, ...], forcar: bool = False) -> Tuple[int, ...]:
+    """Versão atual de cada tabela, relida do arquivo no máximo a cada INTERVALO_VERSOES."""
+    global _versoes, _versoes_arquivo, _versoes_lidas_em
+    agora = time.monotonic()
+    caminho = arquivo()
+    if forcar or caminho != _versoes_arquivo or agora - _versoes_lidas_em >= INTERVALO_VERSOES:
+        try:
+            lidas = dict(_conexao().execute("SELECT tabela, versao FROM versoes").fetchall())
+        except sqlite3.Error:
+            _contar("erros")
+        else:
+            with _lock:
+                _versoes, _versoes_arquivo, _versoes_lidas_em = lidas, caminho, agora
+    return tuple(_versoes.get(t, 0) for t in tabelas)
+
+
+def ler(chave: str, tabelas: Tuple[str, ...]):
+    """
+    Retorna (achou, valor, segundos até a entrada vencer); entradas vencidas
+    ou de versões antigas não contam.
+    """
+    _contar("leituras")
+    try:
+        linha = _conexao().execute(
+            "SELECT expira, versoes, valor FROM entradas WHERE chave = ?", (chave,)
+        ).fetchone()
+        restante = linha[0] - time.time() if linha else 0.0
+        if restante <= 0:
+            return False, None, 0.0
+        if tuple(json.loads(linha[1])) != versoes(tabelas):
+            return False, None, 0.0
+        valor = _decodificar(linha[2])
+    except (sqlite3.Error, ValueError, TypeError):
+        _contar("erros")
+        return False, None, 0.0
+    _contar("acertos")
+    return True, valor, restante
+
+
+def gravar(chave: str, versoes_lidas: Tuple[int, ...], valor, duracao: float):
+    """Guarda o valor com as versões das tabelas lidas ANTES da consulta."""
+    try:
+        dados = _codificar(valor)
+    except (TypeError, ValueError):
+        return  # ex.: datas ou DataFrames: ficam só no cache do processo
+    if len(dados.encode("utf-8")) > MAX_BYTES:
+        return
+    try:
+        _conexao().execute(
+            "INSERT OR REPLACE INTO entradas (chave, expira, versoes, valor) VALUES (?, ?, ?, ?)",
+            (chave, time.time() + duracao, json.dumps(versoes_lidas), dados),
+        )
+    except sqlite3.Error:
+        _contar("erros")
+        return
+    _contar("gravacoes")
+
+
+def invalidar(*tabelas: str):
+    """Avança a versão das tabelas: todas as entradas delas, em todos os processos, vencem."""
+    try:
+        con = _conexao()
+        con.executemany(
+            "INSERT INTO versoes (tabela, versao) VALUES (?, 1) "
+            "ON CONFLICT(tabela) DO UPDATE SET versao = versao + 1",
+            [(t,) for t in tabelas],
+        )
+        con.execute("DELETE FROM entradas WHERE expira <= ?", (time.time(),))
+    except sqlite3.Error:
+        _contar("erros")
+        return
+    _contar("invalidacoes")
+    versoes((), forcar=True)
+
+
+def limpar():
+    try:
+        _conexao().execute("DELETE FROM entradas")
+    except sqlite3.Error:
+        _contar("erros")
+
+
+def estatisticas() -> Dict:
+    with _lock:
+        stats = dict(_stats)
+    stats["arquivo"] = arquivo()
+    try:
+        stats["entradas"] = _conexao().execute("SELECT COUNT(*) FROM entradas").fetchone()[0]
+    except sqlite3.Error:
+        stats["entradas"] = None
+    return stats
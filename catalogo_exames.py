@@ -0,0 +1,281 @@
+# catalogo_exames.py – Catálogo persistente (SQLite) dos exames guardados, indexado
+# por paciente e data, e reconciliador com os arquivos em disco
+#
+# Uso offline (ex.: após restaurar um backup ou copiar arquivos à mão):
+#   python catalogo_exames.py               # alinha o catálogo com os arquivos
+#   python catalogo_exames.py --migrar      # também move uploads/{pid}_{nome} para o armazenamento novo
+import argparse
+import datetime
+import hashlib
+import json
+import mimetypes
+import os
+import re
+import sqlite3
+import sys
+import threading
+import time
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional, Tuple
+
+import exames
+
+ARQUIVO = os.getenv("NEURO_CATALOGO_EXAMES", str(exames.RAIZ / "catalogo_exames.db"))
+VERSAO = 1
+TIPOS = {".pdf": "pdf", ".png": "imagem", ".jpg": "imagem", ".jpeg": "imagem"}
+LEGADO = re.compile(r"^(\d+)_(.+)$")
+
+ESQUEMA = """
+CREATE TABLE IF NOT EXISTS exames (
+    id          INTEGER PRIMARY KEY AUTOINCREMENT,
+    paciente_id INTEGER NOT NULL,
+    sha256      TEXT,
+    nome        TEXT NOT NULL,
+    tipo        TEXT NOT NULL,
+    mime        TEXT,
+    tamanho     INTEGER NOT NULL,
+    enviado_em  TEXT NOT NULL,
+    arquivo     TEXT NOT NULL UNIQUE,   -- relativo a exames.RAIZ
+    legado      INTEGER NOT NULL DEFAULT 0
+);
+CREATE INDEX IF NOT EXISTS exames_paciente_data_idx ON exames (paciente_id, enviado_em, id);
+CREATE INDEX IF NOT EXISTS exames_paciente_tipo_idx ON exames (paciente_id, tipo, enviado_em, id);
+CREATE INDEX IF NOT EXISTS exames_sha_idx ON exames (paciente_id, sha256);
+"""
+
+_local = threading.local()
+_lock = threading.Lock()
+_reconciliacao_iniciada = False
+
+
+def _conexao() -> sqlite3.Connection:
+    con = getattr(_local, "con", None)
+    if con is None:
+        Path(ARQUIVO).parent.mkdir(parents=True, exist_ok=True)
+        con = sqlite3.connect(ARQUIVO, timeout=30, isolation_level=None)
+        con.row_factory = sqlite3.Row
+        con.execute("PRAGMA journal_mode=WAL")
+        con.executescript(ESQUEMA)
+        _local.con = con
+        if con.execute("PRAGMA user_version").fetchone()[0] < VERSAO:
+            _reconciliar_em_segundo_plano()
+    return con
+
+
+def _reconciliar_em_segundo_plano():
+    """
+    Catálogo novo: importa o que já está em disco uma única vez, numa thread,
+    sem segurar a primeira página que abriu o catálogo (com muitos exames o
+    hash de cada arquivo leva minutos). Até terminar, listagens e cota veem
+    só os exames já registrados.
+    """
+    global _reconciliacao_iniciada
+    with _lock:
+        if _reconciliacao_iniciada:
+            return
+        _reconciliacao_iniciada = True
+    threading.Thread(target=_reconciliacao_inicial, name="catalogo-exames", daemon=True).start()
+
+
+def _reconciliacao_inicial():
+    reconciliar()
+    # só depois de completa: se o processo cair no meio, o próximo recomeça
+    _conexao().execute(f"PRAGMA user_version = {VERSAO}")
+
+
+def tipo_de(nome: str) -> str:
+    return TIPOS.get(Path(nome).suffix.lower(), "outro")
+
+
+def registrar(meta: Dict):
+    """Inclui ou atualiza (pelo caminho do arquivo) um exame no catálogo."""
+    _conexao().execute(
+        "INSERT INTO exames (paciente_id, sha256, nome, tipo, mime, tamanho, enviado_em, arquivo, legado) "
+        "VALUES (:paciente_id, :sha256, :nome, :tipo, :mime, :tamanho, :enviado_em, :arquivo, :legado) "
+        "ON CONFLICT (arquivo) DO UPDATE SET paciente_id = excluded.paciente_id, "
+        "sha256 = excluded.sha256, nome = excluded.nome, tipo = excluded.tipo, mime = excluded.mime, "
+        "tamanho = excluded.tamanho, enviado_em = excluded.enviado_em, legado = excluded.legado",
+        {
+            "paciente_id": int(meta["paciente_id"]), "sha256": meta.get("sha256"),
+            "nome": meta["nome"], "tipo": tipo_de(meta["nome"]), "mime": meta.get("mime"),
+            "tamanho": meta.get("tamanho") or 0, "enviado_em": meta["enviado_em"],
+            "arquivo": meta["arquivo"], "legado": int(bool(meta.get("legado"))),
+        },
+    )
+
+
+def remover(arquivo: str):
+    _conexao().execute("DELETE FROM exames WHERE arquivo = ?", (arquivo,))
+
+
+def por_hash(pid: int, sha256: str) -> Optional[Dict]:
+    linha = _conexao().execute(
+        "SELECT * FROM exames WHERE paciente_id = ? AND sha256 = ? LIMIT 1", (int(pid), sha256)
+    ).fetchone()
+    return dict(linha) if linha else None
+
+
+def _filtros(pid: int, tipo: Optional[str], desde: Optional[str], ate: Optional[str]):
+    where, params = ["paciente_id = ?"], [int(pid)]
+    if tipo:
+        where.append("tipo = ?")
+        params.append(tipo)
+    if desde:
+        where.append("enviado_em >= ?")
+        params.append(str(desde))
+    if ate:
+        # até o fim do dia `ate`
+        where.append("enviado_em < ?")
+        params.append((datetime.date.fromisoformat(str(ate)[:10]) + datetime.timedelta(days=1)).isoformat())
+    return where, params
+
+
+def listar(
+    pid: int,
+    apos: Optional[Tuple] = None,
+    limite: int = 20,
+    tipo: Optional[str] = None,
+    desde: Optional[str] = None,
+    ate: Optional[str] = None,
+) -> Tuple[List[Dict], Optional[Tuple]]:
+    """
+    Exames do paciente, do mais recente para o mais antigo, uma página por vez
+    (keyset em enviado_em, id). Retorna (linhas, cursor da próxima página ou None).
+    `tipo` é "pdf" ou "imagem"; `desde`/`ate` são datas ISO (inclusive).
+    """
+    where, params = _filtros(pid, tipo, desde, ate)
+    if apos is not None:
+        where.append("(enviado_em, id) < (?, ?)")
+        params.extend(apos)
+    linhas = _conexao().execute(
+        f"SELECT * FROM exames WHERE {' AND '.join(where)} "
+        "ORDER BY enviado_em DESC, id DESC LIMIT ?",
+        params + [limite + 1],
+    ).fetchall()
+    linhas = [dict(l) for l in linhas]
+    prox = None
+    if len(linhas) > limite:
+        linhas = linhas[:limite]
+        prox = (linhas[-1]["enviado_em"], linhas[-1]["id"])
+    return linhas, prox
+
+
+def contar(pid: int, tipo: Optional[str] = None, desde: Optional[str] = None,
+           ate: Optional[str] = None) -> int:
+    where, params = _filtros(pid, tipo, desde, ate)
+    return _conexao().execute(
+        f"SELECT COUNT(*) FROM exames WHERE {' AND '.join(where)}", params
+    ).fetchone()[0]
+
+
+def todos(lote: int = 500) -> Iterator[Dict]:
+    """Todos os exames com hash, em lotes por id (para varreduras em segundo plano)."""
+    ultimo = 0
+    while True:
+        linhas = _conexao().execute(
+            "SELECT * FROM exames WHERE id > ? AND sha256 IS NOT NULL ORDER BY id LIMIT ?",
+            (ultimo, lote),
+        ).fetchall()
+        yield from (dict(l) for l in linhas)
+        if len(linhas) < lote:
+            return
+        ultimo = linhas[-1]["id"]
+
+
+def uso(pid: int) -> int:
+    """Bytes ocupados pelos exames do paciente."""
+    return _conexao().execute(
+        "SELECT COALESCE(SUM(tamanho), 0) FROM exames WHERE paciente_id = ?", (int(pid),)
+    ).fetchone()[0]
+
+
+# ---- reconciliação com o disco ----
+def _sha256(caminho: Path) -> str:
+    h = hashlib.sha256()
+    with caminho.open("rb") as f:
+        for bloco in iter(lambda: f.read(exames.BLOCO), b""):
+            h.update(bloco)
+    return h.hexdigest()
+
+
+def _legado(arq: Path, pid: int, nome: str) -> Dict:
+    info = arq.stat()
+    return {
+        "paciente_id": pid, "nome": nome, "tamanho": info.st_size,
+        "mime": mimetypes.guess_type(nome)[0] or "application/octet-stream",
+        "sha256": _sha256(arq),
+        "enviado_em": datetime.datetime.fromtimestamp(info.st_mtime).isoformat(timespec="seconds"),
+        "arquivo": arq.name, "legado": True,
+    }
+
+
+def reconciliar(migrar: bool = False) -> Dict[str, int]:
+    """
+    Alinha o catálogo com o disco: registra os exames com arquivo lateral
+    (.json) e os arquivos antigos uploads/{pid}_{nome}, e apaga do catálogo
+    o que não existe mais. Com `migrar`, os antigos são copiados para o
+    armazenamento por hash (exames.guardar) e o original é removido.
+    """
+    raiz = exames.RAIZ
+    con = _conexao()
+    conhecidos = {l["arquivo"]: l["tamanho"] for l in con.execute("SELECT arquivo, tamanho FROM exames")}
+    vistos, resultado = set(), {"registrados": 0, "migrados": 0, "removidos": 0, "erros": 0}
+
+    for lateral in (raiz / "exames").glob("*/*/??/*.json"):
+        try:
+            meta = json.loads(lateral.read_text(encoding="utf-8"))
+            if not (raiz / meta["arquivo"]).exists():
+                continue
+        except (OSError, ValueError, KeyError):
+            resultado["erros"] += 1
+            continue
+        vistos.add(meta["arquivo"])
+        if meta["arquivo"] not in conhecidos:
+            registrar(meta)
+            resultado["registrados"] += 1
+
+    for arq in raiz.glob("*_*") if raiz.exists() else ():
+        m = LEGADO.match(arq.name)
+        if not m or not arq.is_file():
+            continue
+        pid, nome = int(m.group(1)), m.group(2)
+        try:
+            if migrar:
+                enviado_em = datetime.datetime.fromtimestamp(arq.stat().st_mtime)
+                with arq.open("rb") as f:
+                    meta = exames.guardar(pid, f, nome, enviado_em=enviado_em)
+                arq.unlink()
+                remover(arq.name)
+                vistos.update((meta["arquivo"], arq.name))
+                resultado["migrados"] += 1
+                continue
+            if conhecidos.get(arq.name) != arq.stat().st_size:
+                registrar(_legado(arq, pid, nome))
+                resultado["registrados"] += 1
+        except (OSError, exames.ErroExame):
+            resultado["erros"] += 1
+        vistos.add(arq.name)
+
+    fora = [a for a in conhecidos if a not in vistos and not (raiz / a).exists()]
+    with con:
+        con.executemany("DELETE FROM exames WHERE arquivo = ?", [(a,) for a in fora])
+    resultado["removidos"] = len(fora)
+    return resultado
+
+
+def main(argv=None) -> int:
+    ap = argparse.ArgumentParser(description="Reconcilia o catálogo de exames com os arquivos")
+    ap.add_argument("--migrar", action="store_true",
+                    help="move os arquivos antigos {pid}_{nome} para o armazenamento por hash")
+    args = ap.parse_args(argv)
+    global _reconciliacao_iniciada
+    _reconciliacao_iniciada = True  # reconcilia aqui mesmo, não numa thread
+    t0 = time.perf_counter()
+    r = reconciliar(migrar=args.migrar)
+    _conexao().execute(f"PRAGMA user_version = {VERSAO}")
+    print(", ".join(f"{k}: {v}" for k, v in r.items()) + f" ({time.perf_counter() - t0:.1f} s)")
+    return 1 if r["erros"] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,10 +1,340 @@
+# database.py – Camada única de acesso a dados (Supabase ou SQLite local)
 import os
-from supabase import create_client, Client
+import threading
+import uuid
+from collections import defaultdict
+from dataclasses import fields
+from pathlib import Path
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import streamlit as st
+
+import instrumentacao
+
+
+def _config(nome: str, padrao=None):
+    """Lê configuração de variável de ambiente ou de st.secrets."""
+    valor = os.getenv(nome)
+    if valor is None:
+        try:
+            valor = st.secrets.get(nome)
+        except Exception:
+            valor = None
+    return padrao if valor is None else valor
+
+
+# Backend: "supabase" (padrão), "sqlite" (arquivo local, ex.: consultorio.db)
+# ou "memoria" (PostgREST simulado, para testes e benchmarks)
+BACKEND = str(_config("NEURO_BACKEND", "supabase")).lower()
+SQLITE_ARQUIVO = _config("NEURO_SQLITE", str(Path(__file__).resolve().parent / "consultorio.db"))
+
+# Réplica local de leitura (arquivo SQLite); vazio desliga. As leituras de
+# pacientes/agendamentos/transações vêm dela, no máximo REPLICA_ATRASO_MAX segundos
+# atrás do banco principal; as escritas vão ao principal e são copiadas para ela.
+REPLICA_ARQUIVO = _config("NEURO_REPLICA", "")
+REPLICA_ATRASO_MAX = float(_config("NEURO_REPLICA_ATRASO_MAX", 60.0))
+# Sincronização completa (traz as exclusões feitas no banco) a cada N segundos
+REPLICA_COMPLETA = float(_config("NEURO_REPLICA_COMPLETA", 3600.0))
 
 # Carrega variáveis de ambiente
-SUPABASE_URL = os.environ.get("SUPABASE_URL")
-SUPABASE_KEY = os.environ.get("SUPABASE_KEY")
+SUPABASE_URL = _config("SUPABASE_URL")
+SUPABASE_KEY = _config("SUPABASE_KEY")
+if BACKEND == "supabase" and (not SUPABASE_URL or not SUPABASE_KEY):
+    raise RuntimeError("Defina SUPABASE_URL e SUPABASE_KEY em env ou Secrets.")
+
+# Pool HTTP (ajustável conforme o número de sessões simultâneas)
+POOL_MAX_CONEXOES = int(_config("SUPABASE_POOL_MAX", 20))
+POOL_MAX_KEEPALIVE = int(_config("SUPABASE_POOL_KEEPALIVE", 10))
+POOL_KEEPALIVE_EXPIRA = float(_config("SUPABASE_KEEPALIVE_EXPIRA", 30.0))
+TIMEOUT_CONEXAO = float(_config("SUPABASE_TIMEOUT_CONEXAO", 5.0))
+TIMEOUT_LEITURA = float(_config("SUPABASE_TIMEOUT_LEITURA", 30.0))
+
+# Linhas por requisição nas inserções em lote
+LOTE_INSERCAO = int(_config("NEURO_LOTE_INSERCAO", 500))
+
+# Coluna com a chave de idempotência de cada linha inserida (índice único no
+# banco, ver sql/fila_escrita.sql): o reenvio de algo que o banco já gravou não
+# duplica a linha
+IDEMPOTENCIA = "idempotencia"
+# Postgres (42703) e PostgREST: coluna inexistente
+COLUNA_AUSENTE = {"42703", "PGRST204"}
+_com_idempotencia: Dict[Tuple[str, str], bool] = {}
+
+# ---- Estatísticas do pool ----
+_lock_stats = threading.Lock()
+_stats = {"requisicoes": 0, "conexoes_novas": 0}
+
+
+def _trace(evento: str, info: Dict):
+    if evento == "connection.connect_tcp.complete":
+        with _lock_stats:
+            _stats["conexoes_novas"] += 1
+
+
+def _ao_requisitar(request):
+    with _lock_stats:
+        _stats["requisicoes"] += 1
+    request.extensions["trace"] = _trace
+
+
+def _novo_http():
+    import httpx
+    return httpx.Client(
+        limits=httpx.Limits(
+            max_connections=POOL_MAX_CONEXOES,
+            max_keepalive_connections=POOL_MAX_KEEPALIVE,
+            keepalive_expiry=POOL_KEEPALIVE_EXPIRA,
+        ),
+        timeout=httpx.Timeout(TIMEOUT_LEITURA, connect=TIMEOUT_CONEXAO),
+        event_hooks={"request": [_ao_requisitar]},
+    )
+
+
+def _criar_cliente():
+    from supabase import create_client, ClientOptions
+    campos = {f.name for f in fields(ClientOptions)}
+    if "httpx_client" in campos:
+        opcoes = ClientOptions(
+            postgrest_client_timeout=TIMEOUT_LEITURA,
+            httpx_client=_novo_http(),
+        )
+        return create_client(SUPABASE_URL, SUPABASE_KEY, options=opcoes)
+    # supabase-py antigo: mantém o pool padrão, mas registra as métricas
+    cliente = create_client(
+        SUPABASE_URL, SUPABASE_KEY,
+        options=ClientOptions(postgrest_client_timeout=TIMEOUT_LEITURA),
+    )
+    cliente.postgrest.session.event_hooks["request"].append(_ao_requisitar)
+    return cliente
+
+
+def _criar_backend():
+    primario = _criar_primario()
+    if not REPLICA_ARQUIVO:
+        return primario
+    from backend_replica import BackendReplica
+    return BackendReplica(primario, REPLICA_ARQUIVO, atraso_max=REPLICA_ATRASO_MAX,
+                          completa_a_cada=REPLICA_COMPLETA)
+
+
+def _criar_primario():
+    if BACKEND == "sqlite":
+        from backend_sqlite import BackendSQLite
+        return BackendSQLite(SQLITE_ARQUIVO)
+    if BACKEND == "memoria":
+        from backend_memoria import BackendMemoria
+        return BackendMemoria(latencia=float(_config("NEURO_MEMORIA_LATENCIA_MS", 0)) / 1000)
+    if BACKEND != "supabase":
+        raise RuntimeError(f"NEURO_BACKEND desconhecido: {BACKEND}")
+    return _criar_cliente()
+
+
+# Backend (um por processo, compartilhado por todas as sessões), criado no
+# primeiro acesso: importar este módulo não abre cliente HTTP nem arquivo
+backend = None
+_lock_backend = threading.Lock()
+
+
+def obter_backend():
+    global backend
+    if backend is None:
+        with _lock_backend:
+            if backend is None:
+                backend = _criar_backend()
+    return backend
+
+
+def usar_backend(novo):
+    """Troca o backend em uso (qualquer objeto com .table(nome), ex.: BackendSQLite)."""
+    global backend
+    backend = novo
+
+
+def identidade() -> str:
+    """
+    Qual banco está por trás do backend em uso ("supabase:<url>", "sqlite:<arquivo>"...).
+    Arquivos locais compartilhados entre processos (cache, fila de escrita) são
+    separados por ela, para que dados de um banco nunca cheguem a outro.
+    """
+    b = obter_backend()
+    b = getattr(b, "primario", b)  # a réplica reflete o banco principal
+    return getattr(b, "identidade", None) or f"supabase:{SUPABASE_URL}"
+
+
+def tabela(nome: str):
+    """Ponto único de acesso às tabelas; os módulos de domínio usam só esta função."""
+    return instrumentacao.instrumentar(nome, obter_backend().table(nome))
+
+
+def _valor_filtro(v) -> str:
+    return '"' + str(v).replace('"', '\\"') + '"'
+
+
+def paginar_keyset(
+    q,
+    ordem: Sequence[str],
+    apos: Optional[Tuple] = None,
+    limite: int = 100,
+) -> Tuple[List[Dict], Optional[Tuple]]:
+    """
+    Aplica paginação por chave (keyset) a uma consulta já filtrada.
+    `ordem` são as colunas de ordenação (a última deve ser única e não nula,
+    ex.: id; as anteriores podem ter nulos, que vêm por último, como no
+    ORDER BY ascendente do Postgres);
+    `apos` é o cursor devolvido pela página anterior.
+    Retorna (linhas, cursor_da_proxima_pagina ou None).
+    """
+    if apos:
+        termos = []
+        for i, col in enumerate(ordem):
+            if apos[i] is None:
+                continue  # depois de um nulo só há nulos, cobertos pelas colunas seguintes
+            conds = [f"{c}.is.null" if v is None else f"{c}.eq.{_valor_filtro(v)}"
+                     for c, v in zip(ordem[:i], apos[:i])]
+            depois = f"{col}.gt.{_valor_filtro(apos[i])}"
+            if i < len(ordem) - 1:
+                depois = f"or({depois},{col}.is.null)"
+            conds.append(depois)
+            termos.append(conds[0] if len(conds) == 1 else f"and({','.join(conds)})")
+        q = q.or_(",".join(termos))
+    for col in ordem:
+        q = q.order(col)
+    linhas = q.limit(limite + 1).execute().data or []
+    if len(linhas) <= limite:
+        return linhas, None
+    linhas = linhas[:limite]
+    return linhas, tuple(linhas[-1].get(c) for c in ordem)
+
+
+def erro_de_dados(e: Exception) -> bool:
+    """
+    Se o erro é da própria requisição (4xx: valor inválido, restrição violada,
+    coluna inexistente...) e se repetiria igual. Falhas de rede, timeouts e
+    erros 5xx não são: vale repetir a mesma requisição mais tarde.
+    """
+    codigo = str(getattr(e, "code", None) or "")
+    if codigo.isdigit() and len(codigo) == 3:  # resposta sem JSON: o status HTTP
+        return codigo.startswith("4")
+    # SQLSTATE 22 (dados), 23 (restrição) e 42 (sintaxe, coluna...); PGRST1xx/2xx (requisição)
+    return codigo[:2] in ("22", "23", "42") or codigo[:6] in ("PGRST1", "PGRST2")
+
+
+def tem_idempotencia(nome: str) -> bool:
+    """
+    Se a tabela tem a coluna IDEMPOTENCIA (sql/fila_escrita.sql já rodou);
+    consultado uma vez por banco e tabela.
+    """
+    chave = (identidade(), nome)
+    if chave not in _com_idempotencia:
+        try:
+            tabela(nome).select(IDEMPOTENCIA).limit(1).execute()
+            _com_idempotencia[chave] = True
+        except Exception as e:
+            if getattr(e, "code", None) not in COLUNA_AUSENTE:
+                raise
+            _com_idempotencia[chave] = False
+    return _com_idempotencia[chave]
+
+
+def inserir_idempotente(nome: str, registros: List[Dict]) -> List[Dict]:
+    """
+    Insere `registros` (cada um com sua chave em IDEMPOTENCIA) ignorando as
+    chaves que o banco já tem (envio anterior que chegou lá, mas cuja resposta
+    se perdeu) e busca essas linhas; devolve as linhas gravadas na ordem de
+    `registros`. Sem a coluna no banco, é um insert comum.
+    """
+    if not tem_idempotencia(nome):
+        linhas = tabela(nome).insert(
+            [{k: v for k, v in r.items() if k != IDEMPOTENCIA} for r in registros]
+        ).execute().data or []
+        if len(linhas) != len(registros):
+            raise RuntimeError(f"{len(linhas)} linhas devolvidas para {len(registros)} enviadas")
+        return linhas
+    gravados = tabela(nome).upsert(
+        registros, on_conflict=IDEMPOTENCIA, ignore_duplicates=True
+    ).execute().data or []
+    por_chave = {g.get(IDEMPOTENCIA): g for g in gravados}
+    faltam = [r[IDEMPOTENCIA] for r in registros if r[IDEMPOTENCIA] not in por_chave]
+    if faltam:
+        existentes = tabela(nome).select("*").in_(IDEMPOTENCIA, faltam).execute().data or []
+        por_chave.update((g.get(IDEMPOTENCIA), g) for g in existentes)
+    sem_linha = [c for c in faltam if c not in por_chave]
+    if sem_linha:
+        raise RuntimeError(f"{len(sem_linha)} de {len(registros)} registros sem linha no banco")
+    return [por_chave[r[IDEMPOTENCIA]] for r in registros]
+
+
+def inserir_em_lote(nome: str, registros: List[Dict], lote: int = LOTE_INSERCAO) -> List[Dict]:
+    """
+    Insere `registros` em requisições de até `lote` linhas, cada linha com sua
+    chave de idempotência (um lote que o banco gravou, mas cuja resposta se
+    perdeu, não é duplicado). Se o banco recusar os dados de um lote, suas
+    linhas são reenviadas uma a uma para isolar as que têm problema; outras
+    falhas (rede, timeout, resposta incompleta) marcam o lote todo com o erro.
+    Retorna, na ordem de entrada, {"id", "erro", "linha"} por registro.
+    """
+    # o PostgREST exige as mesmas chaves em todas as linhas de um insert; em vez
+    # de completar as ausentes com None (que grava NULL por cima do default da
+    # coluna), cada conjunto de chaves vai nos seus próprios lotes
+    por_chaves: Dict[Tuple[str, ...], List[int]] = defaultdict(list)
+    for i, r in enumerate(registros):
+        por_chaves[tuple(sorted(r))].append(i)
+    resultados: List[Optional[Dict]] = [None] * len(registros)
+    for indices in por_chaves.values():
+        for j in range(0, len(indices), lote):
+            parte = indices[j:j + lote]
+            enviados = [{IDEMPOTENCIA: uuid.uuid4().hex, **registros[i]} for i in parte]
+            try:
+                linhas = inserir_idempotente(nome, enviados)
+            except Exception as e:
+                if len(parte) == 1 or not erro_de_dados(e):
+                    erro = f"{type(e).__name__}: {e}"
+                    for i in parte:
+                        resultados[i] = {"id": None, "erro": erro, "linha": None}
+                    continue
+                for i, registro in zip(parte, enviados):
+                    try:
+                        linha = inserir_idempotente(nome, [registro])[0]
+                        resultados[i] = {"id": linha.get("id"), "erro": None, "linha": linha}
+                    except Exception as e:
+                        resultados[i] = {"id": None, "erro": f"{type(e).__name__}: {e}", "linha": None}
+                continue
+            for i, l in zip(parte, linhas):
+                resultados[i] = {"id": l.get("id"), "erro": None, "linha": l}
+    return resultados
+
+
+def replica():
+    """A réplica local em uso (BackendReplica) ou None."""
+    return obter_backend() if hasattr(obter_backend(), "sincronizar") else None
+
+
+def _conexoes_abertas() -> Optional[int]:
+    primario = getattr(obter_backend(), "primario", backend)
+    transporte = getattr(primario.postgrest.session, "_transport", None)
+    pool = getattr(transporte, "_pool", None)
+    conexoes = getattr(pool, "connections", None)
+    return None if conexoes is None else len(conexoes)
 
-# Cliente Supabase
-supabase: Client = create_client(SUPABASE_URL, SUPABASE_KEY)
 
+def estatisticas_conexoes() -> Dict:
+    """
+    Retorna métricas do pool HTTP:
+      requisicoes, conexoes_novas, reutilizacoes, taxa_reuso, conexoes_abertas, limite
+    (ou as do backend local, quando não é o Supabase).
+    """
+    primario = getattr(obter_backend(), "primario", backend)
+    if hasattr(primario, "estatisticas"):
+        return primario.estatisticas()
+    with _lock_stats:
+        req = _stats["requisicoes"]
+        novas = _stats["conexoes_novas"]
+    reuso = max(req - novas, 0)
+    return {
+        "requisicoes": req,
+        "conexoes_novas": novas,
+        "reutilizacoes": reuso,
+        "taxa_reuso": (reuso / req) if req else 0.0,
+        "conexoes_abertas": _conexoes_abertas(),
+        "limite": POOL_MAX_CONEXOES,
+    }
@@ -0,0 +1,142 @@
+# exames.py – Armazenamento dos exames enviados: gravação em blocos, endereçada
+# pelo SHA-256 do conteúdo, em diretórios por paciente, com cota e metadados
+import datetime
+import hashlib
+import json
+import mimetypes
+import os
+import shutil
+import uuid
+from pathlib import Path
+from typing import BinaryIO, Dict, Optional
+
+RAIZ = Path(os.getenv("NEURO_UPLOADS", str(Path(__file__).resolve().parent / "uploads")))
+BLOCO = 1024 * 1024                                                  # bytes lidos por vez
+MAX_BYTES = int(float(os.getenv("NEURO_EXAME_MAX_MB", 50)) * 2**20)  # por arquivo
+COTA_PACIENTE = int(float(os.getenv("NEURO_EXAME_COTA_MB", 1024)) * 2**20)
+RESERVA_DISCO = int(float(os.getenv("NEURO_EXAME_RESERVA_MB", 512)) * 2**20)  # livre mínimo
+EXTENSOES = {".pdf", ".png", ".jpg", ".jpeg"}
+
+
+class ErroExame(Exception):
+    """Upload recusado (tipo, tamanho, cota ou espaço em disco)."""
+
+
+def diretorio_paciente(pid: int) -> Path:
+    """uploads/exames/<pid % 256 em hex>/<pid>: nenhum diretório acumula todos os pacientes."""
+    return RAIZ / "exames" / f"{int(pid) % 256:02x}" / str(int(pid))
+
+
+def caminho(pid: int, sha256: str, extensao: str = "") -> Path:
+    """Arquivo do conteúdo `sha256`, em subdiretório pelos 2 primeiros dígitos do hash."""
+    return diretorio_paciente(pid) / sha256[:2] / f"{sha256}{extensao}"
+
+
+def _lateral(pid: int, sha256: str) -> Path:
+    return caminho(pid, sha256, ".json")
+
+
+def _gravar_json(destino: Path, dados: Dict):
+    tmp = destino.with_name(f".{destino.name}.{uuid.uuid4().hex}.tmp")
+    tmp.write_text(json.dumps(dados, ensure_ascii=False, indent=1), encoding="utf-8")
+    os.replace(tmp, destino)
+
+
+def metadados(pid: int, sha256: str) -> Optional[Dict]:
+    try:
+        return json.loads(_lateral(pid, sha256).read_text(encoding="utf-8"))
+    except (OSError, ValueError):
+        return None
+
+
+def uso(pid: int) -> int:
+    """Bytes ocupados pelos exames do paciente (pelo catálogo)."""
+    import catalogo_exames
+    return catalogo_exames.uso(pid)
+
+
+def guardar(pid: int, arquivo: BinaryIO, nome: str, mime: Optional[str] = None,
+            enviado_em: Optional[datetime.datetime] = None) -> Dict:
+    """
+    Grava o exame lendo `arquivo` em blocos de BLOCO bytes e calculando o
+    SHA-256 durante a escrita; o conteúdo só aparece no destino final
+    (os.replace) depois de completo e sincronizado em disco.
+    Conteúdo já guardado para o paciente não é gravado de novo: devolve os
+    metadados existentes com "duplicado": True.
+    Levanta ErroExame se o tipo, o tamanho, a cota ou o disco não permitirem.
+    `enviado_em` preserva a data original ao migrar arquivos antigos.
+    """
+    nome = Path(nome).name
+    extensao = Path(nome).suffix.lower()
+    if extensao not in EXTENSOES:
+        raise ErroExame(f"Tipo de arquivo não aceito: {extensao or nome}")
+    limite = min(MAX_BYTES, COTA_PACIENTE - uso(pid))
+    if limite <= 0:
+        raise ErroExame("Cota de exames do paciente esgotada.")
+
+    base = diretorio_paciente(pid)
+    base.mkdir(parents=True, exist_ok=True)
+    livre = shutil.disk_usage(base).free - RESERVA_DISCO
+    tmp = base / f".envio-{uuid.uuid4().hex}.tmp"
+    h, tamanho = hashlib.sha256(), 0
+    try:
+        with tmp.open("wb") as f:
+            while True:
+                bloco = arquivo.read(BLOCO)
+                if not bloco:
+                    break
+                tamanho += len(bloco)
+                if tamanho > limite:
+                    if limite < MAX_BYTES:
+                        raise ErroExame("O exame ultrapassa a cota restante do paciente.")
+                    raise ErroExame(f"Exame maior que {MAX_BYTES // 2**20} MB.")
+                if tamanho > livre:
+                    raise ErroExame("Espaço em disco insuficiente para guardar o exame.")
+                h.update(bloco)
+                f.write(bloco)
+            f.flush()
+            os.fsync(f.fileno())
+        sha = h.hexdigest()
+        existente = metadados(pid, sha)
+        if existente:
+            tmp.unlink()
+            return {**existente, "duplicado": True}
+        destino = caminho(pid, sha, extensao)
+        destino.parent.mkdir(exist_ok=True)
+        os.replace(tmp, destino)
+    except BaseException:
+        tmp.unlink(missing_ok=True)
+        raise
+
+    meta = {
+        "paciente_id": int(pid),
+        "nome": nome,
+        "tamanho": tamanho,
+        "mime": mime or mimetypes.guess_type(nome)[0] or "application/octet-stream",
+        "sha256": sha,
+        "enviado_em": (enviado_em or datetime.datetime.now()).isoformat(timespec="seconds"),
+        "arquivo": str(destino.relative_to(RAIZ)),
+    }
+    _gravar_json(_lateral(pid, sha), meta)
+    import catalogo_exames, miniaturas, ocr_exames
+    catalogo_exames.registrar(meta)
+    miniaturas.agendar(meta)
+    ocr_exames.agendar(meta)
+    return {**meta, "duplicado": False}
+
+
+def abrir(meta: Dict) -> BinaryIO:
+    """Abre para leitura o arquivo descrito pelos metadados (ou linha do catálogo)."""
+    return (RAIZ / meta["arquivo"]).open("rb")
+
+
+def remover(pid: int, sha256: str) -> bool:
+    meta = metadados(pid, sha256)
+    if not meta:
+        return False
+    import catalogo_exames, ocr_exames
+    catalogo_exames.remover(meta["arquivo"])
+    ocr_exames.remover(pid, sha256)
+    (RAIZ / meta["arquivo"]).unlink(missing_ok=True)
+    _lateral(pid, sha256).unlink(missing_ok=True)
+    return True
@@ -0,0 +1,239 @@
+# fila_escrita.py – Fila durável de inserções (write-behind): os formulários
+# gravam num SQLite local e um trabalhador em segundo plano envia em lotes
+import json
+import os
+import random
+import sqlite3
+import threading
+import time
+import uuid
+from collections import defaultdict
+from pathlib import Path
+from typing import Callable, Dict, List, Optional
+
+import cache
+from database import IDEMPOTENCIA, erro_de_dados, identidade, inserir_idempotente
+
+ARQUIVO = os.getenv("NEURO_FILA", str(Path(__file__).resolve().parent / "fila_escrita.db"))
+LOTE = int(os.getenv("NEURO_FILA_LOTE", 50))
+INTERVALO = float(os.getenv("NEURO_FILA_INTERVALO", 2.0))     # s entre varreduras ociosas
+MAX_TENTATIVAS = int(os.getenv("NEURO_FILA_TENTATIVAS", 8))
+ESPERA_BASE = 2.0       # s; dobra a cada tentativa (com variação aleatória)
+ESPERA_MAX = 300.0
+RESERVA = 120.0         # s; envio "enviando" há mais tempo que isso voltou a ficar livre
+
+PENDENTE, ENVIANDO, ENVIADO, FALHOU = "pendente", "enviando", "enviado", "falhou"
+
+ESQUEMA = """
+CREATE TABLE IF NOT EXISTS envios (
+    id           INTEGER PRIMARY KEY AUTOINCREMENT,
+    banco        TEXT NOT NULL,     -- database.identidade() de quem enfileirou
+    chave        TEXT NOT NULL,     -- vai na coluna IDEMPOTENCIA
+    tabela       TEXT NOT NULL,
+    registro     TEXT NOT NULL,
+    status       TEXT NOT NULL,
+    tentativas   INTEGER NOT NULL DEFAULT 0,
+    proxima_em   REAL NOT NULL,
+    reservado_em REAL,
+    criado_em    REAL NOT NULL,
+    enviado_em   REAL,
+    id_gravado   INTEGER,
+    erro         TEXT
+);
+CREATE INDEX IF NOT EXISTS envios_status_idx ON envios (banco, status, proxima_em);
+"""
+
+_local = threading.local()
+_lock = threading.Lock()
+_acordar = threading.Event()
+_trabalhador: Optional[threading.Thread] = None
+# tabela -> funções chamadas com cada linha gravada (ex.: atualizar um índice)
+_ao_enviar: Dict[str, List[Callable[[Dict], None]]] = defaultdict(list)
+
+
+def _conexao() -> sqlite3.Connection:
+    con = getattr(_local, "con", None)
+    if con is None:
+        con = sqlite3.connect(ARQUIVO, timeout=30, isolation_level=None)
+        con.row_factory = sqlite3.Row
+        con.execute("PRAGMA journal_mode=WAL")
+        con.execute("PRAGMA synchronous=FULL")  # envio aceito sobrevive a queda de energia
+        con.executescript(ESQUEMA)
+        _local.con = con
+    return con
+
+
+def ao_enviar(nome_tabela: str, funcao: Callable[[Dict], None]):
+    """Registra uma função chamada com cada linha gravada em `nome_tabela`."""
+    _ao_enviar[nome_tabela].append(funcao)
+
+
+def enfileirar(nome_tabela: str, registro: Dict) -> int:
+    """
+    Grava o registro na fila (já durável no retorno) e devolve o número do envio.
+    O envio só vai para o banco em uso agora (database.identidade), mesmo que
+    outro processo com outro backend use o mesmo arquivo de fila.
+    """
+    agora = time.time()
+    cur = _conexao().execute(
+        "INSERT INTO envios (banco, chave, tabela, registro, status, proxima_em, criado_em) "
+        "VALUES (?, ?, ?, ?, ?, ?, ?)",
+        (identidade(), uuid.uuid4().hex, nome_tabela,
+         json.dumps(registro, ensure_ascii=False, default=str), PENDENTE, agora, agora),
+    )
+    iniciar()
+    _acordar.set()
+    return cur.lastrowid
+
+
+def status(envio_id: int) -> Optional[Dict]:
+    """Situação de um envio: status, tentativas, id_gravado, erro..."""
+    linha = _conexao().execute(
+        "SELECT id, tabela, status, tentativas, id_gravado, erro, criado_em, enviado_em "
+        "FROM envios WHERE id = ?", (envio_id,)
+    ).fetchone()
+    return dict(linha) if linha else None
+
+
+def resumo() -> Dict[str, int]:
+    """Quantidade de envios por status (do banco em uso)."""
+    return dict(_conexao().execute(
+        "SELECT status, COUNT(*) FROM envios WHERE banco = ? GROUP BY status", (identidade(),)
+    ).fetchall())
+
+
+def reenviar_falhas() -> int:
+    """Devolve à fila os envios que esgotaram as tentativas."""
+    cur = _conexao().execute(
+        "UPDATE envios SET status = ?, tentativas = 0, proxima_em = ?, erro = NULL "
+        "WHERE banco = ? AND status = ?",
+        (PENDENTE, time.time(), identidade(), FALHOU),
+    )
+    _acordar.set()
+    return cur.rowcount
+
+
+def _reservar(limite: int) -> List[sqlite3.Row]:
+    """
+    Marca até `limite` envios vencidos do banco em uso como "enviando"
+    (exclusivo entre processos).
+    """
+    con = _conexao()
+    agora = time.time()
+    banco = identidade()
+    con.execute("BEGIN IMMEDIATE")
+    try:
+        linhas = con.execute(
+            "SELECT id, chave, tabela, registro, tentativas FROM envios WHERE banco = ? "
+            "AND ((status = ? AND proxima_em <= ?) OR (status = ? AND reservado_em < ?)) "
+            "ORDER BY id LIMIT ?",
+            (banco, PENDENTE, agora, ENVIANDO, agora - RESERVA, limite),
+        ).fetchall()
+        con.executemany(
+            "UPDATE envios SET status = ?, reservado_em = ? WHERE id = ?",
+            [(ENVIANDO, agora, l["id"]) for l in linhas],
+        )
+        con.execute("COMMIT")
+    except BaseException:
+        con.execute("ROLLBACK")
+        raise
+    return linhas
+
+
+def _concluir(envio_id: int, gravado: Dict):
+    _conexao().execute(
+        "UPDATE envios SET status = ?, enviado_em = ?, id_gravado = ?, erro = NULL WHERE id = ?",
+        (ENVIADO, time.time(), gravado.get("id"), envio_id),
+    )
+
+
+def _adiar(envio_id: int, tentativas: int, erro: Exception):
+    tentativas += 1
+    if tentativas >= MAX_TENTATIVAS:
+        novo, proxima = FALHOU, time.time()
+    else:
+        espera = min(ESPERA_BASE * 2 ** (tentativas - 1), ESPERA_MAX)
+        novo, proxima = PENDENTE, time.time() + espera * random.uniform(0.5, 1.0)
+    _conexao().execute(
+        "UPDATE envios SET status = ?, tentativas = ?, proxima_em = ?, erro = ? WHERE id = ?",
+        (novo, tentativas, proxima, f"{type(erro).__name__}: {erro}", envio_id),
+    )
+
+
+def _registro(envio: sqlite3.Row) -> Dict:
+    """O registro enfileirado, com a chave do envio."""
+    registro = json.loads(envio["registro"])
+    registro[IDEMPOTENCIA] = envio["chave"]
+    return registro
+
+
+def _enviar_tabela(nome_tabela: str, envios: List[sqlite3.Row]) -> List[Dict]:
+    """
+    Um insert de várias linhas. Se o banco recusar os dados, tenta uma a uma
+    para isolar a culpada; outras falhas (rede, timeout, 5xx) adiam o lote todo.
+    """
+    registros = [_registro(e) for e in envios]
+    try:
+        gravados = inserir_idempotente(nome_tabela, registros)
+    except Exception as e:
+        if len(envios) == 1 or not erro_de_dados(e):
+            raise
+        gravados = []
+        for envio, registro in zip(envios, registros):
+            try:
+                linha = inserir_idempotente(nome_tabela, [registro])[0]
+            except Exception as e:
+                _adiar(envio["id"], envio["tentativas"], e)
+                continue
+            _concluir(envio["id"], linha)
+            gravados.append(linha)
+        return gravados
+    for envio, linha in zip(envios, gravados):
+        _concluir(envio["id"], linha)
+    return gravados
+
+
+def enviar_pendentes(limite: int = LOTE) -> int:
+    """Uma rodada de envio; retorna quantos envios foram tentados."""
+    reservados = _reservar(limite)
+    por_tabela: Dict[str, List[sqlite3.Row]] = defaultdict(list)
+    for e in reservados:
+        por_tabela[e["tabela"]].append(e)
+    for nome_tabela, envios in por_tabela.items():
+        try:
+            gravados = _enviar_tabela(nome_tabela, envios)
+        except Exception as e:
+            for envio in envios:
+                _adiar(envio["id"], envio["tentativas"], e)
+            continue
+        if gravados:
+            cache.invalidar(nome_tabela)
+            for linha in gravados:
+                for funcao in _ao_enviar[nome_tabela]:
+                    try:
+                        funcao(linha)
+                    except Exception:
+                        pass
+    return len(reservados)
+
+
+def _laco():
+    while True:
+        _acordar.wait(INTERVALO)
+        _acordar.clear()
+        try:
+            while enviar_pendentes() >= LOTE:
+                pass
+        except Exception:
+            # ex.: arquivo da fila travado; tenta de novo na próxima rodada
+            time.sleep(INTERVALO)
+
+
+def iniciar():
+    """Sobe o trabalhador deste processo (uma vez); também reenvia o que ficou de antes."""
+    global _trabalhador
+    with _lock:
+        if _trabalhador is None or not _trabalhador.is_alive():
+            _trabalhador = threading.Thread(target=_laco, name="fila-escrita", daemon=True)
+            _trabalhador.start()
+            _acordar.set()
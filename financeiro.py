@@ -1,37 +1,78 @@
-import os, streamlit as st
 from datetime import datetime
-from typing import List, Dict
-from supabase import create_client, Client
+from typing import List, Dict, Optional, Tuple
+import cache
+import fila_escrita
+from database import tabela, paginar_keyset
 
-SUPABASE_URL = os.getenv("SUPABASE_URL") or st.secrets.get("SUPABASE_URL")
-SUPABASE_KEY = os.getenv("SUPABASE_KEY") or st.secrets.get("SUPABASE_KEY")
-if not SUPABASE_URL or not SUPABASE_KEY:
-    raise RuntimeError("Defina SUPABASE_URL e SUPABASE_KEY em env ou Secrets.")
-
-supabase: Client = create_client(SUPABASE_URL, SUPABASE_KEY)
 TBL = "transacoes"
+COLUNAS_LOTE = ["paciente_id", "data_mov", "valor", "descricao"]
 
 def _tbl():
-    return supabase.table(TBL)
+    return tabela(TBL)
 
-def adicionar_transacao(
-    pid: int, data_iso: str, valor: float, desc: str
-) -> int:
-    item = {
+def _item(pid: int, data_iso: str, valor: float, desc: str) -> Dict:
+    return {
         "paciente_id": pid,
         "data_mov": data_iso,
         "valor": valor,
         "descricao": desc,
         "criado_em": datetime.utcnow().isoformat()
     }
-    res = _tbl().insert(item).execute()
+
+def adicionar_transacao(
+    pid: int, data_iso: str, valor: float, desc: str
+) -> int:
+    res = _tbl().insert(_item(pid, data_iso, valor, desc)).execute()
+    cache.invalidar(TBL)
     return res.data[0]["id"]
 
+def adicionar_transacoes_em_lote(registros: List[Dict]) -> List[Dict]:
+    """
+    Insere várias transações (dicts com as chaves de COLUNAS_LOTE; data em
+    AAAA-MM-DD ou DD/MM/AAAA) em poucas requisições, validando tudo de uma vez.
+    Retorna, na ordem de entrada, {"id", "erro", "linha"} por registro.
+    """
+    import validacao
+    df = validacao.quadro(registros, COLUNAS_LOTE)
+    pid = validacao.inteiros(df["paciente_id"])
+    datas = validacao.datas_iso(df["data_mov"])
+    valores = validacao.valores(df["valor"])
+    erros = validacao.sem_erros(len(df))
+    erros = validacao.marcar(erros, pid.isna(), "paciente_id inválido")
+    erros = validacao.marcar(erros, datas.isna(), "data_mov inválida")
+    erros = validacao.marcar(erros, valores.isna(), "valor inválido")
+    df = df.assign(
+        paciente_id=pid, data_mov=datas, valor=valores,
+        descricao=validacao.texto(df["descricao"]),
+        criado_em=datetime.utcnow().isoformat(),
+    )
+    resultados = validacao.inserir_validos(TBL, df, erros)
+    if any(r["id"] is not None for r in resultados):
+        cache.invalidar(TBL)
+    return resultados
+
+def enfileirar_transacao(
+    pid: int, data_iso: str, valor: float, desc: str
+) -> int:
+    """Grava pela fila de escrita e retorna o número do envio (fila_escrita.status)."""
+    return fila_escrita.enfileirar(TBL, _item(pid, data_iso, valor, desc))
+
+@cache.em_cache(TBL)
 def obter_transacoes() -> List[Dict]:
     return _tbl().select("*").order("data_mov").execute().data or []
 
+@cache.em_cache(TBL)
 def obter_transacoes_por_paciente(pid: int) -> List[Dict]:
     return _tbl().select("*")\
                  .eq("paciente_id", pid)\
                  .order("data_mov")\
                  .execute().data or []
+
+@cache.em_cache(TBL)
+def obter_transacoes_pagina(
+    apos: Optional[Tuple] = None, limite: int = 100, pid: Optional[int] = None
+) -> Tuple[List[Dict], Optional[Tuple]]:
+    q = _tbl().select("*")
+    if pid is not None:
+        q = q.eq("paciente_id", pid)
+    return paginar_keyset(q, ("data_mov", "id"), apos, limite)
@@ -0,0 +1,206 @@
+# importacao_pacientes.py – Importação em massa de pacientes (CSV/XLSX), lida em
+# blocos, validada com pandas e gravada em lote
+import codecs
+import datetime
+import re
+from pathlib import Path
+from typing import Callable, Dict, Iterator, Optional, Set
+
+import pandas as pd
+
+import busca_pacientes
+import pacientes
+import validacao
+from database import tabela
+
+BLOCO = 1000
+SEPARADORES = (";", ",", "\t")
+
+# cabeçalhos usuais de planilhas de outros sistemas -> coluna de pacientes
+# (comparados sem acentos, em minúsculas e com "_" no lugar de espaços)
+SINONIMOS = {
+    "nome_completo": "nome", "paciente": "nome",
+    "data_de_nascimento": "data_nasc", "data_nascimento": "data_nasc",
+    "nascimento": "data_nasc", "dt_nasc": "data_nasc",
+    "e_mail": "email",
+    "telefone": "tel", "telefone_1": "tel", "telefone1": "tel",
+    "celular": "tel2", "telefone_2": "tel2", "telefone2": "tel2",
+    "logradouro": "endereco", "rua": "endereco", "endereco_rua": "endereco",
+    "uf": "estado",
+    "plano_de_saude": "plano", "convenio": "plano",
+    "historico_medico": "historico",
+    "obs": "observacao", "observacoes": "observacao",
+}
+
+
+def _coluna(cabecalho) -> Optional[str]:
+    chave = busca_pacientes.dobrar(str(cabecalho or "")).replace(" ", "_")
+    chave = SINONIMOS.get(chave, chave)
+    return chave if chave in pacientes.COLUNAS_LOTE else None
+
+
+def _celula(v) -> str:
+    if v is None:
+        return ""
+    if isinstance(v, datetime.datetime):
+        return v.date().isoformat()
+    if isinstance(v, datetime.date):
+        return v.isoformat()
+    if isinstance(v, float) and v.is_integer():
+        return str(int(v))
+    return str(v)
+
+
+def _blocos_csv(arquivo, tamanho: int) -> Iterator[pd.DataFrame]:
+    inicio = arquivo.read(64 * 1024)
+    arquivo.seek(0)
+    try:
+        # final=False: tolera um caractere cortado no fim da amostra
+        amostra = codecs.getincrementaldecoder("utf-8")().decode(inicio, final=False)
+        codificacao = "utf-8-sig"
+    except UnicodeDecodeError:
+        # exportações de sistemas antigos costumam vir em Latin-1
+        amostra = inicio.decode("latin-1")
+        codificacao = "latin-1"
+    primeira = amostra.splitlines()[0] if amostra else ""
+    sep = max(SEPARADORES, key=primeira.count)
+    leitor = pd.read_csv(arquivo, sep=sep, dtype=str, keep_default_na=False,
+                         encoding=codificacao, chunksize=tamanho)
+    for bloco in leitor:
+        bloco.index = bloco.index + 2  # linha 1 é o cabeçalho
+        yield bloco
+
+
+def _blocos_xlsx(arquivo, tamanho: int) -> Iterator[pd.DataFrame]:
+    from openpyxl import load_workbook
+    livro = load_workbook(arquivo, read_only=True, data_only=True)
+    try:
+        linhas = livro.active.iter_rows(values_only=True)
+        cabecalho = [_celula(c) for c in next(linhas, ())]
+        valores, numeros = [], []
+        for n, linha in enumerate(linhas, start=2):
+            if all(c is None for c in linha):
+                continue
+            valores.append([_celula(c) for c in linha[:len(cabecalho)]])
+            numeros.append(n)
+            if len(valores) == tamanho:
+                yield pd.DataFrame(valores, columns=cabecalho, index=numeros)
+                valores, numeros = [], []
+        if valores:
+            yield pd.DataFrame(valores, columns=cabecalho, index=numeros)
+    finally:
+        livro.close()
+
+
+def ler_blocos(arquivo, nome_arquivo: str, tamanho: int = BLOCO) -> Iterator[pd.DataFrame]:
+    """
+    Lê CSV (separador e codificação detectados) ou XLSX em blocos de `tamanho`
+    linhas, tudo como texto; o índice de cada bloco é a linha na planilha.
+    `arquivo` é um caminho ou um objeto binário (ex.: st.file_uploader).
+    """
+    if isinstance(arquivo, (str, Path)):
+        with open(arquivo, "rb") as f:
+            yield from ler_blocos(f, nome_arquivo, tamanho)
+        return
+    extensao = Path(nome_arquivo).suffix.lower()
+    if extensao == ".csv":
+        yield from _blocos_csv(arquivo, tamanho)
+    elif extensao == ".xlsx":
+        yield from _blocos_xlsx(arquivo, tamanho)
+    else:
+        raise ValueError(f"Formato não suportado: {extensao or nome_arquivo} (use .csv ou .xlsx)")
+
+
+def cpfs_cadastrados(lote: int = BLOCO) -> Set[str]:
+    """CPFs (só dígitos) de todos os pacientes, lidos por id em poucas requisições."""
+    cpfs, ultimo = set(), None
+    while True:
+        q = tabela(pacientes.TBL).select("id, cpf")
+        if ultimo is not None:
+            q = q.gt("id", ultimo)
+        linhas = q.order("id").limit(lote).execute().data or []
+        cpfs.update(re.sub(r"\D", "", l.get("cpf") or "") for l in linhas)
+        if len(linhas) < lote:
+            break
+        ultimo = linhas[-1]["id"]
+    cpfs.discard("")
+    return cpfs
+
+
+def _importar_bloco(bloco: pd.DataFrame, existentes: Set[str], do_arquivo: Set[str]):
+    """
+    Valida e grava um bloco; devolve (inseridos, linhas rejeitadas com o motivo).
+    Todas as colunas são conferidas antes de descartar a linha, para que o
+    motivo traga todos os problemas dela de uma vez.
+    """
+    df = bloco.set_axis([_coluna(c) for c in bloco.columns], axis=1)
+    df = df.loc[:, [c is not None for c in df.columns]]
+    df = df.loc[:, ~df.columns.duplicated()].reindex(columns=pacientes.COLUNAS_LOTE)
+    df = df.reset_index(drop=True)
+
+    df, erros = pacientes.validar_lote(df)
+    cpf = validacao.digitos(df["cpf"], 11)
+    cep = validacao.digitos(df["cep"], 8)
+    uf = validacao.ufs(df["estado"])
+    cpf_ok = (cpf != "") & validacao.cpfs_validos(cpf)
+    erros = validacao.marcar(erros, (cpf != "") & ~cpf_ok, "CPF inválido")
+    erros = validacao.marcar(erros, (uf != "") & ~uf.isin(validacao.UFS), "UF inválida")
+    erros = validacao.marcar(erros, (cep != "") & (cep.str.len() != 8), "CEP inválido")
+    ja_cadastrado = cpf_ok & cpf.isin(existentes)
+    erros = validacao.marcar(erros, ja_cadastrado, "CPF já cadastrado")
+    # o CPF fica com a primeira linha que será gravada; as seguintes são repetidas
+    ocupa = cpf_ok & (erros == "").to_numpy()
+    primeiras = cpf[ocupa].drop_duplicates()
+    dona = cpf.map(pd.Series(primeiras.index, index=primeiras.to_numpy()))
+    repetido = cpf_ok & ~ja_cadastrado & (cpf.isin(do_arquivo) | (dona < df.index))
+    erros = validacao.marcar(erros, repetido, "CPF repetido no arquivo")
+
+    df = df.assign(cpf=validacao.formatar_cpf(cpf), cep=validacao.formatar_cep(cep), estado=uf)
+    validos = (erros == "").to_numpy()
+    resultados = pacientes.adicionar_pacientes_em_lote(validacao.registros(df[validos]))
+    erros = erros.copy()
+    erros[validos] = [r["erro"] or "" for r in resultados]
+    inseridos = (erros == "").to_numpy() & validos
+    do_arquivo.update(c for c in cpf[inseridos] if c)
+
+    rejeitados = bloco[~inseridos].copy()
+    rejeitados.insert(0, "motivo", erros[~inseridos].str.rstrip("; ").to_numpy())
+    rejeitados.insert(0, "linha", rejeitados.index)
+    return int(inseridos.sum()), rejeitados
+
+
+def importar_pacientes(
+    arquivo,
+    nome_arquivo: str,
+    tamanho_bloco: int = BLOCO,
+    ao_progredir: Optional[Callable[[int, int], None]] = None,
+) -> Dict:
+    """
+    Importa pacientes de uma planilha, um bloco por vez: CPF (dígitos
+    verificadores), data de nascimento (DD/MM/AAAA ou ISO), UF e CEP são
+    validados por coluna; CPFs já cadastrados ou repetidos no arquivo são
+    recusados. Colunas desconhecidas são ignoradas.
+    Retorna {"lidos", "inseridos", "rejeitados"}; rejeitados é um DataFrame
+    com a linha da planilha, o motivo e as colunas originais.
+    `ao_progredir(lidos, inseridos)` é chamada após cada bloco.
+    """
+    existentes = cpfs_cadastrados()
+    do_arquivo: Set[str] = set()
+    lidos = inseridos = 0
+    rejeicoes = []
+    for bloco in ler_blocos(arquivo, nome_arquivo, tamanho_bloco):
+        n, rejeitados = _importar_bloco(bloco, existentes, do_arquivo)
+        lidos += len(bloco)
+        inseridos += n
+        if len(rejeitados):
+            rejeicoes.append(rejeitados)
+        if ao_progredir:
+            ao_progredir(lidos, inseridos)
+    rejeitados = (pd.concat(rejeicoes, ignore_index=True) if rejeicoes
+                  else pd.DataFrame(columns=["linha", "motivo"]))
+    return {"lidos": lidos, "inseridos": inseridos, "rejeitados": rejeitados}
+
+
+def relatorio_csv(rejeitados: pd.DataFrame) -> bytes:
+    """Relatório de rejeições em CSV (abre direto no Excel); serve para corrigir e reimportar."""
+    return rejeitados.to_csv(index=False, sep=";").encode("utf-8-sig")
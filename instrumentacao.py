@@ -0,0 +1,196 @@
+# instrumentacao.py – Rastreamento das chamadas ao banco, agrupadas por página
+import contextvars
+import json
+import math
+import os
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from typing import Dict, List, Optional
+
+ATIVO = os.getenv("NEURO_INSTRUMENTAR", "1") != "0"
+MAX_RENDERIZACOES = int(os.getenv("NEURO_DIAG_MAX", 500))
+ARQUIVO_JSONL = os.getenv("NEURO_DIAG_ARQUIVO")  # opcional: acrescenta cada renderização
+# medir bytes reserializa cada resposta em JSON (o supabase-py não expõe o
+# Content-Length); desligado por padrão, ligável na página de diagnóstico
+MEDIR_BYTES = os.getenv("NEURO_DIAG_BYTES", "0") == "1"
+
+OPERACOES = {"select", "insert", "update", "upsert", "delete"}
+FILTROS = {
+    "eq", "neq", "gt", "gte", "lt", "lte", "like", "ilike", "is_", "in_",
+    "contains", "or_", "order", "limit", "range", "single", "maybe_single",
+}
+
+_lock = threading.Lock()
+_renderizacoes: deque = deque(maxlen=MAX_RENDERIZACOES)
+_chamadas: deque = deque(maxlen=MAX_RENDERIZACOES * 10)
+_atual: contextvars.ContextVar = contextvars.ContextVar("renderizacao", default=None)
+
+
+class _Renderizacao:
+    def __init__(self, pagina: str):
+        self.pagina = pagina
+        self.inicio = time.time()
+        self.duracao_ms = 0.0
+        self.chamadas: List[Dict] = []
+        self._lock = threading.Lock()
+
+    def registrar(self, chamada: Dict):
+        with self._lock:
+            self.chamadas.append(chamada)
+
+    def como_dict(self) -> Dict:
+        return {
+            "pagina": self.pagina,
+            "inicio": self.inicio,
+            "duracao_ms": round(self.duracao_ms, 2),
+            "banco_ms": round(sum(c["latencia_ms"] for c in self.chamadas), 2),
+            "n_chamadas": len(self.chamadas),
+            "chamadas": self.chamadas,
+        }
+
+
+@contextmanager
+def renderizacao(pagina: str):
+    """Agrupa as chamadas ao banco feitas durante a renderização de uma página."""
+    r = _Renderizacao(pagina)
+    token = _atual.set(r)
+    t0 = time.perf_counter()
+    try:
+        yield r
+    finally:
+        r.duracao_ms = (time.perf_counter() - t0) * 1000
+        _atual.reset(token)
+        registro = r.como_dict()
+        with _lock:
+            _renderizacoes.append(registro)
+        if ARQUIVO_JSONL:
+            try:
+                with open(ARQUIVO_JSONL, "a", encoding="utf-8") as f:
+                    f.write(json.dumps(registro, ensure_ascii=False, default=str) + "\n")
+            except OSError:
+                pass
+
+
+class _ConsultaInstrumentada:
+    """Envolve o query builder e mede o execute(); o resto é repassado."""
+
+    def __init__(self, tabela: str, builder, info: Optional[Dict] = None):
+        self._tabela = tabela
+        self._builder = builder
+        self._info = info or {"operacao": None, "filtros": []}
+
+    def __getattr__(self, nome):
+        alvo = getattr(self._builder, nome)
+        if not callable(alvo):
+            return alvo
+
+        def chamada(*args, **kwargs):
+            info = {"operacao": self._info["operacao"], "filtros": list(self._info["filtros"])}
+            if nome in OPERACOES:
+                info["operacao"] = nome
+            elif nome in FILTROS:
+                coluna = args[0] if args and nome not in ("or_", "limit", "range") else ""
+                info["filtros"].append(f"{nome.rstrip('_')}:{coluna}" if coluna else nome.rstrip("_"))
+            resultado = alvo(*args, **kwargs)
+            if hasattr(resultado, "execute"):
+                return _ConsultaInstrumentada(self._tabela, resultado, info)
+            return resultado
+        return chamada
+
+    def execute(self):
+        t0 = time.perf_counter()
+        erro = None
+        resp = None
+        try:
+            resp = self._builder.execute()
+            return resp
+        except Exception as e:
+            erro = type(e).__name__
+            raise
+        finally:
+            _registrar(self._tabela, self._info, resp, (time.perf_counter() - t0) * 1000, erro)
+
+
+def _bytes(dados) -> int:
+    return len(json.dumps(dados, default=str).encode("utf-8")) if dados else 0
+
+
+def _registrar(tabela: str, info: Dict, resp, latencia_ms: float, erro: Optional[str]):
+    dados = getattr(resp, "data", None)
+    if isinstance(dados, list):
+        linhas = len(dados)
+    else:
+        linhas = 1 if dados else (getattr(resp, "count", None) or 0)
+    chamada = {
+        "tabela": tabela,
+        "operacao": info["operacao"] or "?",
+        "filtros": ",".join(info["filtros"]),
+        "linhas": linhas,
+        "bytes": _bytes(dados) if MEDIR_BYTES else None,
+        "latencia_ms": round(latencia_ms, 2),
+        "erro": erro,
+        "thread": threading.current_thread().name,
+    }
+    r = _atual.get()
+    chamada["pagina"] = r.pagina if r else None
+    if r:
+        r.registrar(chamada)
+    with _lock:
+        _chamadas.append(chamada)
+
+
+def instrumentar(tabela: str, builder):
+    return _ConsultaInstrumentada(tabela, builder) if ATIVO else builder
+
+
+def _percentil(valores: List[float], p: float) -> float:
+    if not valores:
+        return 0.0
+    ordenados = sorted(valores)
+    i = max(0, math.ceil(p / 100 * len(ordenados)) - 1)
+    return round(ordenados[i], 2)
+
+
+def resumo_por_pagina() -> List[Dict]:
+    """Uma linha por página: renderizações, p50/p95/p99 (ms) do total e do tempo em banco."""
+    with _lock:
+        regs = list(_renderizacoes)
+    por_pagina: Dict[str, List[Dict]] = {}
+    for r in regs:
+        por_pagina.setdefault(r["pagina"], []).append(r)
+    linhas = []
+    for pagina, rs in sorted(por_pagina.items()):
+        total = [r["duracao_ms"] for r in rs]
+        banco = [r["banco_ms"] for r in rs]
+        linhas.append({
+            "pagina": pagina,
+            "renderizacoes": len(rs),
+            "chamadas_media": round(sum(r["n_chamadas"] for r in rs) / len(rs), 1),
+            "p50_ms": _percentil(total, 50),
+            "p95_ms": _percentil(total, 95),
+            "p99_ms": _percentil(total, 99),
+            "banco_p50_ms": _percentil(banco, 50),
+            "banco_p95_ms": _percentil(banco, 95),
+            "banco_p99_ms": _percentil(banco, 99),
+        })
+    return linhas
+
+
+def chamadas_recentes(limite: int = 200) -> List[Dict]:
+    with _lock:
+        return list(_chamadas)[-limite:][::-1]
+
+
+def exportar_jsonl() -> str:
+    """Todas as renderizações guardadas, uma por linha (JSON Lines)."""
+    with _lock:
+        regs = list(_renderizacoes)
+    return "".join(json.dumps(r, ensure_ascii=False, default=str) + "\n" for r in regs)
+
+
+def limpar():
+    with _lock:
+        _renderizacoes.clear()
+        _chamadas.clear()
@@ -1,5 +1,5 @@
 # laudos.py
-from banco_dados import supabase
+from database import tabela
 
 def adicionar_laudo(paciente_id, laudo, data):
     dados = {
@@ -7,9 +7,9 @@ def adicionar_laudo(paciente_id, laudo, data):
         "laudo": laudo,
         "data": data
     }
-    resposta = supabase.table("laudos").insert(dados).execute()
+    resposta = tabela("laudos").insert(dados).execute()
     return resposta
 
 def obter_laudos():
-    resposta = supabase.table("laudos").select("*").execute()
+    resposta = tabela("laudos").select("*").execute()
     return resposta.data
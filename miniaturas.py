@@ -0,0 +1,170 @@
+# miniaturas.py – Miniaturas e prévias dos exames, geradas em segundo plano e
+# guardadas em disco pelo hash do conteúdo
+import os
+import threading
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Dict, Iterable, Optional
+
+import exames
+
+DIRETORIO = exames.RAIZ / "miniaturas"
+# pdftoppm (pdf2image) roda em subprocesso e o Pillow solta o GIL ao decodificar:
+# threads bastam, e poucas, para não disputar CPU com as páginas
+TRABALHADORES = int(os.getenv("NEURO_MINIATURAS_TRABALHADORES", 2))
+MINIATURA = (240, 240)
+PREVIA = (1200, 1200)
+QUALIDADE = {"mini": 70, "previa": 80}
+DPI_PDF = 100   # suficiente para a prévia; a miniatura sai da mesma página
+# falhas passageiras (ex.: disco cheio, arquivo ainda sendo copiado) seguidas antes
+# de marcar o exame como falho neste processo
+MAX_TENTATIVAS = 3
+
+_pool = ThreadPoolExecutor(max_workers=TRABALHADORES, thread_name_prefix="miniaturas")
+_lock = threading.Lock()
+_em_andamento = set()
+_tentativas: Dict[str, int] = {}
+
+
+def caminho(sha256: str, tipo: str = "mini") -> Path:
+    """`tipo` é "mini" ou "previa" (JPEG); "erro" guarda o motivo de uma falha."""
+    extensao = ".txt" if tipo == "erro" else ".jpg"
+    return DIRETORIO / sha256[:2] / f"{sha256}_{tipo}{extensao}"
+
+
+def _gravar(img, destino: Path, qualidade: int):
+    destino.parent.mkdir(parents=True, exist_ok=True)
+    tmp = destino.with_name(f".{destino.name}.{uuid.uuid4().hex}.tmp")
+    img.save(tmp, "JPEG", quality=qualidade, optimize=True, progressive=True)
+    os.replace(tmp, destino)
+
+
+def _primeira_pagina(origem: Path, mime: str):
+    if mime == "application/pdf" or origem.suffix.lower() == ".pdf":
+        from pdf2image import convert_from_path
+        paginas = convert_from_path(str(origem), dpi=DPI_PDF, first_page=1, last_page=1)
+        return paginas[0]
+    from PIL import Image, ImageOps
+    img = Image.open(origem)
+    # JPEG grande: decodifica já reduzido (1/2, 1/4, 1/8), bem mais rápido
+    img.draft("RGB", PREVIA)
+    return ImageOps.exif_transpose(img)
+
+
+def _definitiva(e: Exception) -> bool:
+    """Falha do próprio arquivo ou de ferramenta ausente: tentar de novo dá no mesmo."""
+    # o Pillow usa SyntaxError/ValueError para arquivos malformados
+    if isinstance(e, (ImportError, SyntaxError, ValueError)):
+        return True
+    tipos = []
+    try:
+        from PIL import Image
+        tipos += [Image.UnidentifiedImageError, Image.DecompressionBombError]
+    except ImportError:
+        pass
+    try:
+        from pdf2image import exceptions as pdf
+        tipos += [pdf.PDFInfoNotInstalledError, pdf.PopplerNotInstalledError,
+                  pdf.PDFPageCountError, pdf.PDFSyntaxError]
+    except ImportError:
+        pass
+    return isinstance(e, tuple(tipos))
+
+
+def gerar(meta: Dict) -> bool:
+    """Gera (de forma síncrona) a miniatura e a prévia de um exame; True se deu certo."""
+    sha = meta["sha256"]
+    try:
+        img = _primeira_pagina(exames.RAIZ / meta["arquivo"], meta.get("mime") or "")
+        if img.mode not in ("RGB", "L"):
+            img = img.convert("RGB")
+        previa = img.copy()
+        previa.thumbnail(PREVIA)
+        _gravar(previa, caminho(sha, "previa"), QUALIDADE["previa"])
+        previa.thumbnail(MINIATURA)
+        _gravar(previa, caminho(sha, "mini"), QUALIDADE["mini"])
+    except Exception as e:
+        with _lock:
+            _tentativas[sha] = _tentativas.get(sha, 0) + 1
+            passageira = not _definitiva(e) and _tentativas[sha] < MAX_TENTATIVAS
+        if passageira:
+            return False  # sem marca: volta a ser agendado na próxima renderização
+        # ex.: PDF corrompido, pdf2image/poppler ausente; não tenta de novo a cada rerun
+        erro = caminho(sha, "erro")
+        erro.parent.mkdir(parents=True, exist_ok=True)
+        erro.write_text(f"{type(e).__name__}: {e}", encoding="utf-8")
+        return False
+    with _lock:
+        _tentativas.pop(sha, None)
+    return True
+
+
+def _tarefa(meta: Dict):
+    try:
+        gerar(meta)
+    finally:
+        with _lock:
+            _em_andamento.discard(meta["sha256"])
+
+
+def agendar(meta: Dict) -> bool:
+    """Coloca o exame na fila do pool se ainda não tem miniatura; True se agendou."""
+    sha = meta.get("sha256")
+    if not sha or situacao(meta) != "pendente":
+        return False
+    with _lock:
+        if sha in _em_andamento:
+            return False
+        _em_andamento.add(sha)
+    _pool.submit(_tarefa, dict(meta))
+    return True
+
+
+def agendar_todos(metas: Iterable[Dict]) -> int:
+    return sum(agendar(m) for m in metas)
+
+
+def situacao(meta: Dict) -> str:
+    """"pronta", "gerando", "falhou", "pendente" ou "indisponivel" (sem hash)."""
+    sha = meta.get("sha256")
+    if not sha:
+        return "indisponivel"
+    if caminho(sha, "mini").exists():
+        return "pronta"
+    if sha in _em_andamento:
+        return "gerando"
+    if caminho(sha, "erro").exists():
+        return "falhou"
+    return "pendente"
+
+
+def miniatura(meta: Dict) -> Optional[Path]:
+    """Caminho da miniatura pronta; se não existe, agenda a geração e devolve None."""
+    if situacao(meta) == "pronta":
+        return caminho(meta["sha256"], "mini")
+    agendar(meta)
+    return None
+
+
+def previa(meta: Dict) -> Optional[Dict]:
+    """Prévia pronta no formato de metadados de exame (para servidor_exames.link)."""
+    sha = meta.get("sha256")
+    if not sha or not caminho(sha, "previa").exists():
+        return None
+    return {
+        "arquivo": str(caminho(sha, "previa").relative_to(exames.RAIZ)),
+        "nome": f"{Path(meta['nome']).stem} (prévia).jpg",
+        "mime": "image/jpeg",
+        "sha256": f"{sha}-previa",
+    }
+
+
+def limpar_falhas() -> int:
+    """Apaga as marcas de falha (ex.: depois de instalar o poppler); voltam a ser geradas."""
+    marcas = list(DIRETORIO.glob("??/*_erro.txt")) if DIRETORIO.exists() else []
+    for m in marcas:
+        m.unlink(missing_ok=True)
+    with _lock:
+        _tentativas.clear()
+    return len(marcas)
@@ -5,28 +5,17 @@ import datetime, textwrap
 from pathlib import Path
 from io import BytesIO
 
-import pandas as pd
-from reportlab.pdfgen import canvas as pdfcanvas
-from reportlab.lib.pagesizes import letter
-from reportlab.lib.utils import ImageReader
-from streamlit_option_menu import option_menu
-from st_aggrid import AgGrid, GridOptionsBuilder
-
 import auth
-import users
-import pacientes
-import agendamentos
-import prontuario
-import financeiro
-import comunicacao
-import relatorios
-from laudo_templates import LAUDOS
+import paralelo
+import instrumentacao
+
+# pandas, AgGrid, ReportLab e os módulos de domínio são importados dentro das
+# páginas que os usam: um paciente que só abre "Minhas Consultas" não carrega
+# relatórios nem laudos. Perfil de importação: python benchmarks/inicio.py
 
 # ---- Configura diretórios ----
 BASE_DIR   = Path(__file__).resolve().parent
 LOGO_FILE  = BASE_DIR / "neuro.png"
-UPLOAD_DIR = BASE_DIR / "uploads"
-UPLOAD_DIR.mkdir(exist_ok=True)
 
 # ---- Configuração da página ----
 st.set_page_config(
@@ -41,21 +30,76 @@ user_key    = auth_data["user"]
 user_name   = auth_data["name"]
 role        = auth_data["role"]       # 'admin' ou 'paciente'
 paciente_id = auth_data.get("pid")
+paralelo.nova_rodada()
+
+# st.experimental_rerun saiu do Streamlit; st.rerun existe desde a 1.27
+_rerun = getattr(st, "rerun", None) or st.experimental_rerun
 
 # ---- Sidebar ----
 st.sidebar.success(f"Logado como {user_name} ({role})")
 if st.sidebar.button("Sair"):
     st.session_state.pop("auth", None)
-    st.experimental_rerun()
+    st.session_state.pop("perfil", None)
+    _rerun()
 if LOGO_FILE.exists():
     st.sidebar.image(str(LOGO_FILE), width=120)
 st.sidebar.markdown("---")
+if role == "admin":
+    import cache, database, fila_escrita
+    fila_escrita.iniciar()  # envia também o que ficou na fila de uma execução anterior
+    with st.sidebar.expander("Conexões com o banco"):
+        st.json(database.estatisticas_conexoes())
+    with st.sidebar.expander("Cache de leitura"):
+        st.dataframe(cache.estatisticas())
+        if cache.cache_compartilhado.ativo():
+            st.caption("Compartilhado entre processos")
+            st.json(cache.cache_compartilhado.estatisticas())
+        if st.button("Limpar cache"):
+            cache.limpar()
+    if database.replica() is not None:
+        with st.sidebar.expander("Réplica local"):
+            c1, c2 = st.columns(2)
+            sincronizar = c1.button("Sincronizar agora")
+            # a completa também remove o que foi excluído no banco principal
+            completa = c2.button("Sincronização completa")
+            if sincronizar or completa:
+                baixadas = database.replica().sincronizar(completa=completa)
+                cache.invalidar(*[t for t, n in baixadas.items() if n or completa])
+                st.success(f"Linhas atualizadas: {baixadas}")
+            st.json(database.replica().estatisticas())
+    with st.sidebar.expander("Gravações", expanded=bool(st.session_state.get("envios"))):
+        for envio_id, descricao in st.session_state.get("envios", []):
+            s_envio = fila_escrita.status(envio_id) or {}
+            situacao = s_envio.get("status", "?")
+            if s_envio.get("erro"):
+                situacao += f" ({s_envio['tentativas']} tentativas: {s_envio['erro']})"
+            st.write(f"#{envio_id} {descricao}: {situacao}")
+        st.caption(f"Fila: {fila_escrita.resumo() or 'vazia'}")
+        c1, c2 = st.columns(2)
+        c1.button("Atualizar")  # o clique só refaz a página, relendo os status
+        if c2.button("Reenviar falhas"):
+            fila_escrita.reenviar_falhas()
+
+# ---- Fila de escrita ----
+def _enfileirado(envio_id: int, descricao: str):
+    """Guarda o envio na sessão para o painel "Gravações" acompanhar o status."""
+    envios = st.session_state.setdefault("envios", [])
+    envios.insert(0, (envio_id, descricao))
+    del envios[20:]
+    st.success(f"{descricao}: recebido (envio #{envio_id}); a gravação segue em segundo plano.")
 
 # ---- Helper AgGrid ----
-def aggrid_table(df: pd.DataFrame):
+def aggrid_table(df=None, buscar_pagina=None, chave: str = "grid"):
+    """
+    Mostra um DataFrame no AgGrid. Com `buscar_pagina(apos) -> (linhas, prox)`,
+    busca apenas a página atual e só pede a seguinte quando o usuário avança.
+    """
+    if buscar_pagina is not None:
+        df = _pagina_atual(buscar_pagina, chave)
     if df is None or df.empty:
         st.info("Nenhum dado.")
         return
+    from st_aggrid import AgGrid, GridOptionsBuilder
     gb = GridOptionsBuilder.from_dataframe(df)
     gb.configure_pagination(paginationAutoPageSize=True)
     gb.configure_default_column(
@@ -74,8 +118,94 @@ def aggrid_table(df: pd.DataFrame):
         height=400
     )
 
+def _pagina_atual(buscar_pagina, chave: str):
+    import pandas as pd
+    return pd.DataFrame(_paginar(buscar_pagina, chave))
+
+def _paginar(buscar_pagina, chave: str) -> list:
+    # pilha de cursores: cursores[i] abre a página i (None = primeira)
+    cursores = st.session_state.setdefault(f"cursores_{chave}", [None])
+    linhas, prox = buscar_pagina(cursores[-1])
+    c1, c2, c3 = st.columns([1, 1, 4])
+    if c1.button("◀ Anterior", key=f"ant_{chave}", disabled=len(cursores) == 1):
+        cursores.pop()
+        _rerun()
+    if c2.button("Próxima ▶", key=f"prox_{chave}", disabled=prox is None):
+        cursores.append(prox)
+        _rerun()
+    c3.caption(f"Página {len(cursores)}")
+    return linhas
+
+def _exames_paginados(pid, chave: str) -> list:
+    """Filtros de tipo e período e a página atual do catálogo de exames do paciente."""
+    import catalogo_exames
+    c1, c2 = st.columns(2)
+    tipos = {"Todos": None, "PDF": "pdf", "Imagens": "imagem"}
+    tipo = tipos[c1.selectbox("Tipo", list(tipos), key=f"tipo_{chave}")]
+    periodo = c2.date_input("Período de envio", value=[], key=f"periodo_{chave}")
+    desde, ate = (list(periodo) + [None, None])[:2]
+    total = catalogo_exames.contar(pid, tipo, desde, ate)
+    st.caption(f"{total} exame(s)")
+    if not total:
+        return []
+    return _paginar(
+        lambda apos: catalogo_exames.listar(pid, apos, 20, tipo, desde, ate),
+        f"{chave}_{pid}_{tipo}_{desde}_{ate}"
+    )
+
+def _galeria_exames(linhas: list):
+    """Miniaturas da página atual de exames; as que faltam são geradas em segundo plano."""
+    import miniaturas, servidor_exames
+    gerando = False
+    cols = st.columns(4)
+    for i, meta in enumerate(linhas):
+        with cols[i % 4]:
+            mini = miniaturas.miniatura(meta)
+            if mini:
+                st.image(str(mini))
+                previa = miniaturas.previa(meta)
+                url = servidor_exames.link(previa) if previa else None
+                if url:
+                    st.markdown(f"[Ampliar prévia]({url})")
+            elif miniaturas.situacao(meta) == "gerando":
+                gerando = True
+                st.caption("Gerando miniatura...")
+            else:
+                st.caption("Sem prévia")
+            _exame_sob_demanda(meta)
+    if gerando:
+        st.button("Atualizar miniaturas", key="atualizar_miniaturas")
+
+def _exame_sob_demanda(meta: dict):
+    """
+    Link assinado para o exame (servidor_exames), sem ler o arquivo nesta
+    renderização; sem o endpoint, o arquivo só é lido depois do clique.
+    """
+    import exames, servidor_exames
+    rotulo = (f"{meta['nome']} ({meta['enviado_em'][:10]}, {meta['tamanho'] / 2**20:.1f} MB)"
+              .replace("[", "(").replace("]", ")"))
+    url = servidor_exames.link(meta)
+    if url:
+        st.markdown(f"- [{rotulo}]({url})")
+        return
+    pedido = f"baixar_exame_{meta['id']}"
+    if not st.session_state.get(pedido):
+        if st.button(f"Carregar {rotulo}", key=f"carregar_exame_{meta['id']}"):
+            st.session_state[pedido] = True
+            _rerun()
+        return
+    with exames.abrir(meta) as f:
+        st.download_button(
+            f"Baixar {rotulo}", f.read(), key=f"exame_{meta['id']}",
+            file_name=meta["nome"], mime=meta["mime"],
+            on_click=st.session_state.pop, args=(pedido, None)
+        )
+
 # ---- Geração de PDF de laudo ----
 def gerar_pdf_laudo(texto: str, nome_pac: str):
+    from reportlab.pdfgen import canvas as pdfcanvas
+    from reportlab.lib.pagesizes import letter
+    from reportlab.lib.utils import ImageReader
     hoje     = datetime.date.today()
     data_str = hoje.strftime("%d-%m-%Y")
     buf      = BytesIO()
@@ -111,23 +241,28 @@ def gerar_pdf_laudo(texto: str, nome_pac: str):
 # ---- Páginas ----
 
 def page_dashboard():
+    import pandas as pd
+    import agendamentos, pacientes, relatorios
     st.title("Dashboard")
     try:
-        tot_p, tot_a, tot_f = relatorios.gerar_relatorio()
+        hoje = datetime.date.today().isoformat()
+        dados = paralelo.em_paralelo(
+            relatorio=relatorios.gerar_relatorio,
+            de_hoje=(agendamentos.obter_agendamentos_entre,
+                     hoje, hoje, "paciente_id, hora_consulta, observacao"),
+            pacientes=pacientes.obter_pacientes_resumo,
+        )
+        tot_p, tot_a, tot_f = dados["relatorio"]
         c1, c2, c3 = st.columns(3)
         c1.metric("Pacientes", tot_p)
         c2.metric("Consultas", tot_a)
         c3.metric("Receita", f"R$ {tot_f:.2f}")
 
         st.subheader("Consultas de hoje")
-        hoje = datetime.date.today().isoformat()
-        todas = agendamentos.obter_agendamentos()
-        de_hoje = [a for a in todas if a.get("data") == hoje]
-        de_hoje.sort(key=lambda x: x.get("hora") or "")
-
-        nomes = {p["id"]: p["nome"] for p in pacientes.obter_pacientes()}
+        de_hoje = dados["de_hoje"]
+        nomes = {p["id"]: p["nome"] for p in dados["pacientes"]}
         registros = [{
-            "Hora":       a.get("hora"),
+            "Hora":       a.get("hora_consulta"),
             "Paciente":   nomes.get(a.get("paciente_id"), ""),
             "Observação": a.get("observacao", "")
         } for a in de_hoje]
@@ -141,19 +276,21 @@ def page_dashboard():
         st.error(f"Erro ao carregar dashboard: {e}")
 
 def page_pacientes():
+    import pandas as pd
+    import busca_pacientes, pacientes
     st.title("Pacientes")
-    lista = pacientes.obter_pacientes()
-    busca = st.text_input("Buscar paciente por nome")
+    busca = st.text_input("Buscar paciente por nome, CPF ou telefone")
     if busca:
-        filtrados = [p for p in lista if busca.lower() in p['nome'].lower()]
+        # as linhas do índice (id, nome, cpf, tel) bastam para a lista
+        filtrados = busca_pacientes.buscar(busca, limite=20)
     else:
-        filtrados = lista
+        filtrados = _paginar(pacientes.obter_pacientes_pagina, "pacientes")
 
     pre = None
     if filtrados:
-        opts = {f"{p['nome']} (ID {p['id']})": p for p in filtrados}
+        opts = {f"{p['nome']} (ID {p['id']})": p['id'] for p in filtrados}
         sel = st.selectbox("Paciente existente", list(opts.keys()))
-        pre = opts.get(sel)
+        pre = pacientes.obter_paciente(opts[sel])
 
     with st.expander("Novo paciente"):
         with st.form("cadpac"):
@@ -188,27 +325,54 @@ def page_pacientes():
             observacao  = st.text_area("Observação", value=pre['observacao'] if pre else "")
             ok          = st.form_submit_button("Salvar")
         if ok:
-            nid = pacientes.adicionar_paciente(
+            envio = pacientes.enfileirar_paciente(
                 nome, data_str, idade,
                 cpf, rg, email, tel, tel2,
                 endereco, numero, complemento, bairro,
                 cep, cidade, estado, plano,
                 historico, observacao
             )
-            if nid:
-                st.success(f"Paciente cadastrado! (ID {nid})")
+            _enfileirado(envio, f"Paciente {nome}")
+
+    with st.expander("Importar pacientes (CSV/Excel)"):
+        arq = st.file_uploader("Planilha de pacientes", type=["csv", "xlsx"], key="imp_pac")
+        st.caption("Uma linha por paciente; colunas como Nome, Data de nascimento, CPF, "
+                   "Telefone, CEP, UF. Colunas desconhecidas são ignoradas.")
+        if arq and st.button("Importar"):
+            import importacao_pacientes
+            progresso = st.empty()
+            try:
+                st.session_state["importacao"] = importacao_pacientes.importar_pacientes(
+                    arq, arq.name,
+                    ao_progredir=lambda lidos, ok: progresso.text(
+                        f"{lidos} linhas lidas, {ok} pacientes importados..."),
+                )
+            except Exception as e:
+                st.error(f"Erro ao importar planilha: {e}")
+            progresso.empty()
+        res = st.session_state.get("importacao")
+        if res:
+            st.success(f"{res['inseridos']} de {res['lidos']} pacientes importados.")
+            rej = res["rejeitados"]
+            if len(rej):
+                import importacao_pacientes
+                st.warning(f"{len(rej)} linhas recusadas.")
+                st.dataframe(rej.head(200))
+                st.download_button("Baixar relatório de rejeições",
+                                   importacao_pacientes.relatorio_csv(rej),
+                                   "pacientes_rejeitados.csv", "text/csv")
 
     try:
-        df = pd.DataFrame(lista)
-        aggrid_table(df)
+        aggrid_table(pd.DataFrame(filtrados))
     except Exception as e:
         st.error(f"Erro ao carregar pacientes: {e}")
 
 def page_agendamentos(admin=True, pid=None):
+    import agendamentos, pacientes
     st.title("Agendamentos")
     try:
         if admin:
-            opts = {f"{p['id']} ‒ {p['nome']}": p['id'] for p in pacientes.obter_pacientes()}
+            opts = {f"{p['id']} ‒ {p['nome']}": p['id'] for p in pacientes.obter_pacientes_resumo()}
             pid  = opts[st.selectbox("Paciente", list(opts.keys()))]
         with st.expander("Novo agendamento"):
             with st.form("formag"):
@@ -218,21 +382,24 @@ def page_agendamentos(admin=True, pid=None):
                 obs    = st.text_input("Observação")
                 ok     = st.form_submit_button("Agendar")
             if ok:
-                agendamentos.adicionar_agendamento(
+                envio = agendamentos.enfileirar_agendamento(
                     pid, data_c.isoformat(), hora_c.strftime("%H:%M"), obs, tipo
                 )
-                st.success("Consulta agendada!")
-        df = pd.DataFrame(
-            agendamentos.obter_agendamentos() if admin
-            else agendamentos.obter_agendamentos_por_paciente(pid)
+                _enfileirado(envio, f"Consulta {data_c.strftime('%d/%m/%Y')} {hora_c.strftime('%H:%M')}")
+        aggrid_table(
+            buscar_pagina=lambda apos: agendamentos.obter_agendamentos_pagina(
+                apos, paciente_id=None if admin else pid
+            ),
+            chave="agendamentos"
         )
-        aggrid_table(df)
     except Exception as e:
         st.error(f"Erro em agendamentos: {e}")
 
 def page_prontuarios(pid=None):
+    import pandas as pd
+    import pacientes, prontuario
     st.title("Prontuário")
-    pacientes_list = pacientes.obter_pacientes()
+    pacientes_list = pacientes.obter_pacientes_resumo()
     opts = {f"{p['nome']} (ID {p['id']})": p['id'] for p in pacientes_list}
     escolha = st.selectbox("Buscar paciente pelo nome", list(opts.keys()))
     pid = opts[escolha]
@@ -243,34 +410,25 @@ def page_prontuarios(pid=None):
                 desc = st.text_area("Descrição")
                 ok   = st.form_submit_button("Salvar")
             if ok:
-                prontuario.adicionar_prontuario(
+                envio = prontuario.enfileirar_prontuario(
                     pid, desc, datetime.date.today().isoformat()
                 )
-                st.success("Registro salvo!")
+                _enfileirado(envio, "Registro de prontuário")
 
         df_pr = pd.DataFrame(prontuario.obter_prontuarios_por_paciente(pid))
         aggrid_table(df_pr)
 
         st.subheader("Exames enviados")
-        arquivos = list(UPLOAD_DIR.glob(f"{pid}_*"))
-        if arquivos:
-            for arq in arquivos:
-                with open(arq, "rb") as f:
-                    dados = f.read()
-                st.download_button(
-                    arq.name, dados,
-                    file_name=arq.name, mime="application/octet-stream"
-                )
-        else:
-            st.info("Nenhum exame anexado.")
+        _galeria_exames(_exames_paginados(pid, "pr_exames"))
     except Exception as e:
         st.error(f"Erro no prontuário: {e}")
 
 def page_financeiro(admin=True, pid=None):
+    import financeiro, pacientes
     st.title("Financeiro")
     try:
         if admin:
-            opts = {f"{p['id']} ‒ {p['nome']}": p['id'] for p in pacientes.obter_pacientes()}
+            opts = {f"{p['id']} ‒ {p['nome']}": p['id'] for p in pacientes.obter_pacientes_resumo()}
             pid  = opts[st.selectbox("Paciente", list(opts.keys()))]
         with st.expander("Nova transação"):
             with st.form("formfin"):
@@ -279,36 +437,40 @@ def page_financeiro(admin=True, pid=None):
                 desc   = st.text_input("Descrição")
                 ok     = st.form_submit_button("Registrar")
             if ok:
-                financeiro.adicionar_transacao(
+                envio = financeiro.enfileirar_transacao(
                     pid, data_m.isoformat(), val, desc
                 )
-                st.success("Transação registrada!")
-        df = pd.DataFrame(
-            financeiro.obter_transacoes() if admin
-            else financeiro.obter_transacoes_por_paciente(pid)
+                _enfileirado(envio, f"Transação R$ {val:.2f}")
+        aggrid_table(
+            buscar_pagina=lambda apos: financeiro.obter_transacoes_pagina(
+                apos, pid=None if admin else pid
+            ),
+            chave="financeiro"
         )
-        aggrid_table(df)
     except Exception as e:
         st.error(f"Erro no financeiro: {e}")
 
 def page_comunicacao():
+    import comunicacao, pacientes
     st.title("Enviar Mensagem")
     try:
-        opts = {f"{p['id']} ‒ {p['nome']}": p['id'] for p in pacientes.obter_pacientes()}
+        opts = {f"{p['id']} ‒ {p['nome']}": p['id'] for p in pacientes.obter_pacientes_resumo()}
         pid  = opts[st.selectbox("Paciente", list(opts.keys()))]
         msg  = st.text_area("Mensagem")
         if st.button("Enviar"):
-            comunicacao.adicionar_comunicacao(
+            envio = comunicacao.enfileirar_comunicacao(
                 pid, msg, datetime.datetime.now().isoformat()
             )
-            st.success("Mensagem enviada!")
+            _enfileirado(envio, "Mensagem")
     except Exception as e:
         st.error(f"Erro ao enviar mensagem: {e}")
 
 def page_laudos():
+    import pacientes
+    from laudo_templates import LAUDOS
     st.title("Laudos")
     try:
-        opts   = {f"{p['id']} ‒ {p['nome']}": p for p in pacientes.obter_pacientes()}
+        opts   = {f"{p['id']} ‒ {p['nome']}": p for p in pacientes.obter_pacientes_resumo()}
         pac    = opts[st.selectbox("Paciente", list(opts.keys()))]
         modelo = st.selectbox("Modelo de Laudo", list(LAUDOS.keys()))
         texto  = LAUDOS[modelo].format(
@@ -325,8 +487,9 @@ def page_laudos():
         st.error(f"Erro na emissão de laudos: {e}")
 
 def page_usuarios():
+    import pacientes, users
     st.title("Gerenciar Usuários")
-    pacientes_list = pacientes.obter_pacientes()
+    pacientes_list = pacientes.obter_pacientes_resumo()
     opts = {f"{p['id']} ‒ {p['nome']}": p for p in pacientes_list}
 
     with st.expander("Criar Novo Usuário"):
@@ -351,81 +514,196 @@ def page_usuarios():
             else:
                 st.error("Falha ao criar usuário.")
 
-    df = pd.DataFrame(users.listar_usuarios())
-    aggrid_table(df)
+    aggrid_table(buscar_pagina=users.listar_usuarios_pagina, chave="usuarios")
+
+def page_relatorios():
+    import pandas as pd
+    import relatorios
+    st.title("Relatórios")
+    try:
+        hoje = datetime.date.today()
+        c1, c2 = st.columns(2)
+        inicio = c1.date_input("De", hoje.replace(day=1))
+        fim    = c2.date_input("Até", hoje)
+        ini_iso, fim_iso = inicio.isoformat(), fim.isoformat()
+
+        dados = paralelo.em_paralelo(
+            relatorio=(relatorios.gerar_relatorio, ini_iso, fim_iso),
+            por_tipo=(relatorios.relatorio_por_tipo_agendamento, ini_iso, fim_iso),
+        )
+        tot_p, tot_a, tot_f = dados["relatorio"]
+        m1, m2, m3 = st.columns(3)
+        m1.metric("Pacientes", tot_p)
+        m2.metric("Consultas no período", tot_a)
+        m3.metric("Receita no período", f"R$ {tot_f:.2f}")
+
+        st.subheader("Consultas por tipo")
+        por_tipo = dados["por_tipo"]
+        if por_tipo:
+            st.bar_chart(pd.Series(por_tipo, name="Consultas"))
+        else:
+            st.info("Nenhuma consulta no período.")
+    except Exception as e:
+        st.error(f"Erro ao gerar relatórios: {e}")
 
 def page_minhas_consultas(pid):
+    import pandas as pd
+    import agendamentos
     st.title("Minhas Consultas")
     try:
         raw = agendamentos.obter_agendamentos_por_paciente(pid)
         df  = pd.DataFrame(raw)
         if not df.empty:
-            cols = []
-            if "data" in df.columns:       cols.append("data")
-            if "hora" in df.columns:       cols.append("hora")
-            if "observacao" in df.columns: cols.append("observacao")
-            df = df[cols]
-            df.columns = ["Data", "Hora", "Observações"]
+            nomes = {"data_consulta": "Data", "hora_consulta": "Hora", "observacao": "Observações"}
+            df = df[[c for c in nomes if c in df.columns]].rename(columns=nomes)
         aggrid_table(df)
     except Exception as e:
         st.error(f"Erro ao carregar consultas: {e}")
 
 def page_exames(pid):
+    import exames
     st.title("Meus Exames")
     try:
-        file = st.file_uploader("Enviar exame (PDF/imagem)", type=["pdf","png","jpg","jpeg"])
+        file = st.file_uploader("Enviar exame (PDF/imagem)", type=["pdf","png","jpg","jpeg"],
+                                key="exame_upload")
         if file and st.button("Enviar Exame"):
-            dest = UPLOAD_DIR / f"{pid}_{file.name}"
-            with dest.open("wb") as f:
-                f.write(file.getbuffer())
-            st.success("Exame enviado!")
+            try:
+                meta = exames.guardar(pid, file, file.name, file.type)
+            except exames.ErroExame as e:
+                st.error(str(e))
+            else:
+                if meta["duplicado"]:
+                    st.info(f"Este arquivo já tinha sido enviado como {meta['nome']}.")
+                else:
+                    st.success("Exame enviado!")
         st.subheader("Arquivos enviados")
-        for arq in UPLOAD_DIR.glob(f"{pid}_*"):
-            st.write(f"- {arq.name}")
+        for meta in _exames_paginados(pid, "meus_exames"):
+            _exame_sob_demanda(meta)
     except Exception as e:
         st.error(f"Erro ao gerenciar exames: {e}")
 
+def page_perfil():
+    import pandas as pd
+    import pacientes
+    st.title("Meu Perfil")
+    try:
+        if "perfil" not in st.session_state:
+            st.session_state["perfil"] = pacientes.obter_paciente_por_login(
+                user_key, paciente_id
+            )
+        df = pd.DataFrame([st.session_state["perfil"]])
+        aggrid_table(df)
+    except Exception as e:
+        st.error(f"Erro ao mostrar perfil: {e}")
+
+def page_busca_exames():
+    import pandas as pd
+    import catalogo_exames, ocr_exames, pacientes, servidor_exames
+    st.title("Busca em Exames")
+    # depois de um reinício, retoma o que ficou sem indexar
+    ocr_exames.varrer_uma_vez()
+    consulta = st.text_input("Buscar no texto dos exames (ex.: EEG, ressonância, risperidona)")
+    if consulta:
+        achados = ocr_exames.buscar(consulta, limite=50)
+        if not achados:
+            st.info("Nenhum exame encontrado.")
+        else:
+            nomes = {p['id']: p['nome'] for p in pacientes.obter_pacientes_resumo()}
+            st.caption(f"{len(achados)} página(s) encontradas")
+            for a in achados:
+                meta = catalogo_exames.por_hash(a['paciente_id'], a['sha256'])
+                url = servidor_exames.link(meta) if meta else None
+                exame = f"[{a['nome']}]({url})" if url else a['nome']
+                trecho = " ".join(a['trecho'].split())
+                st.markdown(f"**{nomes.get(a['paciente_id'], a['paciente_id'])}** · "
+                            f"{exame}, p. {a['pagina']}  \n{trecho}")
+
+    with st.expander("Indexação"):
+        est = ocr_exames.estatisticas()
+        c1, c2, c3, c4 = st.columns(4)
+        c1.metric("Exames indexados", est["indexados"])
+        c2.metric("Na fila", est["na_fila"])
+        c3.metric("Páginas (OCR)", f"{est['paginas']} ({est['paginas_ocr']})")
+        c4.metric("Falhas", est["falhas"])
+        if st.button("Indexar exames pendentes"):
+            st.success(f"{ocr_exames.agendar_pendentes()} exame(s) na fila.")
+        if est["falhas"]:
+            st.dataframe(pd.DataFrame(ocr_exames.falhas()))
+            if st.button("Tentar falhas de novo"):
+                st.success(f"{ocr_exames.reprocessar_falhas()} exame(s) na fila.")
+
+def page_diagnostico():
+    import pandas as pd
+    st.title("Diagnóstico de desempenho")
+    st.subheader("Tempo por página (ms)")
+    resumo = instrumentacao.resumo_por_pagina()
+    if resumo:
+        st.dataframe(pd.DataFrame(resumo))
+    else:
+        st.info("Nenhuma página renderizada ainda neste processo.")
+
+    st.subheader("Chamadas recentes ao banco")
+    recentes = instrumentacao.chamadas_recentes()
+    if recentes:
+        st.dataframe(pd.DataFrame(recentes))
+
+    instrumentacao.MEDIR_BYTES = st.checkbox(
+        "Medir bytes das respostas", value=instrumentacao.MEDIR_BYTES,
+        help="Serializa cada resposta de novo para contar os bytes; deixa as chamadas mais lentas."
+    )
+
+    c1, c2 = st.columns(2)
+    c1.download_button(
+        "Exportar JSON Lines", instrumentacao.exportar_jsonl(),
+        file_name="diagnostico.jsonl", mime="application/x-ndjson"
+    )
+    if c2.button("Limpar medições"):
+        instrumentacao.limpar()
+
 # ---- Roteador principal ----
+from streamlit_option_menu import option_menu
+
 if role == "admin":
     escolha = option_menu(None,
         ["Dashboard","Pacientes","Agendamentos","Prontuários",
-         "Financeiro","Mensagens","Laudos","Usuários","Relatórios"],
+         "Financeiro","Mensagens","Laudos","Usuários","Relatórios","Busca em Exames","Diagnóstico"],
         icons=["bar-chart","people","calendar","file-text","wallet",
-               "chat-dots","file-earmark-pdf","person-check","clipboard-data"],
+               "chat-dots","file-earmark-pdf","person-check","clipboard-data","search","speedometer"],
         orientation="horizontal"
     )
-    if escolha == "Dashboard":
-        page_dashboard()
-    elif escolha == "Pacientes":
-        page_pacientes()
-    elif escolha == "Agendamentos":
-        page_agendamentos(admin=True)
-    elif escolha == "Prontuários":
-        page_prontuarios()
-    elif escolha == "Financeiro":
-        page_financeiro(admin=True)
-    elif escolha == "Mensagens":
-        page_comunicacao()
-    elif escolha == "Laudos":
-        page_laudos()
-    elif escolha == "Usuários":
-        page_usuarios()
-    elif escolha == "Relatórios":
-        page_relatorios()
+    with instrumentacao.renderizacao(escolha):
+        if escolha == "Dashboard":
+            page_dashboard()
+        elif escolha == "Pacientes":
+            page_pacientes()
+        elif escolha == "Agendamentos":
+            page_agendamentos(admin=True)
+        elif escolha == "Prontuários":
+            page_prontuarios()
+        elif escolha == "Financeiro":
+            page_financeiro(admin=True)
+        elif escolha == "Mensagens":
+            page_comunicacao()
+        elif escolha == "Laudos":
+            page_laudos()
+        elif escolha == "Usuários":
+            page_usuarios()
+        elif escolha == "Relatórios":
+            page_relatorios()
+        elif escolha == "Busca em Exames":
+            page_busca_exames()
+        elif escolha == "Diagnóstico":
+            page_diagnostico()
 else:
     escolha = option_menu(None,
         ["Meu Perfil","Meus Exames","Minhas Consultas"],
         icons=["person","file-earmark-arrow-up","calendar"],
         orientation="horizontal"
     )
-    if escolha == "Meu Perfil":
-        st.title("Meu Perfil")
-        try:
-            df = pd.DataFrame([pacientes.obter_paciente_por_login(user_key)])
-            aggrid_table(df)
-        except Exception as e:
-            st.error(f"Erro ao mostrar perfil: {e}")
-    elif escolha == "Meus Exames":
-        page_exames(paciente_id)
-    elif escolha == "Minhas Consultas":
-        page_minhas_consultas(paciente_id)
+    with instrumentacao.renderizacao(escolha):
+        if escolha == "Meu Perfil":
+            page_perfil()
+        elif escolha == "Meus Exames":
+            page_exames(paciente_id)
+        elif escolha == "Minhas Consultas":
+            page_minhas_consultas(paciente_id)
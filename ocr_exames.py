@@ -0,0 +1,274 @@
+# ocr_exames.py – Texto dos exames (camada de texto do PDF ou OCR, página a página,
+# num pool de processos) num índice de busca SQLite FTS5 por paciente e arquivo
+import datetime
+import multiprocessing
+import os
+import re
+import sqlite3
+import threading
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, TimeoutError
+from concurrent.futures.process import BrokenProcessPool
+from pathlib import Path
+from typing import Dict, List, Optional
+
+import exames
+
+ARQUIVO = os.getenv("NEURO_INDICE_EXAMES", str(exames.RAIZ / "indice_exames.db"))
+PROCESSOS = int(os.getenv("NEURO_OCR_PROCESSOS", max(1, (os.cpu_count() or 2) // 2)))
+DPI = int(os.getenv("NEURO_OCR_DPI", 200))
+IDIOMA = os.getenv("NEURO_OCR_IDIOMA", "por")
+MIN_TEXTO = 20   # caracteres; abaixo disso a página do PDF é tratada como imagem
+# s de espera por cada página (ou pela contagem delas); um processo travado
+# (ex.: tesseract num arquivo patológico) não segura o exame para sempre
+TEMPO_MAX = float(os.getenv("NEURO_OCR_TIMEOUT", 300))
+
+ESQUEMA = """
+CREATE VIRTUAL TABLE IF NOT EXISTS textos USING fts5(
+    texto, nome,
+    paciente_id UNINDEXED, sha256 UNINDEXED, pagina UNINDEXED,
+    tokenize = "unicode61 remove_diacritics 2"
+);
+CREATE TABLE IF NOT EXISTS processados (
+    paciente_id   INTEGER NOT NULL,
+    sha256        TEXT NOT NULL,
+    status        TEXT NOT NULL,      -- "indexado" ou "falhou"
+    paginas       INTEGER,
+    paginas_ocr   INTEGER,
+    erro          TEXT,
+    processado_em TEXT NOT NULL,
+    PRIMARY KEY (paciente_id, sha256)
+);
+"""
+
+_local = threading.local()
+_lock = threading.Lock()
+_processos: Optional[ProcessPoolExecutor] = None
+# cada exame ocupa um coordenador (thread) enquanto suas páginas rodam nos processos
+_coordenadores = ThreadPoolExecutor(max_workers=PROCESSOS, thread_name_prefix="ocr")
+_em_andamento = set()
+_varrido = False
+
+
+class ErroOCR(Exception):
+    """Falha num processo do pool, trazida como texto (sempre serializável)."""
+
+
+def _conexao() -> sqlite3.Connection:
+    con = getattr(_local, "con", None)
+    if con is None:
+        Path(ARQUIVO).parent.mkdir(parents=True, exist_ok=True)
+        con = sqlite3.connect(ARQUIVO, timeout=30, isolation_level=None)
+        con.row_factory = sqlite3.Row
+        con.execute("PRAGMA journal_mode=WAL")
+        con.executescript(ESQUEMA)
+        _local.con = con
+    return con
+
+
+def _pool() -> ProcessPoolExecutor:
+    global _processos
+    with _lock:
+        if _processos is None:
+            # spawn: não duplica as threads e conexões do servidor Streamlit no filho
+            _processos = ProcessPoolExecutor(
+                max_workers=PROCESSOS, mp_context=multiprocessing.get_context("spawn")
+            )
+        return _processos
+
+
+def _descartar_pool(pool: ProcessPoolExecutor, encerrar: bool = False):
+    """
+    Um processo morto inutiliza o pool inteiro: o próximo exame cria outro.
+    Com `encerrar`, os processos (um deles travado) são terminados também.
+    """
+    global _processos
+    with _lock:
+        if _processos is pool:
+            _processos = None
+    if encerrar:
+        for processo in list((getattr(pool, "_processes", None) or {}).values()):
+            processo.terminate()
+    pool.shutdown(wait=False, cancel_futures=True)
+
+
+# ---- trabalho nos processos (funções de módulo: precisam ser importáveis) ----
+def _no_processo(funcao, *args):
+    try:
+        return funcao(*args)
+    except Exception as e:
+        # algumas exceções (ex.: TesseractNotFoundError) não voltam pelo pickle
+        # e derrubariam o pool; volta só o tipo e a mensagem
+        raise ErroOCR(f"{type(e).__name__}: {e}") from None
+
+
+def _contar_paginas(caminho: str) -> int:
+    if not caminho.lower().endswith(".pdf"):
+        return 1
+    import pdfplumber
+    with pdfplumber.open(caminho) as pdf:
+        return len(pdf.pages)
+
+
+def _ler_pagina(caminho: str, pagina: int, dpi: int, idioma: str):
+    """(texto, usou_ocr) de uma página: camada de texto do PDF se houver; senão OCR."""
+    if caminho.lower().endswith(".pdf"):
+        import pdfplumber
+        with pdfplumber.open(caminho, pages=[pagina]) as pdf:
+            texto = pdf.pages[0].extract_text() or ""
+        if len(texto.strip()) >= MIN_TEXTO:
+            return texto, False
+        from pdf2image import convert_from_path
+        img = convert_from_path(caminho, dpi=dpi, first_page=pagina, last_page=pagina)[0]
+    else:
+        from PIL import Image
+        img = Image.open(caminho)
+    import pytesseract
+    return pytesseract.image_to_string(img, lang=idioma), True
+
+
+# ---- coordenação (no processo do servidor) ----
+def _indexar(meta: Dict) -> bool:
+    """Indexa um exame; True se o pool quebrou por outro exame e vale tentar de novo."""
+    pid, sha = int(meta["paciente_id"]), meta["sha256"]
+    caminho = str(exames.RAIZ / meta["arquivo"])
+    pool = _pool()
+    try:
+        n = pool.submit(_no_processo, _contar_paginas, caminho).result(timeout=TEMPO_MAX)
+        futuros = [pool.submit(_no_processo, _ler_pagina, caminho, p, DPI, IDIOMA)
+                   for p in range(1, n + 1)]
+        paginas = [f.result(timeout=TEMPO_MAX) for f in futuros]
+    except Exception as e:
+        if isinstance(e, TimeoutError):
+            _descartar_pool(pool, encerrar=True)
+            erro = f"Tempo esgotado: página sem resposta em {TEMPO_MAX:g} s"
+        else:
+            if isinstance(e, BrokenProcessPool):
+                _descartar_pool(pool)
+                if not meta.get("repeticao"):
+                    # pode ter sido outro exame (ou um tempo esgotado) que derrubou o pool
+                    return True
+            erro = str(e) if isinstance(e, ErroOCR) else f"{type(e).__name__}: {e}"
+        _conexao().execute(
+            "INSERT OR REPLACE INTO processados (paciente_id, sha256, status, erro, processado_em) "
+            "VALUES (?, ?, 'falhou', ?, ?)",
+            (pid, sha, erro, datetime.datetime.now().isoformat(timespec="seconds")),
+        )
+        return False
+    con = _conexao()
+    with con:
+        con.execute("DELETE FROM textos WHERE paciente_id = ? AND sha256 = ?", (pid, sha))
+        con.executemany(
+            "INSERT INTO textos (texto, nome, paciente_id, sha256, pagina) VALUES (?, ?, ?, ?, ?)",
+            [(texto, meta["nome"], pid, sha, i) for i, (texto, _) in enumerate(paginas, start=1)],
+        )
+        con.execute(
+            "INSERT OR REPLACE INTO processados "
+            "(paciente_id, sha256, status, paginas, paginas_ocr, processado_em) "
+            "VALUES (?, ?, 'indexado', ?, ?, ?)",
+            (pid, sha, len(paginas), sum(ocr for _, ocr in paginas),
+             datetime.datetime.now().isoformat(timespec="seconds")),
+        )
+    return False
+
+
+def _tarefa(meta: Dict):
+    repetir = False
+    try:
+        repetir = _indexar(meta)
+    finally:
+        with _lock:
+            _em_andamento.discard((int(meta["paciente_id"]), meta["sha256"]))
+    if repetir:
+        agendar({**meta, "repeticao": True})
+
+
+def agendar(meta: Dict) -> bool:
+    """Põe o exame na fila de indexação se ainda não foi processado; True se agendou."""
+    sha = meta.get("sha256")
+    if not sha:
+        return False
+    chave = (int(meta["paciente_id"]), sha)
+    if _conexao().execute(
+        "SELECT 1 FROM processados WHERE paciente_id = ? AND sha256 = ?", chave
+    ).fetchone():
+        return False
+    with _lock:
+        if chave in _em_andamento:
+            return False
+        _em_andamento.add(chave)
+    _coordenadores.submit(_tarefa, dict(meta))
+    return True
+
+
+def agendar_pendentes() -> int:
+    """Agenda todo exame do catálogo que ainda não passou pelo índice."""
+    import catalogo_exames
+    return sum(agendar(m) for m in catalogo_exames.todos())
+
+
+def varrer_uma_vez() -> int:
+    """agendar_pendentes() na primeira chamada do processo (recupera a fila após reinício)."""
+    global _varrido
+    with _lock:
+        if _varrido:
+            return 0
+        _varrido = True
+    return agendar_pendentes()
+
+
+def reprocessar_falhas() -> int:
+    """Esquece as falhas (ex.: depois de instalar o tesseract) e as agenda de novo."""
+    _conexao().execute("DELETE FROM processados WHERE status = 'falhou'")
+    return agendar_pendentes()
+
+
+def remover(pid: int, sha256: str):
+    con = _conexao()
+    with con:
+        con.execute("DELETE FROM textos WHERE paciente_id = ? AND sha256 = ?", (int(pid), sha256))
+        con.execute("DELETE FROM processados WHERE paciente_id = ? AND sha256 = ?", (int(pid), sha256))
+
+
+def _consulta_fts(consulta: str) -> str:
+    """Texto livre -> consulta FTS5: cada palavra como prefixo, todas obrigatórias."""
+    palavras = re.findall(r"\w+", consulta)
+    return " ".join(f'"{p}"*' for p in palavras)
+
+
+def buscar(consulta: str, limite: int = 50, pid: Optional[int] = None) -> List[Dict]:
+    """
+    Páginas de exames que contêm todas as palavras (sem acentos nem caixa),
+    das mais relevantes para as menos: paciente_id, sha256, nome, pagina, trecho.
+    """
+    fts = _consulta_fts(consulta)
+    if not fts:
+        return []
+    sql = ("SELECT paciente_id, sha256, nome, pagina, "
+           "snippet(textos, 0, '**', '**', ' … ', 12) AS trecho "
+           "FROM textos WHERE textos MATCH ?")
+    params: list = [fts]
+    if pid is not None:
+        sql += " AND paciente_id = ?"
+        params.append(int(pid))
+    sql += " ORDER BY rank LIMIT ?"
+    params.append(limite)
+    return [dict(l) for l in _conexao().execute(sql, params)]
+
+
+def estatisticas() -> Dict:
+    con = _conexao()
+    por_status = dict(con.execute("SELECT status, COUNT(*) FROM processados GROUP BY status").fetchall())
+    paginas, paginas_ocr = con.execute(
+        "SELECT COALESCE(SUM(paginas), 0), COALESCE(SUM(paginas_ocr), 0) FROM processados"
+    ).fetchone()
+    with _lock:
+        na_fila = len(_em_andamento)
+    return {"indexados": por_status.get("indexado", 0), "falhas": por_status.get("falhou", 0),
+            "na_fila": na_fila, "paginas": paginas, "paginas_ocr": paginas_ocr, "arquivo": ARQUIVO}
+
+
+def falhas(limite: int = 20) -> List[Dict]:
+    return [dict(l) for l in _conexao().execute(
+        "SELECT paciente_id, sha256, erro, processado_em FROM processados "
+        "WHERE status = 'falhou' ORDER BY processado_em DESC LIMIT ?", (limite,)
+    )]
@@ -1,13 +1,27 @@
 # pacientes.py – Módulo de gerenciamento de pacientes
 import datetime
-from typing import List, Dict
-from database import supabase
-
-def obter_pacientes() -> List[Dict]:
-    resp = supabase.table("pacientes").select("*").execute()
-    data = resp.data or []
-    pacientes = []
-    for p in data:
+from typing import List, Dict, Optional, Tuple
+import busca_pacientes
+import cache
+import fila_escrita
+from database import tabela, paginar_keyset
+
+TBL = "pacientes"
+
+COLUNAS_RESUMO = "id, nome"
+COLUNAS_LISTA = "id, nome, data_nasc, idade, cpf, tel, email, cidade, estado, plano"
+COLUNAS_TEXTO = [
+    "nome", "cpf", "rg", "email", "tel", "tel2", "endereco", "numero", "complemento",
+    "bairro", "cep", "cidade", "estado", "plano", "historico", "observacao",
+]
+COLUNAS_LOTE = COLUNAS_TEXTO + ["data_nasc", "idade"]
+
+# pacientes gravados pela fila entram no índice de busca, como no insert direto
+fila_escrita.ao_enviar(TBL, busca_pacientes.registrar)
+
+def _formatar(p: Dict) -> Dict:
+    """Converte data_nasc ISO para DD/MM/AAAA e textos nulos para ''."""
+    if "data_nasc" in p:
         raw = p.get("data_nasc")  # adapte o nome do campo no seu esquema
         data_fmt = ""
         if raw:
@@ -16,18 +30,42 @@ def obter_pacientes() -> List[Dict]:
                 data_fmt = dt.strftime("%d/%m/%Y")
             except:
                 pass
-        pacientes.append({
-            "id": p.get("id"),
-            "nome": p.get("nome", ""),
-            "cpf": p.get("cpf", ""),
-            # … demais campos …
-            "observacao": p.get("observacao", ""),
-            "data_nasc": data_fmt,
-            "idade": p.get("idade", None)
-        })
-    return pacientes
+        p["data_nasc"] = data_fmt
+    for k, v in p.items():
+        if v is None and k not in ("id", "idade"):
+            p[k] = ""
+    return p
 
-def adicionar_paciente(
+@cache.em_cache(TBL)
+def obter_pacientes(colunas: str = "*") -> List[Dict]:
+    """
+    Retorna os pacientes com as colunas pedidas (ex.: "id, nome, cpf").
+    Sem projeção, traz todas as colunas, inclusive historico/observacao.
+    """
+    resp = tabela(TBL).select(colunas).order("nome").execute()
+    return [_formatar(p) for p in resp.data or []]
+
+@cache.em_cache(TBL)
+def obter_pacientes_resumo() -> List[Dict]:
+    """Apenas id e nome, ordenados por nome — para seletores de paciente."""
+    resp = tabela(TBL).select(COLUNAS_RESUMO).order("nome").execute()
+    return resp.data or []
+
+@cache.em_cache(TBL)
+def obter_pacientes_pagina(
+    apos: Optional[Tuple] = None, limite: int = 100
+) -> Tuple[List[Dict], Optional[Tuple]]:
+    """Uma página da listagem por nome (keyset), só com as colunas de COLUNAS_LISTA."""
+    linhas, prox = paginar_keyset(tabela(TBL).select(COLUNAS_LISTA), ("nome", "id"), apos, limite)
+    return [_formatar(p) for p in linhas], prox
+
+@cache.em_cache(TBL)
+def obter_paciente(pid: int) -> Dict:
+    """Todas as colunas de um paciente (ex.: para preencher o formulário)."""
+    resp = tabela(TBL).select("*").eq("id", pid).limit(1).execute()
+    return _formatar((resp.data or [{}])[0])
+
+def _registro(
     nome: str,
     data_nasc: str,
     idade: int,
@@ -46,7 +84,7 @@ def adicionar_paciente(
     plano: str,
     historico: str,
     observacao: str
-) -> int:
+) -> Dict:
     # converte data de entrada (DD/MM/AAAA ou YYYY-MM-DD) para ISO
     iso_date = None
     if data_nasc:
@@ -75,15 +113,42 @@ def adicionar_paciente(
         "estado": estado,
         "plano": plano,
         "historico": historico,
-        "observacao": observacao
+        "observacao": observacao,
+        "criado_em": datetime.datetime.utcnow().isoformat()
     }
     if iso_date:
         registro["data_nasc"] = iso_date
     if isinstance(idade, int):
         registro["idade"] = idade
+    return registro
+
+def adicionar_paciente(
+    nome: str,
+    data_nasc: str,
+    idade: int,
+    cpf: str,
+    rg: str,
+    email: str,
+    tel: str,
+    tel2: str,
+    endereco: str,
+    numero: str,
+    complemento: str,
+    bairro: str,
+    cep: str,
+    cidade: str,
+    estado: str,
+    plano: str,
+    historico: str,
+    observacao: str
+) -> int:
+    registro = _registro(
+        nome, data_nasc, idade, cpf, rg, email, tel, tel2, endereco,
+        numero, complemento, bairro, cep, cidade, estado, plano, historico, observacao
+    )
 
     try:
-        resp = supabase.table("pacientes").insert(registro).execute()
+        resp = tabela(TBL).insert(registro).execute()
     except Exception as e:
         import streamlit as st
         st.error(f"Erro ao inserir paciente: {e}")
@@ -91,42 +156,75 @@ def adicionar_paciente(
 
     # supabase-py pode não expor status_code; basta verificar se houve 'data'
     if getattr(resp, "data", None):
+        cache.invalidar(TBL)
+        busca_pacientes.registrar(resp.data[0])
         return resp.data[0].get("id")
     return None
 
-def obter_paciente_por_login(login: str) -> Dict:
-    resp_u = (
-        supabase.table("usuarios")
-               .select("paciente_id")
-               .eq("login", login)
-               .single()
-               .execute()
+def validar_lote(df) -> Tuple:
+    """
+    Confere nome e data_nasc de um DataFrame com as colunas de COLUNAS_LOTE.
+    Retorna (df com textos limpos, data ISO e idade, erros por linha).
+    """
+    import validacao
+    textos = {c: validacao.texto(df[c]) for c in COLUNAS_TEXTO}
+    informada = validacao.texto(df["data_nasc"]) != ""
+    datas = validacao.datas_iso(df["data_nasc"])
+    erros = validacao.sem_erros(len(df))
+    erros = validacao.marcar(erros, textos["nome"] == "", "nome vazio")
+    erros = validacao.marcar(erros, informada & datas.isna(), "data_nasc inválida")
+    df = df.assign(
+        **textos, data_nasc=datas,
+        idade=validacao.inteiros(df["idade"]).fillna(validacao.idades(datas)),
     )
-    pid = resp_u.data.get("paciente_id") if resp_u.data else None
-    if not pid:
-        return {}
-    resp_p = (
-        supabase.table("pacientes")
-               .select("*")
-               .eq("id", pid)
+    return df, erros
+
+def adicionar_pacientes_em_lote(registros: List[Dict]) -> List[Dict]:
+    """
+    Insere vários pacientes (dicts com as chaves de COLUNAS_LOTE; data_nasc em
+    DD/MM/AAAA ou AAAA-MM-DD, idade calculada quando ausente) em poucas
+    requisições, validando tudo de uma vez.
+    Retorna, na ordem de entrada, {"id", "erro", "linha"} por registro.
+    """
+    import validacao
+    df, erros = validar_lote(validacao.quadro(registros, COLUNAS_LOTE))
+    df = df.assign(criado_em=datetime.datetime.utcnow().isoformat())
+    resultados = validacao.inserir_validos(TBL, df, erros)
+    gravados = [r["linha"] for r in resultados if r["linha"]]
+    if gravados:
+        cache.invalidar(TBL)
+        for linha in gravados:
+            busca_pacientes.registrar(linha)
+    return resultados
+
+def enfileirar_paciente(*args, **kwargs) -> int:
+    """
+    Mesmos argumentos de adicionar_paciente, mas grava pela fila de escrita:
+    retorna na hora o número do envio (fila_escrita.status) em vez do ID.
+    """
+    return fila_escrita.enfileirar(TBL, _registro(*args, **kwargs))
+
+def obter_paciente_por_login(login: str, pid: Optional[int] = None) -> Dict:
+    """
+    Perfil do paciente vinculado ao login, em uma única requisição:
+    por id quando `pid` (de st.session_state["auth"]) é conhecido; senão,
+    embutindo `pacientes` na consulta de `usuarios`.
+    """
+    if pid:
+        resp = (
+            tabela(TBL)
+                   .select("*")
+                   .eq("id", pid)
+                   .single()
+                   .execute()
+        )
+        return _formatar(resp.data or {})
+    resp = (
+        tabela("usuarios")
+               .select("paciente_id, pacientes(*)")
+               .eq("login", login)
                .single()
                .execute()
     )
-    p = resp_p.data or {}
-    raw = p.get("data_nasc")
-    data_fmt = ""
-    if raw:
-        try:
-            dt = datetime.date.fromisoformat(raw)
-            data_fmt = dt.strftime("%d/%m/%Y")
-        except:
-            pass
-    return {
-        "id": p.get("id"),
-        "nome": p.get("nome", ""),
-        "cpf": p.get("cpf", ""),
-        # … demais campos …
-        "observacao": p.get("observacao", ""),
-        "data_nasc": data_fmt,
-        "idade": p.get("idade", None)
-    }
+    u = resp.data or {}
+    return _formatar(u.get("pacientes") or {})
@@ -0,0 +1,84 @@
+# paralelo.py – Execução concorrente de consultas independentes
+import contextvars
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, Tuple, Union
+
+import streamlit as st
+from streamlit.runtime.scriptrunner import add_script_run_ctx, get_script_run_ctx
+
+MAX_THREADS = int(os.getenv("NEURO_PARALELO_MAX", 8))
+
+# Pools compartilhados pelo processo (as consultas são I/O e liberam o GIL).
+# O segundo atende chamadas feitas de dentro de um worker do primeiro, para que
+# um worker nunca espere por uma vaga no próprio pool.
+_pools = [
+    ThreadPoolExecutor(max_workers=MAX_THREADS, thread_name_prefix="consulta"),
+    ThreadPoolExecutor(max_workers=MAX_THREADS, thread_name_prefix="consulta-aninhada"),
+]
+_local = threading.local()
+
+Consulta = Union[Callable[[], Any], Tuple]
+
+
+def nova_rodada():
+    """Chamada no início de cada rerun: zera a memória de consultas deduplicadas."""
+    st.session_state["_consultas_rodada"] = {}
+
+
+def _normalizar(consulta: Consulta) -> Tuple[Callable, tuple]:
+    if callable(consulta):
+        return consulta, ()
+    return consulta[0], tuple(consulta[1:])
+
+
+def _executar(ctx, nivel: int, func: Callable, args: tuple):
+    thread = threading.current_thread()
+    if ctx is not None:
+        add_script_run_ctx(thread, ctx)
+    _local.nivel = nivel
+    try:
+        return func(*args)
+    finally:
+        _local.nivel = 0
+        if ctx is not None:
+            add_script_run_ctx(thread, None)
+
+
+def em_paralelo(**consultas: Consulta) -> Dict[str, Any]:
+    """
+    Executa consultas independentes ao mesmo tempo e devolve {nome: resultado}.
+    Cada consulta é uma função sem argumentos ou uma tupla (função, *args).
+    Consultas idênticas (mesma função e argumentos) rodam uma única vez por rerun.
+    Exceções são repassadas a quem chamou, como numa chamada comum.
+    """
+    nivel = getattr(_local, "nivel", 0)
+    # Além do último nível de pool, roda em sequência
+    if nivel >= len(_pools):
+        resultados = {}
+        for nome, consulta in consultas.items():
+            func, args = _normalizar(consulta)
+            resultados[nome] = func(*args)
+        return resultados
+
+    ctx = get_script_run_ctx(suppress_warning=True)
+    # fora do `streamlit run` (scripts, benchmarks) não há sessão: deduplica só nesta chamada
+    memo = st.session_state.setdefault("_consultas_rodada", {}) \
+        if nivel == 0 and ctx is not None else {}
+    futuros = {}
+    chaves = {}
+    for nome, consulta in consultas.items():
+        func, args = _normalizar(consulta)
+        chave = (func, args)
+        chaves[nome] = chave
+        if chave in memo or chave in futuros:
+            continue
+        contexto = contextvars.copy_context()
+        futuros[chave] = _pools[nivel].submit(
+            contexto.run, _executar, ctx, nivel + 1, func, args
+        )
+
+    for chave, futuro in futuros.items():
+        memo[chave] = futuro.result()
+    return {nome: memo[chave] for nome, chave in chaves.items()}
@@ -1,42 +1,112 @@
-# relatorios.py — Funções de relatório sem usar RPC no banco
-import os
-import streamlit as st
-from typing import Dict
-import pacientes
-import agendamentos
-import financeiro
-
-# Conexão Supabase (mantém para outras funções, se precisar)
-from supabase import create_client, Client
-SUPABASE_URL = os.getenv("SUPABASE_URL") or st.secrets.get("SUPABASE_URL")
-SUPABASE_KEY = os.getenv("SUPABASE_KEY") or st.secrets.get("SUPABASE_KEY")
-supabase: Client = create_client(SUPABASE_URL, SUPABASE_KEY)
-
-def gerar_relatorio() -> (int, int, float):
+# relatorios.py — Relatórios com agregação no banco (contagens, somas e views)
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+import cache
+import paralelo
+from database import tabela, paginar_keyset
+
+# Views criadas por sql/relatorios.sql; sem elas, cai para agregação em pandas
+VIEW_RECEITA = "relatorio_receita_diaria"
+VIEW_TIPOS = "relatorio_consultas_por_tipo"
+
+# Códigos de "relação inexistente": Postgres (42P01) e cache de esquema do PostgREST (PGRST205)
+RELACAO_AUSENTE = {"42P01", "PGRST205"}
+
+# O PostgREST corta cada resposta em max-rows (1000 por padrão): as leituras
+# vão em páginas deste tamanho, senão os totais param de contar em silêncio
+LOTE_LEITURA = 1000
+
+_views_ausentes = set()
+
+def _filtrar_periodo(q, coluna: str, inicio: Optional[str], fim: Optional[str]):
+    if inicio:
+        q = q.gte(coluna, inicio)
+    if fim:
+        q = q.lte(coluna, fim)
+    return q
+
+def _contar(tbl: str, coluna_data: Optional[str] = None,
+            inicio: Optional[str] = None, fim: Optional[str] = None) -> int:
+    """Conta linhas no banco (count=exact, sem trazer as linhas)."""
+    q = tabela(tbl).select("id", count="exact", head=True)
+    if coluna_data:
+        q = _filtrar_periodo(q, coluna_data, inicio, fim)
+    return q.execute().count or 0
+
+def _ler_tudo(consulta: Callable, ordem: Sequence[str]) -> List[Dict]:
+    """Todas as linhas de `consulta()` (um builder novo por página), em páginas por keyset."""
+    linhas, apos = [], None
+    while True:
+        pagina, apos = paginar_keyset(consulta(), ordem, apos, LOTE_LEITURA)
+        linhas.extend(pagina)
+        if apos is None:
+            return linhas
+
+def _ler_periodo(tbl: str, colunas: str, coluna_data: str, ordem: Sequence[str],
+                 inicio: Optional[str], fim: Optional[str]) -> List[Dict]:
+    return _ler_tudo(
+        lambda: _filtrar_periodo(tabela(tbl).select(colunas), coluna_data, inicio, fim), ordem
+    )
+
+def _ler_view(view: str, colunas: str, coluna_data: str, ordem: Sequence[str],
+              inicio: Optional[str], fim: Optional[str]):
     """
-    Retorna (total_pacientes, total_consultas, total_receita).
-    Faz contagens e somas em memória para evitar RPCs ausentes.
+    Lê (todas as páginas de) uma view de agregação; devolve None se ela não
+    existir no banco. Só a ausência da view é lembrada; outros erros
+    (rede, timeout) sobem.
     """
-    # Total de pacientes
-    pacs = pacientes.obter_pacientes()
-    tot_p = len(pacs)
+    if view in _views_ausentes:
+        return None
+    try:
+        return _ler_periodo(view, colunas, coluna_data, ordem, inicio, fim)
+    except Exception as e:
+        if getattr(e, "code", None) not in RELACAO_AUSENTE:
+            raise
+        _views_ausentes.add(view)
+        return None
 
-    # Total de consultas
-    ags = agendamentos.obter_agendamentos()
-    tot_a = len(ags)
+def _somar_receita(inicio: Optional[str], fim: Optional[str]) -> float:
+    # uma linha por dia; total entra na ordem só para que o dia nulo (data_mov
+    # anulável) não fique de fora do cursor
+    linhas = _ler_view(VIEW_RECEITA, "data_mov, total", "data_mov", ("data_mov", "total"),
+                       inicio, fim)
+    if linhas is not None:
+        return float(sum(l.get("total") or 0 for l in linhas))
 
-    # Soma de valores financeiros
-    txs = financeiro.obter_transacoes()
-    tot_f = sum(t.get("valor", 0) for t in txs)
+    import pandas as pd
+    linhas = _ler_periodo("transacoes", "id, valor", "data_mov", ("id",), inicio, fim)
+    df = pd.DataFrame(linhas, columns=["valor"])
+    return float(pd.to_numeric(df["valor"], errors="coerce").sum())
 
-    return tot_p, tot_a, tot_f
+@cache.em_cache("pacientes", "agendamentos", "transacoes")
+def gerar_relatorio(inicio: Optional[str] = None, fim: Optional[str] = None) -> Tuple[int, int, float]:
+    """
+    Retorna (total_pacientes, total_consultas, total_receita).
+    Consultas e receita podem ser limitadas a uma janela [inicio, fim] (YYYY-MM-DD).
+    Contagens e somas são feitas no banco; o resultado fica em cache por janela.
+    """
+    r = paralelo.em_paralelo(
+        pacientes=(_contar, "pacientes"),
+        consultas=(_contar, "agendamentos", "data_consulta", inicio, fim),
+        receita=(_somar_receita, inicio, fim),
+    )
+    return r["pacientes"], r["consultas"], r["receita"]
 
-def relatorio_por_tipo_agendamento() -> Dict[str, int]:
+@cache.em_cache("agendamentos")
+def relatorio_por_tipo_agendamento(inicio: Optional[str] = None,
+                                   fim: Optional[str] = None) -> Dict[str, int]:
     """
     Retorna um dicionário {tipo_consulta: contador}.
     """
-    counts: Dict[str,int] = {}
-    for ag in agendamentos.obter_agendamentos():
-        tipo = ag.get("tipo_consulta", "Desconhecido")
-        counts[tipo] = counts.get(tipo, 0) + 1
-    return counts
+    import pandas as pd
+    # uma linha por dia e tipo (tipo nunca é nulo na view)
+    linhas = _ler_view(VIEW_TIPOS, "data_consulta, tipo_consulta, total", "data_consulta",
+                       ("data_consulta", "tipo_consulta"), inicio, fim)
+    if linhas is not None:
+        df = pd.DataFrame(linhas, columns=["tipo_consulta", "total"])
+    else:
+        linhas = _ler_periodo("agendamentos", "id, tipo_consulta", "data_consulta", ("id",),
+                              inicio, fim)
+        df = pd.DataFrame(linhas, columns=["tipo_consulta"])
+        df["total"] = 1
+    df["tipo_consulta"] = df["tipo_consulta"].fillna("Desconhecido")
+    return {k: int(v) for k, v in df.groupby("tipo_consulta")["total"].sum().items()}
@@ -0,0 +1,246 @@
+# servidor_exames.py – Entrega dos exames sob demanda: links assinados servidos por
+# um pequeno servidor HTTP em segundo plano, com Range e ETag
+import base64
+import hashlib
+import hmac
+import json
+import math
+import os
+import re
+import threading
+import time
+import urllib.request
+from http import HTTPStatus
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from typing import Dict, Optional
+from urllib.parse import quote
+
+import exames
+
+PORTA = int(os.getenv("NEURO_EXAMES_PORTA", 8502))  # 0 desliga: download só ao clicar
+HOST = os.getenv("NEURO_EXAMES_HOST", "127.0.0.1")
+# Endereço que o navegador usa para chegar a HOST:PORTA (ex.: http://localhost:8502,
+# ou https://clinica.exemplo/exames atrás de um proxy). Sem ele o servidor não
+# sobe: um link para localhost não abriria no navegador de quem acessa de fora.
+URL_PUBLICA = os.getenv("NEURO_EXAMES_URL", "").rstrip("/")
+VALIDADE = int(os.getenv("NEURO_EXAMES_VALIDADE", 900))  # s de validade de cada link
+BLOCO = 256 * 1024
+FAIXA = re.compile(r"^bytes=(\d*)-(\d*)$")
+
+_lock = threading.Lock()
+_servidor: Optional[ThreadingHTTPServer] = None
+_disponivel: Optional[bool] = None
+_chave: Optional[bytes] = None
+MIN_CHAVE = 32  # bytes
+
+
+def _nova_chave(arq: Path, substituir: bool):
+    """
+    Grava 32 bytes aleatórios num temporário e só então o põe no lugar: quem
+    lê o arquivo nunca o vê vazio ou pela metade. Sem `substituir`, o link
+    falha (FileExistsError) se outro processo criou a chave primeiro.
+    """
+    tmp = arq.with_name(f"{arq.name}.{os.getpid()}.{threading.get_ident()}.tmp")
+    fd = os.open(tmp, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(os.urandom(MIN_CHAVE))
+            f.flush()
+            os.fsync(f.fileno())
+        if substituir:
+            os.replace(tmp, arq)
+        else:
+            os.link(tmp, arq)
+    finally:
+        tmp.unlink(missing_ok=True)
+
+
+def _segredo() -> bytes:
+    """
+    Chave dos links: NEURO_EXAMES_SEGREDO ou um arquivo gerado uma vez ao lado
+    dos exames, para que todos os processos do host assinem com a mesma chave.
+    """
+    global _chave
+    if _chave is None:
+        env = os.getenv("NEURO_EXAMES_SEGREDO")
+        if env:
+            chave = env.encode("utf-8")
+            if len(chave) < MIN_CHAVE:
+                raise RuntimeError(f"NEURO_EXAMES_SEGREDO precisa de ao menos {MIN_CHAVE} bytes.")
+        else:
+            arq = exames.RAIZ / ".segredo_links"
+            exames.RAIZ.mkdir(parents=True, exist_ok=True)
+            try:
+                _nova_chave(arq, substituir=False)
+            except FileExistsError:
+                pass
+            chave = arq.read_bytes()
+            if len(chave) < MIN_CHAVE:
+                # arquivo truncado (ex.: versão antiga gravada pela metade): troca a chave
+                _nova_chave(arq, substituir=True)
+                chave = arq.read_bytes()
+        _chave = chave
+    return _chave
+
+
+def _b64(dados: bytes) -> str:
+    return base64.urlsafe_b64encode(dados).rstrip(b"=").decode("ascii")
+
+
+def _de_b64(texto: str) -> bytes:
+    return base64.urlsafe_b64decode(texto + "=" * (-len(texto) % 4))
+
+
+def assinar(meta: Dict, validade: int = VALIDADE) -> str:
+    """
+    Token para um exame (linha do catálogo ou metadados de exames.guardar).
+    A expiração é arredondada para janelas de validade/2: dentro da mesma
+    janela o link não muda entre reruns e o navegador reaproveita o cache.
+    """
+    janela = max(validade // 2, 1)
+    expira = (math.ceil(time.time() / janela) + 1) * janela
+    carga = _b64(json.dumps(
+        {"a": meta["arquivo"], "n": meta["nome"], "m": meta.get("mime"),
+         "h": meta.get("sha256"), "e": expira},
+        separators=(",", ":"), ensure_ascii=False,
+    ).encode("utf-8"))
+    assinatura = _b64(hmac.new(_segredo(), carga.encode("ascii"), hashlib.sha256).digest())
+    return f"{carga}.{assinatura}"
+
+
+def verificar(token: str) -> Optional[Dict]:
+    """Conteúdo do token se a assinatura confere e não expirou; senão None."""
+    carga, _, assinatura = token.partition(".")
+    try:
+        # token com caracteres fora do ASCII nunca foi emitido aqui
+        esperada = _b64(hmac.new(_segredo(), carga.encode("ascii"), hashlib.sha256).digest())
+        if not hmac.compare_digest(assinatura.encode("ascii"), esperada.encode("ascii")):
+            return None
+        dados = json.loads(_de_b64(carga))
+        return dados if dados.get("e", 0) > time.time() else None
+    except (ValueError, TypeError, AttributeError):
+        return None
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    server_version = "neuro-exames"
+
+    def log_message(self, formato, *args):
+        pass
+
+    def _vazio(self, status: int, cabecalhos: Optional[Dict] = None):
+        self.send_response(status)
+        for k, v in (cabecalhos or {}).items():
+            self.send_header(k, v)
+        self.send_header("Content-Length", "0")
+        self.end_headers()
+
+    def do_HEAD(self):
+        self.do_GET(corpo=False)
+
+    def do_GET(self, corpo: bool = True):
+        partes = self.path.split("?", 1)[0].strip("/").split("/")
+        if partes == ["saude"]:
+            return self._vazio(HTTPStatus.NO_CONTENT)
+        if len(partes) < 2 or partes[0] != "exame":
+            return self._vazio(HTTPStatus.NOT_FOUND)
+        dados = verificar(partes[1])
+        if dados is None:
+            return self._vazio(HTTPStatus.FORBIDDEN)
+
+        raiz = exames.RAIZ.resolve()
+        caminho = (raiz / dados["a"]).resolve()
+        if raiz not in caminho.parents or not caminho.is_file():
+            return self._vazio(HTTPStatus.NOT_FOUND)
+        info = caminho.stat()
+        tamanho = info.st_size
+        etag = f'"{dados["h"]}"' if dados.get("h") else f'"{tamanho:x}-{int(info.st_mtime):x}"'
+        comuns = {
+            "ETag": etag,
+            "Accept-Ranges": "bytes",
+            # conteúdo endereçado por hash não muda; o link expira antes
+            "Cache-Control": f"private, max-age={max(int(dados['e'] - time.time()), 0)}",
+        }
+
+        pedidas = [t.strip() for t in self.headers.get("If-None-Match", "").split(",") if t.strip()]
+        if etag in pedidas or "*" in pedidas:
+            return self._vazio(HTTPStatus.NOT_MODIFIED, comuns)
+
+        inicio, fim, status = 0, tamanho - 1, HTTPStatus.OK
+        faixa = self.headers.get("Range")
+        if faixa and self.headers.get("If-Range", etag) == etag:
+            m = FAIXA.match(faixa.strip())
+            if m and (m.group(1) or m.group(2)):
+                if m.group(1):
+                    inicio = int(m.group(1))
+                    fim = min(int(m.group(2)), tamanho - 1) if m.group(2) else tamanho - 1
+                else:  # bytes=-N: os N últimos
+                    inicio = max(tamanho - int(m.group(2)), 0)
+                if inicio > fim or inicio >= tamanho:
+                    return self._vazio(HTTPStatus.REQUESTED_RANGE_NOT_SATISFIABLE,
+                                       {"Content-Range": f"bytes */{tamanho}"})
+                status = HTTPStatus.PARTIAL_CONTENT
+                comuns["Content-Range"] = f"bytes {inicio}-{fim}/{tamanho}"
+
+        self.send_response(status)
+        for k, v in comuns.items():
+            self.send_header(k, v)
+        self.send_header("Content-Type", dados.get("m") or "application/octet-stream")
+        self.send_header("Content-Disposition", f"inline; filename*=UTF-8''{quote(dados['n'])}")
+        self.send_header("Content-Length", str(fim - inicio + 1))
+        self.end_headers()
+        if not corpo:
+            return
+        with caminho.open("rb") as f:
+            f.seek(inicio)
+            restante = fim - inicio + 1
+            try:
+                while restante > 0:
+                    bloco = f.read(min(BLOCO, restante))
+                    if not bloco:
+                        break
+                    self.wfile.write(bloco)
+                    restante -= len(bloco)
+            except (BrokenPipeError, ConnectionResetError):
+                pass  # o navegador cancelou o download
+
+
+def _responde() -> bool:
+    try:
+        with urllib.request.urlopen(f"http://127.0.0.1:{PORTA}/saude", timeout=0.5) as r:
+            return r.status == HTTPStatus.NO_CONTENT
+    except OSError:
+        return False
+
+
+def iniciar() -> bool:
+    """
+    Sobe o servidor neste processo (uma vez). Se a porta já está em uso por
+    outro processo do host que responde como este servidor, usa aquele.
+    Retorna se há endpoint disponível (exige NEURO_EXAMES_URL).
+    """
+    global _servidor, _disponivel
+    with _lock:
+        if _disponivel is None:
+            if not PORTA or not URL_PUBLICA:
+                _disponivel = False
+            else:
+                try:
+                    _servidor = ThreadingHTTPServer((HOST, PORTA), _Handler)
+                except OSError:
+                    _disponivel = _responde()
+                else:
+                    _servidor.daemon_threads = True
+                    threading.Thread(target=_servidor.serve_forever,
+                                     name="servidor-exames", daemon=True).start()
+                    _disponivel = True
+        return _disponivel
+
+
+def link(meta: Dict) -> Optional[str]:
+    """URL assinada para abrir o exame, ou None se não há endpoint (use o download ao clicar)."""
+    if not iniciar():
+        return None
+    return f"{URL_PUBLICA}/exame/{assinar(meta)}/{quote(Path(meta['nome']).name)}"
@@ -0,0 +1,16 @@
+-- fila_escrita.sql – Coluna de idempotência usada pela fila de escrita (fila_escrita.py)
+-- Rode uma vez no SQL Editor do Supabase. Cada envio da fila leva uma chave
+-- gerada no cliente; um reenvio (resposta perdida depois de o banco já ter
+-- gravado) cai no índice único e não duplica a linha.
+
+alter table pacientes    add column if not exists idempotencia text;
+alter table agendamentos add column if not exists idempotencia text;
+alter table transacoes   add column if not exists idempotencia text;
+alter table prontuarios  add column if not exists idempotencia text;
+alter table mensagens    add column if not exists idempotencia text;
+
+create unique index if not exists pacientes_idempotencia_idx    on pacientes (idempotencia);
+create unique index if not exists agendamentos_idempotencia_idx on agendamentos (idempotencia);
+create unique index if not exists transacoes_idempotencia_idx   on transacoes (idempotencia);
+create unique index if not exists prontuarios_idempotencia_idx  on prontuarios (idempotencia);
+create unique index if not exists mensagens_idempotencia_idx    on mensagens (idempotencia);
@@ -0,0 +1,20 @@
+-- relatorios.sql – Views de agregação usadas por relatorios.py
+-- Rode uma vez no SQL Editor do Supabase. Sem elas, relatorios.py agrega
+-- em pandas apenas as colunas necessárias.
+
+create or replace view relatorio_receita_diaria as
+select data_mov,
+       sum(valor) as total
+  from transacoes
+ group by data_mov;
+
+create or replace view relatorio_consultas_por_tipo as
+select data_consulta,
+       coalesce(tipo_consulta, 'Desconhecido') as tipo_consulta,
+       count(*) as total
+  from agendamentos
+ group by data_consulta, coalesce(tipo_consulta, 'Desconhecido');
+
+-- Índices que sustentam os filtros por período
+create index if not exists agendamentos_data_consulta_idx on agendamentos (data_consulta, hora_consulta);
+create index if not exists transacoes_data_mov_idx on transacoes (data_mov);
@@ -0,0 +1,32 @@
+-- sincronizacao.sql – Coluna e gatilho usados pela réplica local (backend_replica.py)
+-- Rode uma vez no SQL Editor do Supabase. A réplica baixa só as linhas com
+-- alterado_em posterior à última sincronização. alterado_em é carimbado pelo
+-- próprio banco em toda inclusão ou alteração: criado_em vem do cliente (que
+-- pode gravar bem depois, pela fila de escrita) e não serve de marca.
+
+alter table pacientes    add column if not exists alterado_em timestamptz not null default now();
+alter table agendamentos add column if not exists alterado_em timestamptz not null default now();
+alter table transacoes   add column if not exists alterado_em timestamptz not null default now();
+
+-- clock_timestamp(): o instante da gravação da linha, não o início da transação
+create or replace function marcar_alterado_em() returns trigger as $$
+begin
+  new.alterado_em := clock_timestamp();
+  return new;
+end;
+$$ language plpgsql;
+
+drop trigger if exists pacientes_alterado_em on pacientes;
+create trigger pacientes_alterado_em before insert or update on pacientes
+  for each row execute function marcar_alterado_em();
+drop trigger if exists agendamentos_alterado_em on agendamentos;
+create trigger agendamentos_alterado_em before insert or update on agendamentos
+  for each row execute function marcar_alterado_em();
+drop trigger if exists transacoes_alterado_em on transacoes;
+create trigger transacoes_alterado_em before insert or update on transacoes
+  for each row execute function marcar_alterado_em();
+
+-- Índices que sustentam a busca do delta
+create index if not exists pacientes_alterado_em_idx    on pacientes (alterado_em);
+create index if not exists agendamentos_alterado_em_idx on agendamentos (alterado_em);
+create index if not exists transacoes_alterado_em_idx   on transacoes (alterado_em);
@@ -1,8 +1,8 @@
 # users.py – Módulo de gerenciamento de usuários
 
 import bcrypt
-from typing import List, Dict
-from database import supabase
+from typing import List, Dict, Optional, Tuple
+from database import tabela, paginar_keyset
 
 def criar_usuario(
     login: str,
@@ -35,7 +35,7 @@ def criar_usuario(
         "paciente_id": paciente_id
     }
 
-    resp = supabase.table("usuarios").insert(registro).execute()
+    resp = tabela("usuarios").insert(registro).execute()
     return bool(getattr(resp, "data", None))
 
 
@@ -44,19 +44,31 @@ def listar_usuarios() -> List[Dict]:
     Retorna lista de usuários com campos:
       id, login, nome, senha_hash, role, paciente_id, criado_em, atualizado_em, created_at
     """
-    resp = supabase.table("usuarios").select("*").execute()
-    data = resp.data or []
-    usuarios = []
-    for u in data:
-        usuarios.append({
-            "id":             u.get("id"),
-            "login":          u.get("login", ""),
-            "nome":           u.get("nome", ""),
-            "senha_hash":     u.get("senha_hash", ""),
-            "role":           u.get("role", ""),
-            "paciente_id":    u.get("paciente_id"),
-            "criado_em":      u.get("criado_em"),
-            "atualizado_em":  u.get("atualizado_em"),
-            "created_at":     u.get("created_at")
-        })
-    return usuarios
+    resp = tabela("usuarios").select("*").execute()
+    return [_formatar(u) for u in resp.data or []]
+
+
+def listar_usuarios_pagina(
+    apos: Optional[Tuple] = None,
+    limite: int = 100
+) -> Tuple[List[Dict], Optional[Tuple]]:
+    """
+    Página de usuários ordenada por id.
+    Retorna (usuarios, cursor da próxima página ou None).
+    """
+    linhas, prox = paginar_keyset(tabela("usuarios").select("*"), ("id",), apos, limite)
+    return [_formatar(u) for u in linhas], prox
+
+
+def _formatar(u: Dict) -> Dict:
+    return {
+        "id":             u.get("id"),
+        "login":          u.get("login", ""),
+        "nome":           u.get("nome", ""),
+        "senha_hash":     u.get("senha_hash", ""),
+        "role":           u.get("role", ""),
+        "paciente_id":    u.get("paciente_id"),
+        "criado_em":      u.get("criado_em"),
+        "atualizado_em":  u.get("atualizado_em"),
+        "created_at":     u.get("created_at")
+    }
@@ -0,0 +1,129 @@
+# validacao.py – Validação vetorizada (pandas) para inserções em lote
+import datetime
+from typing import Dict, List
+
+import numpy as np
+import pandas as pd
+
+import database
+
+
+def quadro(registros: List[Dict], colunas: List[str]) -> pd.DataFrame:
+    """DataFrame com exatamente `colunas` (as ausentes ficam nulas), na ordem de entrada."""
+    return pd.DataFrame.from_records(registros).reindex(columns=colunas).reset_index(drop=True)
+
+
+def texto(serie: pd.Series) -> pd.Series:
+    """Nulos viram '' e o resto vira texto sem espaços nas pontas."""
+    return serie.astype("string").fillna("").str.strip()
+
+
+def datas_iso(serie: pd.Series) -> pd.Series:
+    """
+    Aceita DD/MM/AAAA ou AAAA-MM-DD; devolve AAAA-MM-DD, ou nulo quando
+    vazio ou inválido (compare com a entrada para distinguir os dois casos).
+    """
+    s = texto(serie)
+    br = pd.to_datetime(s, format="%d/%m/%Y", errors="coerce")
+    iso = pd.to_datetime(s.str[:10], format="%Y-%m-%d", errors="coerce")
+    return br.fillna(iso).dt.strftime("%Y-%m-%d").astype(object).where(lambda x: x.notna(), None)
+
+
+def idades(datas: pd.Series, hoje: datetime.date = None) -> pd.Series:
+    """Idade em anos completos a partir de datas ISO (nulo onde a data é nula)."""
+    hoje = hoje or datetime.date.today()
+    d = pd.to_datetime(datas, errors="coerce")
+    antes_do_aniversario = (d.dt.month > hoje.month) | ((d.dt.month == hoje.month) & (d.dt.day > hoje.day))
+    return (hoje.year - d.dt.year - antes_do_aniversario.astype(int)).astype("Int64")
+
+
+def inteiros(serie: pd.Series) -> pd.Series:
+    n = pd.to_numeric(serie, errors="coerce")
+    return n.where(n % 1 == 0).astype("Int64")
+
+
+def valores(serie: pd.Series) -> pd.Series:
+    """
+    Valores em dinheiro: números, "12.5", "12,5", "1.234,56" ou "R$ 12,50"
+    (nulo quando inválido). Se há vírgula, ela é a decimal e os pontos são de milhar.
+    """
+    s = texto(serie).str.replace(r"^R\$|\s", "", regex=True)
+    virgula = s.str.contains(",", regex=False)
+    s = s.mask(virgula, s.str.replace(".", "", regex=False).str.replace(",", ".", regex=False))
+    return pd.to_numeric(s, errors="coerce").astype(float)
+
+
+UFS = frozenset(
+    "AC AL AP AM BA CE DF ES GO MA MT MS MG PA PB PR PE PI RJ RN RS RO RR SC SP SE TO".split()
+)
+
+
+def digitos(serie: pd.Series, tamanho: int) -> pd.Series:
+    """
+    Só os dígitos. Valores só numéricos e curtos recebem zeros à esquerda:
+    planilhas guardam CPF/CEP como número e perdem os zeros iniciais.
+    """
+    s = texto(serie)
+    d = s.str.replace(r"\D", "", regex=True)
+    curto = s.str.fullmatch(r"\d+") & (d.str.len() < tamanho) & (d.str.len() >= tamanho - 2)
+    return d.mask(curto, d.str.zfill(tamanho))
+
+
+def cpfs_validos(d: pd.Series) -> pd.Series:
+    """Confere os dois dígitos verificadores de CPFs já reduzidos a dígitos."""
+    onze = (d.str.len() == 11).to_numpy()
+    texto_fixo = d.where(onze, "0" * 11).astype(str)
+    m = (np.frombuffer("".join(texto_fixo).encode("ascii"), dtype=np.uint8)
+         .reshape(-1, 11).astype(np.int64) - 48)
+    dv1 = (m[:, :9] @ np.arange(10, 1, -1)) * 10 % 11 % 10
+    dv2 = (m[:, :10] @ np.arange(11, 1, -1)) * 10 % 11 % 10
+    repetidos = (m == m[:, :1]).all(axis=1)  # 000.000.000-00, 111.111.111-11...
+    ok = onze & (m[:, 9] == dv1) & (m[:, 10] == dv2) & ~repetidos
+    return pd.Series(ok, index=d.index)
+
+
+def formatar_cpf(d: pd.Series) -> pd.Series:
+    return d.str.replace(r"^(\d{3})(\d{3})(\d{3})(\d{2})$", r"\1.\2.\3-\4", regex=True)
+
+
+def formatar_cep(d: pd.Series) -> pd.Series:
+    return d.str.replace(r"^(\d{5})(\d{3})$", r"\1-\2", regex=True)
+
+
+def ufs(serie: pd.Series) -> pd.Series:
+    return texto(serie).str.upper()
+
+
+def sem_erros(n: int) -> pd.Series:
+    return pd.Series([""] * n, dtype=object)
+
+
+def marcar(erros: pd.Series, mascara: pd.Series, mensagem: str) -> pd.Series:
+    """Acrescenta `mensagem` ao erro das linhas em que `mascara` é verdadeira."""
+    mascara = mascara.fillna(True).astype(bool).to_numpy()
+    erros = erros.copy()
+    erros[mascara] = erros[mascara] + mensagem + "; "
+    return erros
+
+
+def registros(df: pd.DataFrame) -> List[Dict]:
+    """Linhas como dicts de tipos nativos do Python (nulos como None), prontos para JSON."""
+    return df.astype(object).where(df.notna(), None).to_dict("records")
+
+
+def inserir_validos(nome_tabela: str, df: pd.DataFrame, erros: pd.Series,
+                    lote: int = None) -> List[Dict]:
+    """
+    Insere só as linhas sem erro de validação. Retorna, na ordem de entrada,
+    {"id", "erro", "linha"} para cada registro (erro de validação ou do banco).
+    """
+    resultados: List[Dict] = [
+        {"id": None, "erro": e.rstrip("; "), "linha": None} if e else None for e in erros
+    ]
+    validos = [i for i, r in enumerate(resultados) if r is None]
+    gravados = database.inserir_em_lote(
+        nome_tabela, registros(df.iloc[validos]), lote or database.LOTE_INSERCAO
+    )
+    for i, g in zip(validos, gravados):
+        resultados[i] = g
+    return resultados